@@ -1,17 +1,28 @@
 from fastapi import APIRouter, HTTPException, Depends
-from app.models.schemas import ChatRequest, ChatResponse
+from fastapi.responses import StreamingResponse
+from app.models.schemas import ChatRequest, ChatResponse, ChunkFetchRequest, ChunkFetchResponse
 from app.models.mongodb_models import MessageModel, SessionModel
 from app.services.vector_store import VectorStore
 from app.services.ai_service import AIService
-from app.services.database import get_messages_collection, get_sessions_collection
+from app.services.answer_cache import answer_cache
+from app.services.document_artifacts import DocumentArtifacts
+from app.services.llm_resilience import LLMUnavailable
+from app.services.database import get_messages_collection, get_sessions_collection, get_documents_collection
 from app.api.routes.auth import get_current_user
-from typing import Optional
+from app.core.config import settings
+from contextlib import aclosing
+from typing import Any, Dict, List, Optional, Set, Tuple
 from datetime import datetime
+import asyncio
+import json
+import uuid
 
 router = APIRouter()
 _vector_store = None  # Lazy initialization
 _ai_service = None  # Lazy initialization
 
+NO_CONTEXT_ANSWER = "I couldn't find any relevant information in the uploaded documents to answer your question. Please make sure you have uploaded a document and try asking a different question."
+
 def get_vector_store():
     """Lazy initialization of VectorStore"""
     global _vector_store
@@ -28,180 +39,396 @@ def get_ai_service():
         _ai_service = AIService()
     return _ai_service
 
+# Stored summaries and key points, shared with the upload routes
+document_artifacts = DocumentArtifacts(get_vector_store, get_ai_service)
+
+def _llm_unavailable(e: LLMUnavailable) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+async def get_accessible_document_ids(user_id: str) -> Optional[List[str]]:
+    """Document IDs the user owns, or None when MongoDB is unavailable.
+
+    Deduplicated uploads share one chunk set between owners, so ownership
+    comes from the documents collection rather than chunk metadata.
+    """
+    documents_collection = get_documents_collection()
+    if documents_collection is None:
+        return None
+    return await documents_collection.distinct("document_id", {"user_id": user_id})
+
+async def _retrieve_context(request: ChatRequest, user_id: str, document_ids: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """Chunks relevant to the question, from the requested document or else any accessible one"""
+    # Search for relevant chunks - filter by user's accessible documents
+    similar_chunks = get_vector_store().search_similar(
+        query=request.question,
+        n_results=10,  # Increased from 5 to 10 for more comprehensive context
+        document_id=request.document_id,
+        user_id=user_id,
+        document_ids=document_ids
+    )
+
+    # If no results found with specific document, search accessible documents
+    if not similar_chunks:
+        print(f"🔍 No results found for document_id {request.document_id}, searching accessible documents...")
+        similar_chunks = get_vector_store().search_similar(
+            query=request.question,
+            n_results=10,  # Search accessible documents
+            user_id=user_id,
+            document_ids=document_ids
+        )
+    return similar_chunks
+
+def _cached_answer(request: ChatRequest, similar_chunks: List[Dict[str, Any]]) -> Tuple[Optional[List[float]], Optional[Dict[str, Any]]]:
+    """The question embedding for caching (None when caching is off) and a reusable answer, if any.
+
+    With ``bypass_cache`` the lookup is skipped but the fresh answer still
+    replaces what would have matched.
+    """
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None, None
+
+    embedding = get_vector_store().embed_query(request.question)
+    if request.bypass_cache:
+        answer_cache.record_bypass()
+        return embedding, None
+
+    cached = answer_cache.lookup(embedding, similar_chunks, request.question)
+    if cached is None:
+        return embedding, None
+    return embedding, {
+        **cached,
+        "question_id": str(uuid.uuid4()),
+        "session_id": request.session_id or str(uuid.uuid4()),
+        "timestamp": datetime.utcnow().isoformat(),
+        "cached": True
+    }
+
+async def _needs_title(session_id: Optional[str]) -> bool:
+    """Whether this is the session's first exchange, which gets a title"""
+    if not session_id:
+        return True
+    session_doc = await get_sessions_collection().find_one({"session_id": session_id})
+    return not session_doc or (not session_doc.get("message_count") and not session_doc.get("title"))
+
+def _clean_title(title: str) -> str:
+    title = title.strip().strip('"').strip("'")
+    # Limit title length
+    if len(title) > 50:
+        title = title[:47] + "..."
+    return title
+
+async def _save_exchange(request: ChatRequest, user_id: str, session_id: str, answer: str,
+                         sources: List[Dict[str, Any]], timestamp: str, answered: bool = True,
+                         title: Optional[str] = None, title_later: bool = False) -> None:
+    """Store the question and answer, and update (or create) the session.
+
+    ``answered`` is False when no context was found; such exchanges do not
+    tag the session with the document or give it a title. ``title``, when
+    generated with the answer, names a new session without another LLM call.
+    Without one, a title is generated separately; with ``title_later`` that
+    happens in the background so the caller does not wait for it.
+    """
+    messages_collection = get_messages_collection()
+    sessions_collection = get_sessions_collection()
+
+    # Save user message
+    user_message = MessageModel(
+        session_id=session_id,
+        user_id=user_id,
+        message_type="user",
+        content=request.question,
+        document_id=request.document_id,
+        timestamp=timestamp
+    )
+    await messages_collection.insert_one(user_message.dict(by_alias=True))
+    
+    # Save AI message
+    ai_message = MessageModel(
+        session_id=session_id,
+        user_id=user_id,
+        message_type="ai",
+        content=answer,
+        sources=sources,
+        document_id=request.document_id,
+        timestamp=timestamp
+    )
+    await messages_collection.insert_one(ai_message.dict(by_alias=True))
+    
+    # Update session and auto-generate title if this is the first interaction
+    session_update = {
+        "$set": {
+            "user_id": user_id,
+            "last_activity": timestamp,
+            "updated_at": timestamp
+        },
+        "$inc": {"message_count": 2}
+    }
+    
+    # Add document_id to session if provided
+    if answered and request.document_id:
+        session_update["$addToSet"] = {"document_ids": request.document_id}
+    
+    await sessions_collection.update_one(
+        {"session_id": session_id},
+        session_update,
+        upsert=True
+    )
+
+    if not answered:
+        return
+    
+    # Auto-generate title if this is the first message in the session
+    session_doc = await sessions_collection.find_one({"session_id": session_id})
+    if session_doc and session_doc.get("message_count", 0) == 2 and not session_doc.get("title"):
+        if not title and title_later:
+            _generate_title_later(session_id, request.question)
+            return
+        try:
+            if title:
+                generated_title = _clean_title(title)
+            else:
+                generated_title = await _generate_title(request.question)
+            
+            # Update session with generated title
+            await sessions_collection.update_one(
+                {"session_id": session_id},
+                {"$set": {"title": generated_title}}
+            )
+        except Exception as title_error:
+            print(f"Failed to generate session title: {title_error}")
+
+# Background tasks naming sessions, kept referenced until they finish
+_title_tasks: Set["asyncio.Task[None]"] = set()
+
+def _generate_title_later(session_id: str, question: str) -> None:
+    """Generate and store a new session's title without waiting for it"""
+    async def store() -> None:
+        try:
+            generated_title = await _generate_title(question)
+            await get_sessions_collection().update_one(
+                {"session_id": session_id},
+                {"$set": {"title": generated_title}}
+            )
+        except Exception as title_error:
+            print(f"Failed to generate session title: {title_error}")
+
+    task = asyncio.get_running_loop().create_task(store())
+    _title_tasks.add(task)
+    task.add_done_callback(_title_tasks.discard)
+
+async def _generate_title(question: str) -> str:
+    """A session title from the first question, with a separate LLM call"""
+    # Generate title from the first question
+    title_prompt = f"""
+    Generate a concise, descriptive title (max 50 characters) for a chat session that starts with this question:
+    
+    "{question}"
+    
+    The title should capture the main topic. Be specific and concise. Return only the title.
+    """
+    
+    title_text = await get_ai_service().generate_text(title_prompt)
+    return _clean_title(title_text)
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_document(request: ChatRequest, current_user: dict = Depends(get_current_user)):
     """
     Ask a question about uploaded documents (user's own documents only)
     """
     try:
-        messages_collection = get_messages_collection()
-        sessions_collection = get_sessions_collection()
-
         # Get user_id from authenticated user
         user_id = str(current_user["_id"])
+        document_ids = await get_accessible_document_ids(user_id)
 
-        # Search for relevant chunks - filter by user's accessible documents
-        similar_chunks = get_vector_store().search_similar(
-            query=request.question,
-            n_results=10,  # Increased from 5 to 10 for more comprehensive context
-            document_id=request.document_id,
-            user_id=user_id
-        )
-
-        # If no results found with specific document, search accessible documents
-        if not similar_chunks:
-            print(f"🔍 No results found for document_id {request.document_id}, searching accessible documents...")
-            similar_chunks = get_vector_store().search_similar(
-                query=request.question,
-                n_results=10,  # Search accessible documents
-                user_id=user_id
-            )
+        similar_chunks = await _retrieve_context(request, user_id, document_ids)
         
         if not similar_chunks:
-            answer = "I couldn't find any relevant information in the uploaded documents to answer your question. Please make sure you have uploaded a document and try asking a different question."
-            sources = []
             session_id = request.session_id or "default_session"
             timestamp = datetime.utcnow().isoformat()
-            
-            # Save user message
-            user_message = MessageModel(
-                session_id=session_id,
-                user_id=user_id,
-                message_type="user",
-                content=request.question,
-                document_id=request.document_id,
-                timestamp=timestamp
-            )
-            await messages_collection.insert_one(user_message.dict(by_alias=True))
-            
-            # Save AI message
-            ai_message = MessageModel(
-                session_id=session_id,
-                user_id=user_id,
-                message_type="ai",
-                content=answer,
-                sources=sources,
-                document_id=request.document_id,
-                timestamp=timestamp
-            )
-            await messages_collection.insert_one(ai_message.dict(by_alias=True))
-            
-            # Update session with user_id
-            await sessions_collection.update_one(
-                {"session_id": session_id},
-                {
-                    "$set": {
-                        "user_id": user_id,
-                        "last_activity": timestamp,
-                        "updated_at": timestamp
-                    },
-                    "$inc": {"message_count": 2}
-                },
-                upsert=True
-            )
+            await _save_exchange(request, user_id, session_id, NO_CONTEXT_ANSWER, [], timestamp, answered=False)
             
             return ChatResponse(
-                answer=answer,
-                sources=sources,
+                answer=NO_CONTEXT_ANSWER,
+                sources=[],
                 session_id=session_id,
                 timestamp=timestamp
             )
         
-        # Generate answer using AI
-        ai_response = get_ai_service().generate_answer(
-            question=request.question,
-            context_chunks=similar_chunks,
-            session_id=request.session_id
-        )
-        
-        # Save user message
-        user_message = MessageModel(
-            session_id=ai_response["session_id"],
-            user_id=user_id,
-            message_type="user",
-            content=request.question,
-            document_id=request.document_id,
-            timestamp=ai_response["timestamp"]
-        )
-        await messages_collection.insert_one(user_message.dict(by_alias=True))
-        
-        # Save AI message
-        ai_message = MessageModel(
-            session_id=ai_response["session_id"],
-            user_id=user_id,
-            message_type="ai",
-            content=ai_response["answer"],
-            sources=ai_response["sources"],
-            document_id=request.document_id,
-            timestamp=ai_response["timestamp"]
-        )
-        await messages_collection.insert_one(ai_message.dict(by_alias=True))
-        
-        # Update session and auto-generate title if this is the first interaction
-        session_update = {
-            "$set": {
-                "user_id": user_id,
-                "last_activity": ai_response["timestamp"],
-                "updated_at": ai_response["timestamp"]
-            },
-            "$inc": {"message_count": 2}
-        }
-        
-        # Add document_id to session if provided
-        if request.document_id:
-            session_update["$addToSet"] = {"document_ids": request.document_id}
-        
-        await sessions_collection.update_one(
-            {"session_id": ai_response["session_id"]},
-            session_update,
-            upsert=True
+        embedding, ai_response = _cached_answer(request, similar_chunks)
+        if ai_response is None:
+            # Generate answer using AI, with follow-up questions and a title
+            # for a new session in the same call
+            structured = settings.CHAT_STRUCTURED_ANSWERS
+            ai_response = await get_ai_service().generate_answer(
+                question=request.question,
+                context_chunks=similar_chunks,
+                session_id=request.session_id,
+                structured=structured,
+                include_title=structured and await _needs_title(request.session_id)
+            )
+            if embedding is not None:
+                answer_cache.store(embedding, similar_chunks, request.question, ai_response)
+
+        await _save_exchange(
+            request,
+            user_id,
+            ai_response["session_id"],
+            ai_response["answer"],
+            ai_response["sources"],
+            ai_response["timestamp"],
+            title=ai_response.get("title")
         )
-        
-        # Auto-generate title if this is the first message in the session
-        session_doc = await sessions_collection.find_one({"session_id": ai_response["session_id"]})
-        if session_doc and session_doc.get("message_count", 0) == 2 and not session_doc.get("title"):
-            try:
-                # Generate title from the first question
-                from app.services.ai_service import AIService
-                ai_service_title = AIService()
-                
-                title_prompt = f"""
-                Generate a concise, descriptive title (max 50 characters) for a chat session that starts with this question:
-                
-                "{request.question}"
-                
-                The title should capture the main topic. Be specific and concise. Return only the title.
-                """
-                
-                title_response = ai_service_title.model.generate_content(title_prompt)
-                generated_title = title_response.text.strip().strip('"').strip("'")
-                
-                # Limit title length
-                if len(generated_title) > 50:
-                    generated_title = generated_title[:47] + "..."
-                
-                # Update session with generated title
-                await sessions_collection.update_one(
-                    {"session_id": ai_response["session_id"]},
-                    {"$set": {"title": generated_title}}
-                )
-            except Exception as title_error:
-                print(f"Failed to generate session title: {title_error}")
 
         return ChatResponse(
             answer=ai_response["answer"],
             sources=ai_response["sources"],
             session_id=ai_response["session_id"],
-            timestamp=ai_response["timestamp"]
+            timestamp=ai_response["timestamp"],
+            cached=ai_response.get("cached", False),
+            prompt_tokens=ai_response.get("prompt_tokens"),
+            follow_up_questions=ai_response.get("follow_up_questions"),
+            title=_clean_title(ai_response["title"]) if ai_response.get("title") else None
         )
 
+    except LLMUnavailable as e:
+        raise _llm_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_with_document_stream(request: ChatRequest, current_user: dict = Depends(get_current_user)):
+    """
+    Ask a question and stream the answer as server-sent events.
+
+    Events: "sources" (the cited chunks, session_id and question_id), then
+    "token" for each piece of answer text, then "done" with the full answer
+    once it is saved, or "error" if generation fails (with ``retry_after``
+    seconds when the LLM is unavailable). A cached answer is sent
+    as a single "token" and its "done" has ``cached`` set. With
+    CHAT_STRUCTURED_ANSWERS, "done" also carries follow-up questions and,
+    for a new session, its title, generated in the same LLM call. A title
+    that still has to be generated separately never delays "done".
+    """
+    user_id = str(current_user["_id"])
+    document_ids = await get_accessible_document_ids(user_id)
+
+    try:
+        similar_chunks = await _retrieve_context(request, user_id, document_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
+
+    async def events():
+        if not similar_chunks:
+            session_id = request.session_id or "default_session"
+            timestamp = datetime.utcnow().isoformat()
+            yield _sse("sources", {"sources": [], "session_id": session_id})
+            yield _sse("token", {"text": NO_CONTEXT_ANSWER})
+            await _save_exchange(request, user_id, session_id, NO_CONTEXT_ANSWER, [], timestamp, answered=False)
+            yield _sse("done", {"answer": NO_CONTEXT_ANSWER, "sources": [], "session_id": session_id,
+                                "timestamp": timestamp})
+            return
+
+        embedding, cached = _cached_answer(request, similar_chunks)
+        if cached is not None:
+            yield _sse("sources", {"sources": cached["sources"], "session_id": cached["session_id"],
+                                   "question_id": cached["question_id"]})
+            yield _sse("token", {"text": cached["answer"]})
+            try:
+                await _save_exchange(request, user_id, cached["session_id"], cached["answer"],
+                                     cached["sources"], cached["timestamp"], title_later=True)
+            except Exception as e:
+                print(f"Failed to save cached answer: {e}")
+                yield _sse("error", {"error": f"Failed to save the answer: {str(e)}"})
+                return
+            yield _sse("done", cached)
+            return
+
+        structured = settings.CHAT_STRUCTURED_ANSWERS
+        stream = get_ai_service().stream_answer(
+            question=request.question,
+            context_chunks=similar_chunks,
+            session_id=request.session_id,
+            structured=structured,
+            include_title=structured and await _needs_title(request.session_id)
+        )
+        async with aclosing(stream):
+            async for item in stream:
+                if item["event"] == "done":
+                    # Persist before announcing completion, so a client that
+                    # reloads history on "done" sees the message
+                    done = item["data"]
+                    try:
+                        await _save_exchange(request, user_id, done["session_id"], done["answer"],
+                                             done["sources"], done["timestamp"],
+                                             title=done.get("title"), title_later=True)
+                    except Exception as e:
+                        print(f"Failed to save streamed answer: {e}")
+                        yield _sse("error", {"error": f"Failed to save the answer: {str(e)}"})
+                        return
+                    if embedding is not None:
+                        answer_cache.store(embedding, similar_chunks, request.question, done)
+                yield _sse(item["event"], item["data"])
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop reverse proxies from buffering the stream
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@router.post("/chunks", response_model=ChunkFetchResponse)
+async def fetch_chunks(request: ChunkFetchRequest, current_user: dict = Depends(get_current_user)):
+    """
+    Fetch the text of several chunks at once, e.g. to show a message's sources
+    """
+    try:
+        user_id = str(current_user["_id"])
+        document_ids = await get_accessible_document_ids(user_id)
+
+        refs = [ref.dict() for ref in request.refs]
+        if document_ids is not None:
+            accessible = set(document_ids)
+            refs = [ref for ref in refs if ref["document_id"] in accessible]
+
+        chunks = []
+        for chunk in get_vector_store().get_chunks(refs):
+            metadata = chunk["metadata"] or {}
+            # Without MongoDB, fall back to the uploader recorded on the chunk
+            if document_ids is None and metadata.get("user_id") not in (None, user_id):
+                continue
+            chunks.append({
+                "document_id": metadata.get("document_id"),
+                "chunk_index": metadata.get("chunk_index"),
+                "filename": metadata.get("filename", "Unknown"),
+                "page": metadata.get("page"),
+                "start_offset": metadata.get("start_offset"),
+                "end_offset": metadata.get("end_offset"),
+                "text": chunk["text"]
+            })
+
+        return ChunkFetchResponse(chunks=chunks)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch chunks: {str(e)}")
+
 @router.post("/chat/follow-up")
 async def generate_follow_up_questions(request: ChatRequest, current_user: dict = Depends(get_current_user)):
     """
     Generate follow-up questions based on current question and context
+
+    /chat already returns follow-up questions with the answer when
+    CHAT_STRUCTURED_ANSWERS is on; this is for answers without them.
     """
     try:
         # Search for relevant chunks
@@ -223,7 +450,7 @@ async def generate_follow_up_questions(request: ChatRequest, current_user: dict
             return {"follow_up_questions": []}
         
         # Generate follow-up questions
-        follow_up_questions = get_ai_service().generate_follow_up_questions(
+        follow_up_questions = await get_ai_service().generate_follow_up_questions(
             context_chunks=similar_chunks,
             current_question=request.question
         )
@@ -236,45 +463,55 @@ async def generate_follow_up_questions(request: ChatRequest, current_user: dict
 @router.post("/chat/summarize")
 async def summarize_document(document_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     """
-    Generate a summary of the uploaded document
+    Summary of the uploaded document, generated once and then served from storage
     """
     try:
         if document_id:
-            chunks = get_vector_store().get_document_chunks(document_id)
-        else:
-            # Get some random chunks for general summary
-            chunks = get_vector_store().search_similar("summary", n_results=10)
+            summary = await document_artifacts.get(document_id, "summary")
+            if summary is None:
+                return {"summary": "No document content available for summarization."}
+            return {"summary": summary}
+
+        # Without a document, use some random chunks
+        chunks = get_vector_store().search_similar("summary", n_results=10)
         
         if not chunks:
             return {"summary": "No document content available for summarization."}
         
         # Generate summary
-        summary = get_ai_service().summarize_document(chunks)
+        summary = await get_ai_service().summarize_document(chunks)
         
         return {"summary": summary}
         
+    except LLMUnavailable as e:
+        raise _llm_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate summary: {str(e)}")
 
 @router.post("/chat/key-points")
 async def extract_key_points(document_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     """
-    Extract key points from the uploaded document
+    Key points of the uploaded document, extracted once and then served from storage
     """
     try:
         if document_id:
-            chunks = get_vector_store().get_document_chunks(document_id)
-        else:
-            # Get some random chunks for key points
-            chunks = get_vector_store().search_similar("key points", n_results=10)
+            key_points = await document_artifacts.get(document_id, "key_points")
+            if key_points is None:
+                return {"key_points": ["No document content available for key point extraction."]}
+            return {"key_points": key_points}
+
+        # Without a document, use some random chunks
+        chunks = get_vector_store().search_similar("key points", n_results=10)
         
         if not chunks:
             return {"key_points": ["No document content available for key point extraction."]}
         
         # Extract key points
-        key_points = get_ai_service().extract_key_points(chunks)
+        key_points = await get_ai_service().extract_key_points(chunks)
         
         return {"key_points": key_points}
         
+    except LLMUnavailable as e:
+        raise _llm_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to extract key points: {str(e)}") 
\ No newline at end of file
@@ -1,24 +1,26 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File
 from typing import Dict, List, Any, Optional
 from datetime import datetime
-import os
-import uuid
 
 from app.services.vector_store import VectorStore
 from app.services.ai_service import AIService
-from app.services.document_processor import DocumentProcessor
-from app.core.config import settings
+from app.services.upload_receiver import receive_upload, UploadRejected
+from app.services.llm_resilience import LLMUnavailable
 # Import the shared VectorStore instance from chat module
-from app.api.routes.chat import get_vector_store
+from app.api.routes.chat import get_vector_store, _llm_unavailable
+from app.api.routes.upload import ingestion_service, _busy
+from app.services.ingestion import ChunkQuotaExceeded
+from app.services.admission import AdmissionRejected
 
 router = APIRouter()
 # Use the shared VectorStore instance instead of creating a new one
 vector_store = get_vector_store()
 ai_service = AIService()
-document_processor = DocumentProcessor()
 
 # In-memory counters for demo question limits per session
 DEMO_QUESTION_LIMIT = 3
+# Chunks a guest's demo document may be split into
+DEMO_MAX_CHUNKS = 500
 demo_session_counts: Dict[str, int] = {}
 
 # Sample documents to seed for demo
@@ -191,11 +193,15 @@ async def demo_chat(payload: Dict[str, Any]):
         }
 
     # Generate answer using AI on the retrieved context
-    ai_response = ai_service.generate_answer(
-        question=question,
-        context_chunks=similar_chunks,
-        session_id=session_id,
-    )
+    try:
+        ai_response = await ai_service.generate_answer(
+            question=question,
+            context_chunks=similar_chunks,
+            session_id=session_id,
+        )
+    except LLMUnavailable as e:
+        # Not counted against the demo limit: the question went unanswered
+        raise _llm_unavailable(e)
 
     # Increment question count
     demo_session_counts[session_id] = count + 1
@@ -222,48 +228,31 @@ async def demo_upload(session_id: str, file: UploadFile = File(...)):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
 
-    # Read to get size
-    file_bytes = await file.read()
-    file_size = len(file_bytes)
-
-    # Validate using the same processor rules as normal uploads
+    # Receive with the same size/type rules as normal uploads
     try:
-        document_processor.validate_file(file.filename, file_size)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
-
-    # Persist temporarily to disk for processing
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"demo_{session_id}_{uuid.uuid4()}{file_extension}"
-    temp_path = os.path.join(settings.UPLOAD_FOLDER, unique_filename)
+        received = await receive_upload(file)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
+    # Extract, split and index in windows, capped for guests and within
+    # the shared ingestion memory budget
     try:
-        with open(temp_path, "wb") as f:
-            f.write(file_bytes)
-
-        # Process into chunks
-        result = document_processor.process_document(temp_path, file.filename)
+        document_id, chunk_count = await ingestion_service.index_unowned(
+            received, file.filename, max_chunks=DEMO_MAX_CHUNKS
+        )
+    except ChunkQuotaExceeded:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Demo documents are limited to {DEMO_MAX_CHUNKS} chunks. Register to upload larger documents."
+        )
+    except AdmissionRejected as e:
+        raise _busy(e)
 
-        # Add to vector store
-        success = vector_store.add_documents(result["chunks"])
-        if not success:
-            raise RuntimeError("Failed to index demo document")
-
-        # Derive counts
-        chunk_count = len(result["chunks"]) if isinstance(result.get("chunks"), list) else 0
-
-        return {
-            "document_id": result["chunks"][0]["document_id"] if chunk_count > 0 else unique_filename,
-            "filename": file.filename,
-            "chunk_count": chunk_count,
-            "message": "Demo document uploaded and indexed successfully",
-        }
-    finally:
-        try:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-        except Exception:
-            # best-effort cleanup
-            pass
+    return {
+        "document_id": document_id,
+        "filename": file.filename,
+        "chunk_count": chunk_count,
+        "message": "Demo document uploaded and indexed successfully",
+    }
 
 
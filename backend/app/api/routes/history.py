@@ -5,6 +5,8 @@ from app.services.database import get_messages_collection, get_sessions_collecti
 from app.models.mongodb_models import MessageModel, SessionModel
 from app.models.schemas import ChatHistoryResponse, ChatHistoryItem
 from app.api.routes.auth import get_current_user
+from app.api.routes.chat import _llm_unavailable
+from app.services.llm_resilience import LLMUnavailable
 import json
 import os
 
@@ -409,9 +411,7 @@ async def generate_session_title(session_id: str):
         Return only the title, nothing else.
         """
         
-        response = ai_service.model.generate_content(title_prompt)
-        # Extract text from Gemini response safely
-        response_text = ai_service._extract_response_text(response)
+        response_text = await ai_service.generate_text(title_prompt)
         generated_title = response_text.strip().strip('"').strip("'")
         
         # Limit title length
@@ -426,6 +426,8 @@ async def generate_session_title(session_id: str):
         
         return {"title": generated_title, "message": "Title generated successfully"}
         
+    except LLMUnavailable as e:
+        raise _llm_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate title: {str(e)}")
 
@@ -466,9 +468,7 @@ async def generate_session_summary(session_id: str):
         Provide a concise summary that captures the essence of the conversation.
         """
         
-        response = ai_service.model.generate_content(summary_prompt)
-        # Extract text from Gemini response safely
-        generated_summary = ai_service._extract_response_text(response).strip()
+        generated_summary = (await ai_service.generate_text(summary_prompt)).strip()
         
         # Update session with generated summary
         await sessions_collection.update_one(
@@ -478,6 +478,8 @@ async def generate_session_summary(session_id: str):
         
         return {"summary": generated_summary, "message": "Summary generated successfully"}
         
+    except LLMUnavailable as e:
+        raise _llm_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate summary: {str(e)}")
 
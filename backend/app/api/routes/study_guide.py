@@ -224,8 +224,7 @@ async def generate_study_guide_content(documents, sessions, messages, user):
         """
 
         # Generate response using AI
-        response = ai_service.model.generate_content(prompt)
-        response_text = ai_service._extract_response_text(response)
+        response_text = await ai_service.generate_text(prompt)
 
         # Try to parse JSON response
         try:
@@ -337,8 +336,7 @@ async def generate_document_summary(documents, user):
         """
 
         # Generate response using AI
-        response = ai_service.model.generate_content(prompt)
-        response_text = ai_service._extract_response_text(response)
+        response_text = await ai_service.generate_text(prompt)
 
         # Try to parse JSON response
         try:
@@ -4,12 +4,10 @@ from fastapi import (
     File,
     HTTPException,
     Depends,
+    Request,
 )
 
-import os
-import uuid
-
-from datetime import datetime
+from typing import List
 
 from app.services.document_processor import (
     DocumentProcessor,
@@ -19,8 +17,35 @@ from app.services.vector_store import (
     VectorStore,
 )
 
+from app.services.ingestion import (
+    IngestionService,
+    ChunkQuotaExceeded,
+    ReindexUnavailable,
+)
+
+from app.services.text_cache import (
+    TextCache,
+)
+
+from app.services.admission import (
+    AdmissionController,
+    AdmissionRejected,
+)
+
+from app.services.upload_receiver import (
+    receive_upload,
+    UploadRejected,
+)
+
+from app.services.resumable_upload import (
+    ResumableUploads,
+)
+
 from app.models.schemas import (
     UploadResponse,
+    BatchUploadResponse,
+    ResumableUploadRequest,
+    ResumableUploadStatus,
 )
 
 from app.services.database import (
@@ -35,13 +60,45 @@ from app.core.config import settings
 
 router = APIRouter()
 
-document_processor = DocumentProcessor()
+document_processor = DocumentProcessor(
+    text_cache=(
+        TextCache()
+        if settings.TEXT_CACHE_ENABLED
+        else None
+    )
+)
 
-# Shared vector store
+# Shared vector store and stored
+# summaries / key points
 from app.api.routes.chat import (
     get_vector_store,
+    document_artifacts,
 )
 
+# Bounds the memory of concurrent ingestions;
+# uploads over budget queue, then get a 503
+admission_controller = AdmissionController()
+
+ingestion_service = IngestionService(
+    document_processor,
+    get_vector_store,
+    admission=admission_controller,
+    artifacts=document_artifacts
+)
+
+
+def _busy(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={
+            "Retry-After":
+                str(e.retry_after)
+        }
+    )
+
+resumable_uploads = ResumableUploads()
+
 
 @router.get("/test")
 async def test_endpoint():
@@ -107,86 +164,34 @@ async def upload_document(
             f"{file.filename}"
         )
 
-        # READ FILE
-        file_content = await file.read()
-
-        file_size = len(file_content)
-
-        print(
-            f"File size: {file_size}"
-        )
-
-        # EMPTY FILE
-        if file_size == 0:
-            raise HTTPException(
-                status_code=400,
-                detail="Uploaded file is empty"
-            )
-
-        # MAX SIZE 20MB
-        max_size = 20 * 1024 * 1024
-
-        if file_size > max_size:
-            raise HTTPException(
-                status_code=400,
-                detail=(
-                    "File exceeds 20MB limit"
-                )
-            )
-
-        # FILE TYPE
-        file_extension = os.path.splitext(
-            file.filename
-        )[1].lower()
-
-        allowed_extensions = [
-            ".pdf",
-            ".docx",
-            ".txt"
-        ]
-
-        if (
-            file_extension
-            not in allowed_extensions
-        ):
-            raise HTTPException(
-                status_code=400,
-                detail=(
-                    "Only PDF, DOCX, TXT "
-                    "files are allowed"
-                )
-            )
-
-        print(
-            f"File extension valid: "
-            f"{file_extension}"
-        )
-
         # =========================
-        # SAVE FILE
+        # RECEIVE FILE
         # =========================
 
-        os.makedirs(
-            settings.UPLOAD_FOLDER,
-            exist_ok=True
-        )
+        # Don't take the bytes when the ingestion
+        # queue is already full
+        try:
+            admission_controller.check_capacity()
 
-        unique_filename = (
-            f"{uuid.uuid4()}"
-            f"{file_extension}"
-        )
+        except AdmissionRejected as e:
+            raise _busy(e)
 
-        file_path = os.path.join(
-            settings.UPLOAD_FOLDER,
-            unique_filename
-        )
+        # Size, type and hash are checked on the
+        # file the server spooled; it is ingested
+        # from there without another copy
+        try:
+            received = await receive_upload(file)
 
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        except UploadRejected as e:
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=str(e)
+            )
 
         print(
-            f"Saved file to: "
-            f"{file_path}"
+            f"Received {received['file_size']} "
+            f"bytes (sha256 "
+            f"{received['sha256'][:12]})"
         )
 
         # =========================
@@ -203,118 +208,198 @@ async def upload_document(
             f"for user: {user_id}"
         )
 
-        result = (
-            document_processor.process_document(
-                file_path,
+        # Identical bytes already processed are
+        # linked to the existing chunk set
+        try:
+            result = await ingestion_service.ingest(
+                received,
                 file.filename,
                 user_id
             )
-        )
+
+        except ChunkQuotaExceeded as e:
+            raise HTTPException(
+                status_code=413,
+                detail=str(e)
+            )
+
+        except AdmissionRejected as e:
+            raise _busy(e)
 
         print(
             "Document processed successfully"
+            if not result["deduplicated"]
+            else "Document linked to existing content"
         )
 
         # =========================
-        # VECTOR STORE
+        # RESPONSE
         # =========================
 
-        vector_store = get_vector_store()
+        return UploadResponse(
+            document_id=
+                result["document_id"],
 
-        success = vector_store.add_documents(
-            result["chunks"]
-        )
+            filename=
+                result["filename"],
 
-        if not success:
-            raise HTTPException(
-                status_code=500,
-                detail=(
-                    "Failed to index "
-                    "document"
-                )
-            )
+            file_size=
+                result["file_size"],
 
-        print(
-            "Document added to "
-            "vector store"
+            status="processed",
+
+            message=(
+                "Document uploaded "
+                "successfully"
+            ),
+
+            deduplicated=
+                result["deduplicated"]
         )
 
-        # =========================
-        # SAVE TO MONGODB
-        # =========================
+    except HTTPException as e:
 
-        documents_collection = (
-            get_documents_collection()
+        print(
+            f"HTTP ERROR: {e.detail}"
         )
 
-        if documents_collection is not None:
+        raise e
 
-            document_record = {
-                "document_id":
-                    result["document_id"],
+    except Exception as e:
 
-                "filename":
-                    result["filename"],
+        print(
+            f"UPLOAD ERROR: {str(e)}"
+        )
 
-                "original_filename":
-                    file.filename,
+        import traceback
+        traceback.print_exc()
 
-                "file_size":
-                    result["file_size"],
+        raise HTTPException(
+            status_code=500,
+            detail=(
+                f"Upload failed: {str(e)}"
+            )
+        )
 
-                "user_id":
-                    user_id,
 
-                "uploaded_at":
-                    datetime.utcnow(),
+# =========================
+# BATCH UPLOAD
+# =========================
 
-                "status":
-                    "processed",
+@router.post(
+    "/upload/batch",
+    response_model=BatchUploadResponse
+)
+async def upload_documents_batch(
+    files: List[UploadFile] = File(...),
+    current_user: dict = Depends(
+        get_current_user
+    )
+):
 
-                "chunk_count":
-                    len(result["chunks"])
-            }
+    try:
+        print("\n=== BATCH UPLOAD STARTED ===")
 
-            await documents_collection.insert_one(
-                document_record
+        if not files:
+            raise HTTPException(
+                status_code=400,
+                detail="No files uploaded"
             )
 
-            print(
-                "Saved document metadata "
-                "to MongoDB"
+        if len(files) > settings.BATCH_UPLOAD_MAX_FILES:
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"At most "
+                    f"{settings.BATCH_UPLOAD_MAX_FILES} "
+                    f"files per batch"
+                )
             )
 
+        user_id = str(
+            current_user.get("_id")
+            or current_user.get("id")
+        )
+
+        try:
+            admission_controller.check_capacity()
+
+        except AdmissionRejected as e:
+            raise _busy(e)
+
         # =========================
-        # CLEANUP
+        # RECEIVE FILES
         # =========================
 
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # Rejected files are reported per file
+        # instead of failing the whole batch
+        results = [None] * len(files)
+        to_ingest = []
+
+        for i, file in enumerate(files):
+
+            filename = (
+                file.filename
+                or f"file_{i + 1}"
+            )
+
+            try:
+                received = await receive_upload(
+                    file
+                )
 
-            print(
-                "Temporary file removed"
+            except UploadRejected as e:
+                results[i] = {
+                    "filename": filename,
+                    "status": "failed",
+                    "error": str(e)
+                }
+                continue
+
+            to_ingest.append(
+                (i, received, filename)
             )
 
+        print(
+            f"Received {len(to_ingest)} of "
+            f"{len(files)} files for user "
+            f"{user_id}"
+        )
+
         # =========================
-        # RESPONSE
+        # PROCESS DOCUMENTS
         # =========================
 
-        return UploadResponse(
-            document_id=
-                result["document_id"],
+        try:
+            batch_results = (
+                await ingestion_service.ingest_batch(
+                    [
+                        (received, filename)
+                        for _, received, filename
+                        in to_ingest
+                    ],
+                    user_id
+                )
+            )
 
-            filename=
-                result["filename"],
+        except AdmissionRejected as e:
+            raise _busy(e)
 
-            file_size=
-                result["file_size"],
+        for (i, _, _), result in zip(
+            to_ingest,
+            batch_results
+        ):
+            results[i] = result
 
-            status="processed",
+        failed = sum(
+            1 for result in results
+            if result["status"] == "failed"
+        )
 
-            message=(
-                "Document uploaded "
-                "successfully"
-            )
+        return BatchUploadResponse(
+            results=results,
+            processed=len(results) - failed,
+            failed=failed
         )
 
     except HTTPException as e:
@@ -328,12 +413,186 @@ async def upload_document(
     except Exception as e:
 
         print(
-            f"UPLOAD ERROR: {str(e)}"
+            f"BATCH UPLOAD ERROR: {str(e)}"
         )
 
         import traceback
         traceback.print_exc()
 
+        raise HTTPException(
+            status_code=500,
+            detail=(
+                f"Batch upload failed: "
+                f"{str(e)}"
+            )
+        )
+
+
+# =========================
+# RESUMABLE UPLOADS
+# =========================
+
+# A session is opened with the file's name and
+# size, then byte ranges are PUT in order with
+# Content-Range: bytes start-end/total. After a
+# dropped connection, GET the session and resume
+# from "received"
+
+@router.post(
+    "/uploads",
+    response_model=ResumableUploadStatus
+)
+async def create_resumable_upload(
+    request: ResumableUploadRequest,
+    current_user: dict = Depends(
+        get_current_user
+    )
+):
+
+    user_id = str(
+        current_user.get("_id")
+        or current_user.get("id")
+    )
+
+    try:
+        return await resumable_uploads.create(
+            user_id,
+            request.filename,
+            request.file_size
+        )
+
+    except UploadRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e)
+        )
+
+
+@router.get(
+    "/uploads/{upload_id}",
+    response_model=ResumableUploadStatus
+)
+async def get_resumable_upload(
+    upload_id: str,
+    current_user: dict = Depends(
+        get_current_user
+    )
+):
+
+    user_id = str(
+        current_user.get("_id")
+        or current_user.get("id")
+    )
+
+    try:
+        session = await resumable_uploads.get(
+            upload_id,
+            user_id
+        )
+
+    except UploadRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e)
+        )
+
+    return resumable_uploads.status(session)
+
+
+@router.put(
+    "/uploads/{upload_id}",
+    response_model=ResumableUploadStatus
+)
+async def append_resumable_upload(
+    upload_id: str,
+    request: Request,
+    current_user: dict = Depends(
+        get_current_user
+    )
+):
+
+    user_id = str(
+        current_user.get("_id")
+        or current_user.get("id")
+    )
+
+    try:
+        session = await resumable_uploads.get(
+            upload_id,
+            user_id
+        )
+
+        # The body is streamed straight into
+        # the part file, never held whole
+        return await resumable_uploads.append(
+            session,
+            request.headers.get("content-range"),
+            request.stream()
+        )
+
+    except UploadRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e)
+        )
+
+
+@router.post(
+    "/uploads/{upload_id}/complete",
+    response_model=UploadResponse
+)
+async def complete_resumable_upload(
+    upload_id: str,
+    current_user: dict = Depends(
+        get_current_user
+    )
+):
+
+    user_id = str(
+        current_user.get("_id")
+        or current_user.get("id")
+    )
+
+    try:
+        session = await resumable_uploads.get(
+            upload_id,
+            user_id
+        )
+
+        # Hash was computed as ranges arrived;
+        # the part file goes to ingestion as is
+        received = await resumable_uploads.complete(
+            session
+        )
+
+    except UploadRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e)
+        )
+
+    try:
+        result = await ingestion_service.ingest(
+            received,
+            session["filename"],
+            user_id
+        )
+
+    except ChunkQuotaExceeded as e:
+        raise HTTPException(
+            status_code=413,
+            detail=str(e)
+        )
+
+    except AdmissionRejected as e:
+        raise _busy(e)
+
+    except Exception as e:
+
+        print(
+            f"RESUMABLE UPLOAD ERROR: {str(e)}"
+        )
+
         raise HTTPException(
             status_code=500,
             detail=(
@@ -341,6 +600,67 @@ async def upload_document(
             )
         )
 
+    # Kept on failure so completing can be
+    # retried without sending the bytes again
+    await resumable_uploads.discard(upload_id)
+
+    return UploadResponse(
+        document_id=
+            result["document_id"],
+
+        filename=
+            result["filename"],
+
+        file_size=
+            result["file_size"],
+
+        status="processed",
+
+        message=(
+            "Document uploaded "
+            "successfully"
+        ),
+
+        deduplicated=
+            result["deduplicated"]
+    )
+
+
+@router.delete("/uploads/{upload_id}")
+async def abort_resumable_upload(
+    upload_id: str,
+    current_user: dict = Depends(
+        get_current_user
+    )
+):
+
+    user_id = str(
+        current_user.get("_id")
+        or current_user.get("id")
+    )
+
+    try:
+        await resumable_uploads.get(
+            upload_id,
+            user_id
+        )
+
+    except UploadRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e)
+        )
+
+    await resumable_uploads.discard(upload_id)
+
+    return {
+        "message":
+            "Upload aborted",
+
+        "upload_id":
+            upload_id
+    }
+
 
 # =========================
 # LIST DOCUMENTS
@@ -401,6 +721,13 @@ async def list_documents(
                         doc.get(
                             "uploaded_at"
                         ),
+
+                    # Per-stage timings and counts
+                    # recorded at ingestion
+                    "ingest_stats":
+                        doc.get(
+                            "ingest_stats"
+                        ),
                 }
                 for doc in documents
             ]
@@ -412,6 +739,284 @@ async def list_documents(
             f"LIST DOCS ERROR: {str(e)}"
         )
 
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+
+# =========================
+# DELETE DOCUMENT
+# =========================
+
+@router.delete("/documents/{document_id}")
+async def delete_document(
+    document_id: str,
+    current_user: dict = Depends(
+        get_current_user
+    )
+):
+
+    try:
+        documents_collection = (
+            get_documents_collection()
+        )
+
+        if documents_collection is None:
+            raise HTTPException(
+                status_code=503,
+                detail="Database not available"
+            )
+
+        user_id = str(
+            current_user.get("_id")
+            or current_user.get("id")
+        )
+
+        result = (
+            await documents_collection.delete_one(
+                {
+                    "document_id": document_id,
+                    "user_id": user_id
+                }
+            )
+        )
+
+        if result.deleted_count == 0:
+            raise HTTPException(
+                status_code=404,
+                detail="Document not found"
+            )
+
+        # Chunks are shared between owners of
+        # identical files; only the last
+        # reference removes them
+        chunks_removed = (
+            await ingestion_service.release(
+                document_id
+            )
+        )
+
+        return {
+            "message":
+                "Document deleted successfully",
+
+            "document_id":
+                document_id,
+
+            "chunks_removed":
+                chunks_removed
+        }
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+
+        print(
+            f"DELETE DOC ERROR: {str(e)}"
+        )
+
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+
+# =========================
+# REPLACE DOCUMENT
+# =========================
+
+@router.put("/documents/{document_id}")
+async def replace_document(
+    document_id: str,
+    file: UploadFile = File(...),
+    current_user: dict = Depends(
+        get_current_user
+    )
+):
+
+    try:
+        documents_collection = (
+            get_documents_collection()
+        )
+
+        if documents_collection is None:
+            raise HTTPException(
+                status_code=503,
+                detail="Database not available"
+            )
+
+        user_id = str(
+            current_user.get("_id")
+            or current_user.get("id")
+        )
+
+        document_record = (
+            await documents_collection.find_one(
+                {
+                    "document_id": document_id,
+                    "user_id": user_id
+                }
+            )
+        )
+
+        if not document_record:
+            raise HTTPException(
+                status_code=404,
+                detail="Document not found"
+            )
+
+        try:
+            admission_controller.check_capacity()
+
+        except AdmissionRejected as e:
+            raise _busy(e)
+
+        try:
+            received = await receive_upload(file)
+
+        except UploadRejected as e:
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=str(e)
+            )
+
+        # Only chunks whose text changed are
+        # embedded; unchanged ones are kept
+        try:
+            result = await ingestion_service.replace(
+                document_record,
+                received,
+                file.filename
+                or document_record["filename"]
+            )
+
+        except ChunkQuotaExceeded as e:
+            raise HTTPException(
+                status_code=413,
+                detail=str(e)
+            )
+
+        except AdmissionRejected as e:
+            raise _busy(e)
+
+        return {
+            "message":
+                "Document replaced successfully",
+
+            # Differs from the requested id when
+            # the old version was shared
+            "document_id":
+                result["document_id"],
+
+            "chunk_count":
+                result["chunk_count"],
+
+            "chunks_added":
+                result["added"],
+
+            "chunks_reused":
+                result["reused"],
+
+            "chunks_removed":
+                result["removed"]
+        }
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+
+        print(
+            f"REPLACE DOC ERROR: {str(e)}"
+        )
+
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+
+# =========================
+# REINDEX DOCUMENT
+# =========================
+
+@router.post("/documents/{document_id}/reindex")
+async def reindex_document(
+    document_id: str,
+    current_user: dict = Depends(
+        get_current_user
+    )
+):
+
+    try:
+        documents_collection = (
+            get_documents_collection()
+        )
+
+        if documents_collection is None:
+            raise HTTPException(
+                status_code=503,
+                detail="Database not available"
+            )
+
+        user_id = str(
+            current_user.get("_id")
+            or current_user.get("id")
+        )
+
+        document_record = (
+            await documents_collection.find_one(
+                {
+                    "document_id": document_id,
+                    "user_id": user_id
+                }
+            )
+        )
+
+        if not document_record:
+            raise HTTPException(
+                status_code=404,
+                detail="Document not found"
+            )
+
+        # Rebuilt from the extracted-text cache,
+        # without parsing the original file
+        try:
+            result = await ingestion_service.reindex(
+                document_record
+            )
+
+        except ReindexUnavailable as e:
+            raise HTTPException(
+                status_code=409,
+                detail=str(e)
+            )
+
+        except AdmissionRejected as e:
+            raise _busy(e)
+
+        return {
+            "message":
+                "Document re-indexed successfully",
+
+            "document_id":
+                document_id,
+
+            "chunk_count":
+                result["chunk_count"]
+        }
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+
+        print(
+            f"REINDEX ERROR: {str(e)}"
+        )
+
         raise HTTPException(
             status_code=500,
             detail=str(e)
@@ -24,6 +24,99 @@ class Settings(BaseSettings):
         env="GOOGLE_API_KEY"
     )
 
+    # LLM calls in progress at once per worker; further calls wait for a slot
+    LLM_MAX_IN_FLIGHT: int = Field(
+        default=32,
+        env="LLM_MAX_IN_FLIGHT"
+    )
+
+    # Each request to the LLM gives up after LLM_TIMEOUT_SECONDS (for streams:
+    # between pieces of text); timeouts and transient errors are retried up
+    # to LLM_MAX_RETRIES times with jittered exponential backoff
+    LLM_TIMEOUT_SECONDS: float = Field(
+        default=60.0,
+        env="LLM_TIMEOUT_SECONDS"
+    )
+
+    LLM_MAX_RETRIES: int = Field(
+        default=2,
+        env="LLM_MAX_RETRIES"
+    )
+
+    LLM_RETRY_BASE_SECONDS: float = Field(
+        default=0.5,
+        env="LLM_RETRY_BASE_SECONDS"
+    )
+
+    LLM_RETRY_MAX_SECONDS: float = Field(
+        default=8.0,
+        env="LLM_RETRY_MAX_SECONDS"
+    )
+
+    # Send a duplicate request when one runs past the p95 of recent latencies
+    LLM_HEDGE_ENABLED: bool = Field(
+        default=False,
+        env="LLM_HEDGE_ENABLED"
+    )
+
+    # After this many consecutive failed calls, LLM calls fail fast for
+    # LLM_CIRCUIT_RESET_SECONDS before one is let through to probe
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = Field(
+        default=5,
+        env="LLM_CIRCUIT_FAILURE_THRESHOLD"
+    )
+
+    LLM_CIRCUIT_RESET_SECONDS: float = Field(
+        default=30.0,
+        env="LLM_CIRCUIT_RESET_SECONDS"
+    )
+
+    # LLM backend: "gemini", or "stub" to answer locally without network
+    # (for benchmarks and load tests)
+    LLM_PROVIDER: str = Field(
+        default="gemini",
+        env="LLM_PROVIDER"
+    )
+
+    # Stub provider: "echo" or "canned" output, and a latency distribution
+    # ("fixed", "uniform" or "lognormal") around LLM_STUB_LATENCY_MS with
+    # LLM_STUB_LATENCY_SPREAD (fraction for uniform, sigma for lognormal)
+    LLM_STUB_MODE: str = Field(
+        default="echo",
+        env="LLM_STUB_MODE"
+    )
+
+    LLM_STUB_RESPONSE: str = Field(
+        default="This is a canned response from the stub LLM provider.",
+        env="LLM_STUB_RESPONSE"
+    )
+
+    LLM_STUB_LATENCY_DISTRIBUTION: str = Field(
+        default="lognormal",
+        env="LLM_STUB_LATENCY_DISTRIBUTION"
+    )
+
+    LLM_STUB_LATENCY_MS: float = Field(
+        default=800.0,
+        env="LLM_STUB_LATENCY_MS"
+    )
+
+    LLM_STUB_LATENCY_SPREAD: float = Field(
+        default=0.5,
+        env="LLM_STUB_LATENCY_SPREAD"
+    )
+
+    LLM_STUB_SEED: int = Field(
+        default=0,
+        env="LLM_STUB_SEED"
+    )
+
+    # Fraction of stub calls that fail with a retryable error
+    LLM_STUB_ERROR_RATE: float = Field(
+        default=0.0,
+        env="LLM_STUB_ERROR_RATE"
+    )
+
     # MongoDB
     MONGODB_URL: str = Field(
         default="mongodb://localhost:27017",
@@ -58,6 +151,157 @@ class Settings(BaseSettings):
         env="UPLOAD_FOLDER"
     )
 
+    # Bytes read from the request body per iteration while receiving uploads
+    UPLOAD_CHUNK_SIZE: int = Field(
+        default=1024 * 1024,
+        env="UPLOAD_CHUNK_SIZE"
+    )
+
+    # Resumable uploads not finished within this many hours are discarded
+    RESUMABLE_UPLOAD_TTL_HOURS: int = Field(
+        default=24,
+        env="RESUMABLE_UPLOAD_TTL_HOURS"
+    )
+
+    # How often part files of abandoned resumable uploads are looked for
+    RESUMABLE_UPLOAD_CLEANUP_MINUTES: int = Field(
+        default=60,
+        env="RESUMABLE_UPLOAD_CLEANUP_MINUTES"
+    )
+
+    # Ingestion
+    # Chunks extracted, embedded and indexed together; bounds ingestion memory
+    INGEST_WINDOW_CHUNKS: int = Field(
+        default=200,
+        env="INGEST_WINDOW_CHUNKS"
+    )
+
+    # Total chunks a user may have indexed across documents (0 = unlimited)
+    USER_CHUNK_QUOTA: int = Field(
+        default=50000,
+        env="USER_CHUNK_QUOTA"
+    )
+
+    # Batch uploads: files per request, and files extracted in parallel
+    BATCH_UPLOAD_MAX_FILES: int = Field(
+        default=20,
+        env="BATCH_UPLOAD_MAX_FILES"
+    )
+
+    BATCH_UPLOAD_CONCURRENCY: int = Field(
+        default=4,
+        env="BATCH_UPLOAD_CONCURRENCY"
+    )
+
+    # Admission control: estimated memory all running ingestions may use,
+    # ingestions allowed to wait for it, and how long they wait before the
+    # request is rejected with Retry-After
+    INGEST_MEMORY_BUDGET: int = Field(
+        default=512 * 1024 * 1024,
+        env="INGEST_MEMORY_BUDGET"
+    )
+
+    INGEST_QUEUE_MAX: int = Field(
+        default=16,
+        env="INGEST_QUEUE_MAX"
+    )
+
+    INGEST_QUEUE_TIMEOUT: float = Field(
+        default=30.0,
+        env="INGEST_QUEUE_TIMEOUT"
+    )
+
+    # How chunk text is stored: "windows" keeps the splitter's overlapping
+    # chunks, "segments" stores non-overlapping text once and rebuilds the
+    # overlap from neighbouring segments at query time
+    CHUNK_STORAGE_MODE: str = Field(
+        default="windows",
+        env="CHUNK_STORAGE_MODE"
+    )
+
+    # Estimated tokens of retrieved context sent with a chat question, and the
+    # shingle similarity above which a chunk counts as a near-duplicate
+    CONTEXT_TOKEN_BUDGET: int = Field(
+        default=6000,
+        env="CONTEXT_TOKEN_BUDGET"
+    )
+
+    CONTEXT_DUPLICATE_THRESHOLD: float = Field(
+        default=0.8,
+        env="CONTEXT_DUPLICATE_THRESHOLD"
+    )
+
+    # Map-reduce summarization: estimated tokens per summarized group, the
+    # average number of items per group, and groups summarized at once
+    SUMMARY_GROUP_TOKENS: int = Field(
+        default=8000,
+        env="SUMMARY_GROUP_TOKENS"
+    )
+
+    SUMMARY_FAN_IN: int = Field(
+        default=8,
+        env="SUMMARY_FAN_IN"
+    )
+
+    SUMMARY_MAP_CONCURRENCY: int = Field(
+        default=4,
+        env="SUMMARY_MAP_CONCURRENCY"
+    )
+
+    # Ask for the chat answer, follow-up questions and (for a new session) its
+    # title as one JSON response, instead of separate LLM calls
+    CHAT_STRUCTURED_ANSWERS: bool = Field(
+        default=True,
+        env="CHAT_STRUCTURED_ANSWERS"
+    )
+
+    # Answers reused for questions whose embedding is at least this similar,
+    # which use the same negations and retrieved exactly the same chunks
+    ANSWER_CACHE_ENABLED: bool = Field(
+        default=True,
+        env="ANSWER_CACHE_ENABLED"
+    )
+
+    ANSWER_CACHE_SIMILARITY: float = Field(
+        default=0.95,
+        env="ANSWER_CACHE_SIMILARITY"
+    )
+
+    ANSWER_CACHE_TTL_SECONDS: int = Field(
+        default=3600,
+        env="ANSWER_CACHE_TTL_SECONDS"
+    )
+
+    ANSWER_CACHE_MAX_ENTRIES: int = Field(
+        default=1000,
+        env="ANSWER_CACHE_MAX_ENTRIES"
+    )
+
+    # Generate each new document's summary and key points in the background
+    # after ingestion, instead of on first request
+    DOCUMENT_ARTIFACTS_PREGENERATE: bool = Field(
+        default=True,
+        env="DOCUMENT_ARTIFACTS_PREGENERATE"
+    )
+
+    # Compressed extracted text, keyed by content hash and extractor version
+    TEXT_CACHE_ENABLED: bool = Field(
+        default=True,
+        env="TEXT_CACHE_ENABLED"
+    )
+
+    TEXT_CACHE_DIR: str = Field(
+        default="./text_cache",
+        env="TEXT_CACHE_DIR"
+    )
+
+    # Compressed bytes the text cache may hold before least recently used
+    # entries are evicted (0 = unlimited)
+    TEXT_CACHE_MAX_BYTES: int = Field(
+        default=1024 * 1024 * 1024,
+        env="TEXT_CACHE_MAX_BYTES"
+    )
+
     # Security
     SECRET_KEY: str = Field(
         default="change_this_secret_key",
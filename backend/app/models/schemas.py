@@ -6,11 +6,16 @@ class ChatRequest(BaseModel):
     question: str = Field(..., description="User's question")
     session_id: Optional[str] = Field(None, description="Session ID for conversation context")
     document_id: Optional[str] = Field(None, description="Document ID to query")
+    bypass_cache: bool = Field(False, description="Generate a fresh answer instead of reusing a cached one")
 
 class ChatResponse(BaseModel):
     answer: str = Field(..., description="AI-generated answer")
     sources: List[Dict[str, Any]] = Field(..., description="Source chunks used for answer")
     session_id: str = Field(..., description="Session ID")
+    cached: bool = Field(False, description="Whether the answer was reused from the answer cache")
+    prompt_tokens: Optional[int] = Field(None, description="Estimated tokens of the prompt sent to the LLM")
+    follow_up_questions: Optional[List[str]] = Field(None, description="Suggested follow-up questions, generated with the answer")
+    title: Optional[str] = Field(None, description="Title given to a new session, generated with the answer")
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
@@ -25,6 +30,44 @@ class UploadResponse(BaseModel):
     file_size: int = Field(..., description="File size in bytes")
     status: str = Field(..., description="Processing status")
     message: str = Field(..., description="Status message")
+    deduplicated: bool = Field(False, description="Whether identical content was already processed and linked")
+
+class BatchUploadItem(BaseModel):
+    filename: str = Field(..., description="Original filename")
+    status: str = Field(..., description="'processed' or 'failed'")
+    document_id: Optional[str] = Field(None, description="Unique document ID")
+    file_size: Optional[int] = Field(None, description="File size in bytes")
+    chunk_count: Optional[int] = Field(None, description="Number of chunks indexed")
+    deduplicated: bool = Field(False, description="Whether identical content was already processed and linked")
+    error: Optional[str] = Field(None, description="Why the file failed")
+
+class BatchUploadResponse(BaseModel):
+    results: List[BatchUploadItem] = Field(..., description="Per-file results, in upload order")
+    processed: int = Field(..., description="Number of files processed")
+    failed: int = Field(..., description="Number of files that failed")
+
+class ResumableUploadRequest(BaseModel):
+    filename: str = Field(..., min_length=1, description="Original filename")
+    file_size: int = Field(..., gt=0, description="Total file size in bytes")
+
+class ResumableUploadStatus(BaseModel):
+    upload_id: str = Field(..., description="Upload session ID")
+    filename: str = Field(..., description="Original filename")
+    file_size: int = Field(..., description="Total file size in bytes")
+    received: int = Field(..., description="Bytes received so far; the next range starts here")
+    complete: bool = Field(..., description="Whether every byte has been received")
+    chunk_size: int = Field(..., description="Suggested range size in bytes")
+    expires_at: datetime = Field(..., description="When the unfinished upload is discarded")
+
+class ChunkRef(BaseModel):
+    document_id: str = Field(..., description="Document ID")
+    chunk_index: int = Field(..., ge=0, description="Chunk position in the document")
+
+class ChunkFetchRequest(BaseModel):
+    refs: List[ChunkRef] = Field(..., max_length=100, description="Chunks to fetch, e.g. a message's sources")
+
+class ChunkFetchResponse(BaseModel):
+    chunks: List[Dict[str, Any]] = Field(..., description="Chunk text and location; inaccessible or missing chunks are omitted")
 
 class FeedbackRequest(BaseModel):
     session_id: str = Field(..., description="Session ID")
@@ -0,0 +1,177 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Optional, Tuple
+
+from app.core.config import settings
+from app.services.metrics import (
+    INGEST_ADMISSIONS,
+    INGEST_MEMORY_RESERVED_BYTES,
+    INGEST_QUEUE_DEPTH,
+    INGEST_QUEUE_WAIT_SECONDS,
+)
+
+# Peak memory per byte of upload, by file type: the bytes themselves, the
+# extracted text (up to 4 bytes per character once decoded) and, for DOCX,
+# the inflated XML
+MEMORY_PER_BYTE = {
+    ".pdf": 4,
+    ".docx": 8,
+    ".txt": 5,
+}
+
+# Per-ingestion overhead independent of file size: one window of chunks,
+# their dense embedding matrix and the split buffer
+BASE_MEMORY_BYTES = 16 * 1024 * 1024
+
+# Bounds for the Retry-After hint, in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 300
+
+
+class AdmissionRejected(Exception):
+    """Raised when an ingestion cannot be admitted; retry after ``retry_after`` seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Limits concurrent ingestion by an estimated memory budget.
+
+    Every ingestion reserves its estimated peak memory before extracting and
+    releases it when done. Ingestions that do not fit wait in FIFO order, up
+    to INGEST_QUEUE_MAX of them for at most INGEST_QUEUE_TIMEOUT seconds;
+    beyond that they are rejected with a Retry-After hint. An ingestion
+    larger than the whole budget is admitted alone. Used from the event loop
+    only.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None, max_queue: Optional[int] = None,
+                 queue_timeout: Optional[float] = None):
+        self.budget_bytes = budget_bytes or settings.INGEST_MEMORY_BUDGET
+        self.max_queue = settings.INGEST_QUEUE_MAX if max_queue is None else max_queue
+        self.queue_timeout = settings.INGEST_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self.reserved_bytes = 0
+        self.running = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+        # Moving average of how long an admitted ingestion holds its reservation
+        self._average_hold_seconds = 5.0
+
+    @staticmethod
+    def estimate(file_size: int, file_extension: Optional[str]) -> int:
+        """Estimated peak memory of ingesting a file of this size and type"""
+        per_byte = MEMORY_PER_BYTE.get((file_extension or "").lower(), max(MEMORY_PER_BYTE.values()))
+        return BASE_MEMORY_BYTES + per_byte * max(file_size, 0)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until a rejected request is worth retrying"""
+        rounds = (self.queue_depth + 1) / max(self.running, 1)
+        seconds = math.ceil(self._average_hold_seconds * rounds)
+        return min(max(seconds, MIN_RETRY_AFTER), MAX_RETRY_AFTER)
+
+    def check_capacity(self) -> None:
+        """Reject early, before an upload is received, when the queue is full"""
+        if self.queue_depth >= self.max_queue:
+            INGEST_ADMISSIONS.inc(outcome="rejected")
+            raise AdmissionRejected(
+                "The server is busy processing other documents. Please try again shortly.",
+                self.retry_after()
+            )
+
+    @asynccontextmanager
+    async def admit(self, cost: int) -> AsyncIterator[None]:
+        """Hold a reservation of ``cost`` bytes for the enclosed block"""
+        cost = min(max(cost, 1), self.budget_bytes)
+        await self.acquire(cost)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - started
+            self._average_hold_seconds = 0.8 * self._average_hold_seconds + 0.2 * held
+            self.release(cost)
+
+    async def acquire(self, cost: int) -> None:
+        if not self._waiters and self.reserved_bytes + cost <= self.budget_bytes:
+            self._reserve(cost)
+            INGEST_ADMISSIONS.inc(outcome="admitted")
+            INGEST_QUEUE_WAIT_SECONDS.observe(0.0)
+            return
+
+        if self.queue_depth >= self.max_queue:
+            INGEST_ADMISSIONS.inc(outcome="rejected")
+            raise AdmissionRejected(
+                "The server is busy processing other documents. Please try again shortly.",
+                self.retry_after()
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (cost, future)
+        self._waiters.append(waiter)
+        INGEST_QUEUE_DEPTH.set(self.queue_depth)
+        print(f"⏳ Ingestion queued ({self.queue_depth} waiting, "
+              f"{self.reserved_bytes // (1024 * 1024)}MB reserved)")
+        started = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._forget(waiter)
+            INGEST_ADMISSIONS.inc(outcome="timed_out")
+            raise AdmissionRejected(
+                "Timed out waiting for other documents to finish processing. Please try again shortly.",
+                self.retry_after()
+            )
+        except BaseException:
+            # Cancelled, e.g. the client went away; a grant that raced in is returned
+            if future.done() and not future.cancelled():
+                self.release(cost)
+            else:
+                self._forget(waiter)
+            raise
+        finally:
+            INGEST_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+        INGEST_ADMISSIONS.inc(outcome="queued")
+
+    def release(self, cost: int) -> None:
+        self.reserved_bytes -= cost
+        self.running -= 1
+        INGEST_MEMORY_RESERVED_BYTES.set(self.reserved_bytes)
+        self._grant_waiters()
+
+    def _reserve(self, cost: int) -> None:
+        self.reserved_bytes += cost
+        self.running += 1
+        INGEST_MEMORY_RESERVED_BYTES.set(self.reserved_bytes)
+
+    def _forget(self, waiter: Tuple[int, asyncio.Future]) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        INGEST_QUEUE_DEPTH.set(self.queue_depth)
+        # The head of the queue may have been what blocked the others
+        self._grant_waiters()
+
+    def _grant_waiters(self) -> None:
+        """Admit waiters in order while the head of the queue fits the budget"""
+        while self._waiters:
+            cost, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.reserved_bytes + cost > self.budget_bytes and self.running:
+                break
+            self._waiters.popleft()
+            self._reserve(cost)
+            future.set_result(None)
+        INGEST_QUEUE_DEPTH.set(self.queue_depth)
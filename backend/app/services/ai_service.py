@@ -1,25 +1,58 @@
-import google.generativeai as genai
-from typing import List, Dict, Any, Optional
+import asyncio
+import hashlib
+import json
+import time
+from typing import AsyncIterator, List, Dict, Any, Optional
 from app.core.config import settings
+from app.services.context_packer import ContextPacker, estimate_tokens
+from app.services.llm_providers import LLMProvider, create_provider
+from app.services.llm_resilience import LLMUnavailable, ResilientCaller
+from app.services.single_flight import SingleFlight
+from app.services.summarizer import MapReduceSummarizer
+from app.services.metrics import LLM_FIRST_TOKEN_SECONDS, LLM_IN_FLIGHT, LLM_PROMPT_TOKENS, LLM_WAIT_SECONDS
 import uuid
 from datetime import datetime
 
+# Versions of the document-level prompts; bump one when its prompt changes
+# so stored summaries and key points are generated again
+PROMPT_VERSIONS = {
+    "summary": 2,
+    "key_points": 1,
+}
+
+# Separates a streamed answer from the JSON with its follow-up questions and title
+ANSWER_EXTRAS_MARKER = "<<<ANSWER_EXTRAS>>>"
+
+# Shared by every AIService instance, so LLM_MAX_IN_FLIGHT holds per worker
+_llm_slots: Optional[asyncio.Semaphore] = None
+
+def _llm_semaphore() -> asyncio.Semaphore:
+    global _llm_slots
+    if _llm_slots is None:
+        _llm_slots = asyncio.Semaphore(max(settings.LLM_MAX_IN_FLIGHT, 1))
+    return _llm_slots
+
+# Identical prompts in flight at once share one call, across AIService instances
+_llm_calls = SingleFlight()
+
+# Timeouts, retries, hedging and the circuit breaker, per provider, so every
+# AIService using a provider sees the same health
+_llm_resilience: Dict[str, ResilientCaller] = {}
+
+def _resilience_for(provider: LLMProvider) -> ResilientCaller:
+    if provider.name not in _llm_resilience:
+        _llm_resilience[provider.name] = ResilientCaller(provider.name, provider.is_retryable)
+    return _llm_resilience[provider.name]
+
 class AIService:
-    def __init__(self):
-        # Configure Gemini API
-        print(f"🤖 Initializing Gemini AI with API key: {settings.GOOGLE_API_KEY[:20]}...")
-        genai.configure(api_key=settings.GOOGLE_API_KEY)
-        # Use Gemini 2.5 Flash for reliable performance
-        self.model = genai.GenerativeModel(
-            'models/gemini-2.5-flash',  # Using stable Gemini 2.5 Flash
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.1,  # Lower temperature for more accurate, focused responses
-                top_p=0.8,
-                top_k=40,
-                max_output_tokens=2048,
-            )
-        )
-        print("✅ Gemini AI initialized successfully")
+    def __init__(self, provider: Optional[LLMProvider] = None):
+        # Gemini 2.5 Flash by default; LLM_PROVIDER=stub answers locally
+        self.provider = provider or create_provider()
+
+        # Fits retrieved chunks into CONTEXT_TOKEN_BUDGET for chat prompts
+        self.context_packer = ContextPacker()
+        # Summarizes documents too large for a single prompt
+        self.summarizer = MapReduceSummarizer(self)
 
         # Enhanced system prompt for maximum accuracy like Gemini
         self.system_prompt = """
@@ -49,80 +82,241 @@ class AIService:
         - Highlight key takeaways and important implications
         """
 
-    def _extract_response_text(self, response) -> str:
-        """Extract text from Gemini API response safely"""
-        try:
-            # Try the new format first (parts-based)
-            if hasattr(response, 'parts') and response.parts:
-                return response.parts[0].text
-            elif hasattr(response, 'candidates') and response.candidates:
-                # Access through candidates structure
-                candidate = response.candidates[0]
-                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                    return candidate.content.parts[0].text
-                elif hasattr(candidate, 'text'):
-                    return candidate.text
-            elif hasattr(response, 'text'):
-                # Fallback for simple text response
-                return response.text
-            else:
-                # Last resort - convert to string
-                return str(response)
-        except Exception as e:
-            print(f"❌ Error extracting response text: {str(e)}")
-            return f"Error extracting response: {str(e)}"
+    @property
+    def model_used(self) -> str:
+        return self.provider.model_name.split("/")[-1]
+
+    async def _generate(self, prompt: str) -> str:
+        """Generate response text without blocking the event loop.
+
+        Concurrent calls with the same provider, model, config and prompt
+        share one upstream call and its response.
+        """
+        key = hashlib.sha256(json.dumps(
+            [self.provider.name, self.provider.model_name, self.provider.generation_config, prompt],
+            sort_keys=True
+        ).encode("utf-8")).hexdigest()
+        return await _llm_calls.do(key, lambda: self._call_model(prompt))
+
+    async def _call_model(self, prompt: str) -> str:
+        """Send one prompt to the provider.
+
+        At most LLM_MAX_IN_FLIGHT calls run at once; the rest wait for a slot.
+        Retries and hedged requests run within the call's slot. Raises
+        LLMUnavailable when the provider times out, keeps failing, or its
+        circuit is open.
+        """
+        LLM_PROMPT_TOKENS.observe(estimate_tokens(prompt))
+        started = time.perf_counter()
+        async with _llm_semaphore():
+            LLM_WAIT_SECONDS.observe(time.perf_counter() - started)
+            LLM_IN_FLIGHT.inc()
+            try:
+                return await _resilience_for(self.provider).call(lambda: self.provider.generate(prompt))
+            finally:
+                LLM_IN_FLIGHT.dec()
+
+    async def _stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the response text as it is generated.
+
+        Holds an in-flight slot until the stream ends. Failures before the
+        first piece of text are retried like ``_call_model``.
+        """
+        LLM_PROMPT_TOKENS.observe(estimate_tokens(prompt))
+        started = time.perf_counter()
+        async with _llm_semaphore():
+            LLM_WAIT_SECONDS.observe(time.perf_counter() - started)
+            LLM_IN_FLIGHT.inc()
+            try:
+                stream = _resilience_for(self.provider).stream(lambda: self.provider.stream(prompt))
+                try:
+                    async for text in stream:
+                        yield text
+                finally:
+                    await stream.aclose()
+            finally:
+                LLM_IN_FLIGHT.dec()
+
+    async def generate_text(self, prompt: str) -> str:
+        """Generate a plain text completion for a prompt"""
+        return await self._generate(prompt)
+
+    async def count_tokens(self, text: str) -> int:
+        """Tokens ``text`` takes up for the provider's model"""
+        return await self.provider.count_tokens(text)
     
-    def generate_answer(self, question: str, context_chunks: List[Dict[str, Any]], session_id: Optional[str] = None) -> Dict[str, Any]:
-        """Generate answer using RAG approach"""
+    def _pack_answer_context(self, context_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Fit retrieved chunks into the context budget, logging what was left out"""
+        packed = self.context_packer.pack(context_chunks)
+        dropped = packed["dropped"]
+        print(f"📦 Packed {len(packed['chunks'])}/{len(context_chunks)} chunks into ~{packed['tokens']} tokens "
+              f"({dropped['duplicate']} near-duplicates, {dropped['budget']} over budget dropped)")
+        return packed
+
+    def _answer_prompt(self, question: str, context_text: str) -> str:
+        """Build the RAG prompt for a question over packed context"""
+        # Create enhanced prompt for maximum accuracy
+        return f"""
+        {self.system_prompt}
+        
+        DOCUMENT CONTENT:
+        {context_text}
+        
+        USER QUESTION: {question}
+        
+        ANALYSIS INSTRUCTIONS:
+        1. First, carefully read and analyze all the provided document content
+        2. Identify the specific information that directly addresses the user's question
+        3. Consider the broader context and any related information
+        4. Formulate a comprehensive, accurate response
+        
+        RESPONSE REQUIREMENTS:
+        - Provide a direct, precise answer to the question
+        - Include all relevant details and context from the document
+        - Use specific information, data, examples, or quotes when available
+        - Explain complex concepts clearly and thoroughly
+        - Maintain high accuracy - only use information present in the document
+        - Structure the response logically for easy understanding
+        - If the document doesn't fully address the question, clearly state what information is available vs. what is missing
+        
+        Deliver a response that matches the quality and depth you would expect from Google Gemini when analyzing this document.
+        """
+
+    def _structured_answer_prompt(self, question: str, context_text: str, include_title: bool) -> str:
+        """The RAG prompt, asking for the answer, follow-up questions and optionally a title as JSON"""
+        title_field = (
+            '\n            "title": "a concise, descriptive title (max 50 characters) for a chat session that starts with this question",'
+            if include_title else ""
+        )
+
+        return self._answer_prompt(question, context_text) + f"""
+        RESPONSE FORMAT:
+        Return only a JSON object with this exact structure:
+        {{
+            "answer": "your complete answer, following the requirements above",{title_field}
+            "follow_up_questions": ["3 relevant follow-up questions that build upon the current question and explore different aspects of the topic"]
+        }}
+        """
+
+    def _streamed_structured_answer_prompt(self, question: str, context_text: str, include_title: bool) -> str:
+        """The RAG prompt, asking for the answer as plain text followed by its extras as JSON.
+
+        Unlike ``_structured_answer_prompt`` the answer can be streamed as it
+        is written; the extras come after ANSWER_EXTRAS_MARKER.
+        """
+        title_field = (
+            '\n            "title": "a concise, descriptive title (max 50 characters) for a chat session that starts with this question",'
+            if include_title else ""
+        )
+
+        return self._answer_prompt(question, context_text) + f"""
+        RESPONSE FORMAT:
+        First write your complete answer as plain text, following the requirements above.
+        Then write {ANSWER_EXTRAS_MARKER} on its own line, followed only by a JSON object with this exact structure:
+        {{{title_field}
+            "follow_up_questions": ["3 relevant follow-up questions that build upon the current question and explore different aspects of the topic"]
+        }}
+        """
+
+    @staticmethod
+    def _answer_extras(parsed: Dict[str, Any]) -> Dict[str, Any]:
+        """Follow-up questions and title from a parsed structured response"""
+        follow_ups = parsed.get("follow_up_questions")
+        if not isinstance(follow_ups, list):
+            follow_ups = []
+        title = parsed.get("title")
+        return {
+            "follow_up_questions": [q.strip() for q in follow_ups if isinstance(q, str) and q.strip()][:3],
+            "title": title.strip() if isinstance(title, str) and title.strip() else None,
+        }
+
+    @classmethod
+    def _parse_answer_extras(cls, extras_text: str) -> Dict[str, Any]:
+        """Follow-up questions and title from the text after ANSWER_EXTRAS_MARKER"""
         try:
-            # Prepare context from chunks
-            context_text = self._prepare_context(context_chunks)
-            
-            # Create enhanced prompt for maximum accuracy
-            prompt = f"""
-            {self.system_prompt}
-            
-            DOCUMENT CONTENT:
-            {context_text}
-            
-            USER QUESTION: {question}
-            
-            ANALYSIS INSTRUCTIONS:
-            1. First, carefully read and analyze all the provided document content
-            2. Identify the specific information that directly addresses the user's question
-            3. Consider the broader context and any related information
-            4. Formulate a comprehensive, accurate response
-            
-            RESPONSE REQUIREMENTS:
-            - Provide a direct, precise answer to the question
-            - Include all relevant details and context from the document
-            - Use specific information, data, examples, or quotes when available
-            - Explain complex concepts clearly and thoroughly
-            - Maintain high accuracy - only use information present in the document
-            - Structure the response logically for easy understanding
-            - If the document doesn't fully address the question, clearly state what information is available vs. what is missing
-            
-            Deliver a response that matches the quality and depth you would expect from Google Gemini when analyzing this document.
-            """
+            json_start = extras_text.find('{')
+            json_end = extras_text.rfind('}') + 1
+            if json_start != -1 and json_end > json_start:
+                parsed = json.loads(extras_text[json_start:json_end])
+                if isinstance(parsed, dict):
+                    return cls._answer_extras(parsed)
+        except json.JSONDecodeError:
+            pass
+        print("⚠️ Streamed answer had no valid extras JSON, leaving them out")
+        return {"follow_up_questions": [], "title": None}
+
+    @staticmethod
+    def _marker_prefix_length(text: str) -> int:
+        """Length of the longest end of ``text`` that could begin ANSWER_EXTRAS_MARKER"""
+        for length in range(min(len(text), len(ANSWER_EXTRAS_MARKER) - 1), 0, -1):
+            if text.endswith(ANSWER_EXTRAS_MARKER[:length]):
+                return length
+        return 0
+
+    @classmethod
+    def _parse_structured_answer(cls, response_text: str) -> Dict[str, Any]:
+        """Answer, follow-up questions and title from a structured response.
+
+        When the response is not the requested JSON, all of it is the answer.
+        """
+        try:
+            json_start = response_text.find('{')
+            json_end = response_text.rfind('}') + 1
+            if json_start != -1 and json_end > json_start:
+                parsed = json.loads(response_text[json_start:json_end])
+                if isinstance(parsed, dict) and isinstance(parsed.get("answer"), str) and parsed["answer"].strip():
+                    return {"answer": parsed["answer"].strip(), **cls._answer_extras(parsed)}
+        except json.JSONDecodeError:
+            pass
+        print("⚠️ Structured answer was not valid JSON, using the whole response as the answer")
+        return {"answer": response_text, "follow_up_questions": [], "title": None}
+
+    async def generate_answer(self, question: str, context_chunks: List[Dict[str, Any]], session_id: Optional[str] = None,
+                              structured: bool = False, include_title: bool = False) -> Dict[str, Any]:
+        """Generate answer using RAG approach.
+
+        With ``structured`` the same call also returns "follow_up_questions"
+        and, with ``include_title``, a session "title" (None if the model
+        gave none), instead of separate LLM calls for them.
+
+        Raises LLMUnavailable when the LLM cannot answer, rather than
+        returning an apology as if it were the answer.
+        """
+        try:
+            packed = self._pack_answer_context(context_chunks)
+            if structured:
+                prompt = self._structured_answer_prompt(question, packed["text"], include_title)
+            else:
+                prompt = self._answer_prompt(question, packed["text"])
             
-            # Generate response using Gemini
-            response = self.model.generate_content(prompt)
+            # Generate response using the LLM
+            response_text = await self._generate(prompt)
             
             # Generate unique question ID
             question_id = str(uuid.uuid4())
             
-            # Prepare sources for citation
-            sources = self._prepare_sources(context_chunks)
+            # Cite only the chunks the model was given
+            sources = self._prepare_sources(packed["chunks"])
             
-            return {
-                "answer": self._extract_response_text(response),
+            response = {
+                "answer": response_text,
                 "question_id": question_id,
                 "session_id": session_id or str(uuid.uuid4()),
                 "sources": sources,
                 "timestamp": datetime.utcnow().isoformat(),
-                "model_used": "gemini-2.5-flash"
+                "model_used": self.model_used,
+                "prompt_tokens": estimate_tokens(prompt)
             }
-            
+            if structured:
+                parsed = self._parse_structured_answer(response_text)
+                response["answer"] = parsed["answer"]
+                response["follow_up_questions"] = parsed["follow_up_questions"]
+                if include_title:
+                    response["title"] = parsed["title"]
+            return response
+            
+        except LLMUnavailable:
+            raise
         except Exception as e:
             # Fallback response
             return {
@@ -131,62 +325,133 @@ class AIService:
                 "session_id": session_id or str(uuid.uuid4()),
                 "sources": [],
                 "timestamp": datetime.utcnow().isoformat(),
-                "model_used": "gemini-2.5-flash",
+                "model_used": self.model_used,
                 "error": str(e)
             }
     
+    async def stream_answer(self, question: str, context_chunks: List[Dict[str, Any]],
+                            session_id: Optional[str] = None, structured: bool = False,
+                            include_title: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """Stream an answer as events: "sources", then "token"s, then "done".
+
+        "done" carries the same fields ``generate_answer`` returns. With
+        ``structured`` the model writes follow-up questions (and, with
+        ``include_title``, a session title) after the answer in the same
+        call; only the answer is streamed as tokens, the rest arrives with
+        "done". If the LLM fails midway an "error" event is sent instead of
+        "done".
+        """
+        question_id = str(uuid.uuid4())
+        session_id = session_id or str(uuid.uuid4())
+        packed = self._pack_answer_context(context_chunks)
+        if structured:
+            prompt = self._streamed_structured_answer_prompt(question, packed["text"], include_title)
+        else:
+            prompt = self._answer_prompt(question, packed["text"])
+        sources = self._prepare_sources(packed["chunks"])
+
+        yield {"event": "sources", "data": {
+            "sources": sources,
+            "session_id": session_id,
+            "question_id": question_id,
+        }}
+
+        parts: List[str] = []
+        held = ""  # answer text that may be the start of the extras marker
+        extras: Optional[List[str]] = None  # text after the marker, once it is seen
+        started = time.perf_counter()
+        first = True
+        try:
+            async for text in self._stream(prompt):
+                if first:
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                    first = False
+                if extras is not None:
+                    extras.append(text)
+                    continue
+                if not structured:
+                    parts.append(text)
+                    yield {"event": "token", "data": {"text": text}}
+                    continue
+
+                held += text
+                at = held.find(ANSWER_EXTRAS_MARKER)
+                if at != -1:
+                    extras = [held[at + len(ANSWER_EXTRAS_MARKER):]]
+                    text, held = held[:at], ""
+                else:
+                    keep = self._marker_prefix_length(held)
+                    text, held = held[:len(held) - keep], held[len(held) - keep:]
+                if text:
+                    parts.append(text)
+                    yield {"event": "token", "data": {"text": text}}
+            if held:
+                parts.append(held)
+                yield {"event": "token", "data": {"text": held}}
+        except LLMUnavailable as e:
+            print(f"❌ Streaming answer failed: {str(e)}")
+            yield {"event": "error", "data": {
+                "error": str(e),
+                "retry_after": e.retry_after,
+                "session_id": session_id,
+                "question_id": question_id,
+            }}
+            return
+        except Exception as e:
+            print(f"❌ Streaming answer failed: {str(e)}")
+            yield {"event": "error", "data": {
+                "error": f"I apologize, but I encountered an error while processing your question: {str(e)}. Please try again or rephrase your question.",
+                "session_id": session_id,
+                "question_id": question_id,
+            }}
+            return
+
+        done = {
+            "answer": "".join(parts).strip() if structured else "".join(parts),
+            "question_id": question_id,
+            "session_id": session_id,
+            "sources": sources,
+            "timestamp": datetime.utcnow().isoformat(),
+            "model_used": self.model_used,
+            "prompt_tokens": estimate_tokens(prompt),
+        }
+        if structured:
+            answer_extras = self._parse_answer_extras("".join(extras or []))
+            done["follow_up_questions"] = answer_extras["follow_up_questions"]
+            if include_title:
+                done["title"] = answer_extras["title"]
+        yield {"event": "done", "data": done}
+
     def _prepare_context(self, chunks: List[Dict[str, Any]]) -> str:
-        """Prepare high-quality context text from retrieved chunks"""
-        if not chunks:
-            return ""
-        
-        # Sort chunks by relevance (lower distance = higher relevance)
-        sorted_chunks = sorted(chunks, key=lambda x: x.get("distance", 1.0))
-        
-        context_parts = []
-        seen_content = set()  # Avoid duplicate content
-        
-        for i, chunk in enumerate(sorted_chunks):
-            chunk_text = chunk.get("text", "").strip()
-            if not chunk_text:
-                continue
-                
-            # Skip very similar content to avoid redundancy
-            chunk_hash = hash(chunk_text[:200])  # Hash first 200 chars for similarity check
-            if chunk_hash in seen_content:
-                continue
-            seen_content.add(chunk_hash)
-            
-            # Add metadata context for better understanding
-            metadata = chunk.get("metadata", {})
-            filename = metadata.get("filename", "")
-            
-            # Format the chunk with context
-            if filename:
-                context_parts.append(f"[From: {filename}]\n{chunk_text}")
-            else:
-                context_parts.append(chunk_text)
-        
-        # Join with clear separators
-        return "\n\n---\n\n".join(context_parts)
+        """Prepare context text from chunks, in relevance order without near-duplicates.
+
+        No token budget applies here; chat answers are packed separately.
+        """
+        return self.context_packer.pack(chunks, token_budget=0)["text"]
     
     def _prepare_sources(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Prepare source information for citations"""
+        """Prepare compact source references for citations.
+
+        Only the chunk's location and score are stored with each message; the
+        text is fetched on demand through the batched chunk API.
+        """
         sources = []
         
         for chunk in chunks:
             metadata = chunk.get("metadata", {})
-            sources.append({
-                "text": chunk.get("text", "")[:200] + "..." if len(chunk.get("text", "")) > 200 else chunk.get("text", ""),
-                "filename": metadata.get("filename", "Unknown"),
-                "chunk_index": metadata.get("chunk_index", 0),
+            source = {
                 "document_id": metadata.get("document_id", ""),
-                "similarity_score": 1 - chunk.get("distance", 0)  # Convert distance to similarity
-            })
+                "chunk_index": metadata.get("chunk_index", 0),
+                "score": round(1 - chunk.get("distance", 0), 4)  # Convert distance to similarity
+            }
+            for key in ("page", "start_offset", "end_offset"):
+                if key in metadata:
+                    source[key] = metadata[key]
+            sources.append(source)
         
         return sources
     
-    def generate_follow_up_questions(self, context_chunks: List[Dict[str, Any]], current_question: str) -> List[str]:
+    async def generate_follow_up_questions(self, context_chunks: List[Dict[str, Any]], current_question: str) -> List[str]:
         """Generate follow-up questions based on context"""
         try:
             context_text = self._prepare_context(context_chunks)
@@ -205,70 +470,125 @@ class AIService:
             3. Help explore different aspects of the topic
             """
             
-            response = self.model.generate_content(prompt)
-            questions = [q.strip() for q in self._extract_response_text(response).split('\n') if q.strip()]
+            response_text = await self._generate(prompt)
+            questions = [q.strip() for q in response_text.split('\n') if q.strip()]
             
             return questions[:3]  # Return max 3 questions
             
         except Exception as e:
             return []
     
-    def summarize_document(self, chunks: List[Dict[str, Any]]) -> str:
-        """Generate a summary of the document"""
-        try:
-            context_text = self._prepare_context(chunks)
-            
-            prompt = f"""
-            Please provide a comprehensive summary of the following document:
-            
-            {context_text}
+    def _summary_prompt(self, chunks: List[Dict[str, Any]]) -> str:
+        context_text = self._prepare_context(chunks)
+
+        return f"""
+        Please provide a comprehensive summary of the following document:
+        
+        {context_text}
+        
+        The summary should include:
+        1. Main topics and themes
+        2. Key findings or conclusions
+        3. Important details or data points
+        4. Overall structure and organization
+        
+        Keep the summary concise but informative.
+        """
+
+    def _section_summary_prompt(self, texts: List[str], stage: str) -> str:
+        """Prompt for one step of map-reduce summarization.
+
+        "map" summarizes consecutive document excerpts, "reduce" merges
+        section summaries, and "final" writes the document summary from them.
+        """
+        content = "\n\n---\n\n".join(texts)
+
+        if stage == "map":
+            return f"""
+            Summarize the following consecutive excerpts from a longer document.
+            Keep the main points, findings, important details and data, in the order they appear:
             
-            The summary should include:
-            1. Main topics and themes
-            2. Key findings or conclusions
-            3. Important details or data points
-            4. Overall structure and organization
+            {content}
             
-            Keep the summary concise but informative.
+            Return only the summary.
             """
+
+        if stage == "reduce":
+            return f"""
+            The following are summaries of consecutive sections of a longer document.
+            Merge them into one summary of these sections, keeping the main points, findings and important details in order:
             
-            response = self.model.generate_content(prompt)
-            return self._extract_response_text(response)
+            {content}
             
+            Return only the merged summary.
+            """
+
+        return f"""
+        The following are summaries of consecutive sections of a document, in order.
+        Please provide a comprehensive summary of the whole document based on them:
+        
+        {content}
+        
+        The summary should include:
+        1. Main topics and themes
+        2. Key findings or conclusions
+        3. Important details or data points
+        4. Overall structure and organization
+        
+        Keep the summary concise but informative.
+        """
+
+    def _key_points_prompt(self, chunks: List[Dict[str, Any]]) -> str:
+        context_text = self._prepare_context(chunks)
+
+        return f"""
+        Extract the key points from the following document. Return them as a bulleted list:
+        
+        {context_text}
+        
+        Focus on:
+        - Main arguments or claims
+        - Important data or statistics
+        - Key conclusions
+        - Critical insights
+        
+        Return only the key points, one per line with a bullet point.
+        """
+
+    @staticmethod
+    def _parse_key_points(response_text: str) -> List[str]:
+        points = [point.strip().lstrip('- ').lstrip('* ').lstrip('• ') 
+                 for point in response_text.split('\n') 
+                 if point.strip() and not point.strip().startswith('---')]
+        return points[:10]  # Return max 10 key points
+
+    async def generate_artifact(self, kind: str, chunks: List[Dict[str, Any]]) -> Any:
+        """Generate a document-level artifact ("summary" or "key_points").
+
+        Unlike ``summarize_document`` and ``extract_key_points`` errors are
+        raised, so a failure is never stored as if it were the result.
+        """
+        if kind == "summary":
+            return await self.summarizer.summarize(chunks, version=PROMPT_VERSIONS["summary"])
+        if kind == "key_points":
+            return self._parse_key_points(await self.generate_text(self._key_points_prompt(chunks)))
+        raise ValueError(f"Unknown artifact kind: {kind}")
+
+    async def summarize_document(self, chunks: List[Dict[str, Any]]) -> str:
+        """Generate a summary of the document"""
+        try:
+            return await self.generate_artifact("summary", chunks)
         except Exception as e:
             return f"Unable to generate summary due to an error: {str(e)}"
     
-    def extract_key_points(self, chunks: List[Dict[str, Any]]) -> List[str]:
+    async def extract_key_points(self, chunks: List[Dict[str, Any]]) -> List[str]:
         """Extract key points from the document"""
         try:
-            context_text = self._prepare_context(chunks)
-            
-            prompt = f"""
-            Extract the key points from the following document. Return them as a bulleted list:
-            
-            {context_text}
-            
-            Focus on:
-            - Main arguments or claims
-            - Important data or statistics
-            - Key conclusions
-            - Critical insights
-            
-            Return only the key points, one per line with a bullet point.
-            """
-            
-            response = self.model.generate_content(prompt)
-            response_text = self._extract_response_text(response)
-            points = [point.strip().lstrip('- ').lstrip('* ').lstrip('• ') 
-                     for point in response_text.split('\n') 
-                     if point.strip() and not point.strip().startswith('---')]
-            
-            return points[:10]  # Return max 10 key points
-
+            return await self.generate_artifact("key_points", chunks)
         except Exception as e:
             return [f"Unable to extract key points due to an error: {str(e)}"]
 
-    def generate_personalized_study_guide(self, user_data, documents, sessions, messages):
+    async def generate_personalized_study_guide(self, user_data, documents, sessions, messages):
         """Generate a personalized study guide based on user's learning data"""
         try:
             # Prepare comprehensive context
@@ -356,8 +676,7 @@ class AIService:
             Make recommendations highly specific to their actual usage patterns, document types, and learning behaviors.
             """
 
-            response = self.model.generate_content(prompt)
-            response_text = self._extract_response_text(response)
+            response_text = await self._generate(prompt)
 
             # Try to parse JSON response
             try:
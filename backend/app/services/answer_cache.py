@@ -0,0 +1,177 @@
+import re
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+from app.core.config import settings
+from app.services.metrics import (
+    ANSWER_CACHE_ENTRIES,
+    ANSWER_CACHE_INVALIDATIONS,
+    ANSWER_CACHE_REQUESTS,
+)
+
+# Stop words the TF-IDF embeddings drop although they change what is asked:
+# negations, exceptions and comparisons
+GUARD_WORDS = frozenset({
+    "not", "no", "nor", "never", "none", "neither", "nothing", "nobody",
+    "without", "cannot", "except", "unless", "only", "before", "after",
+    "more", "less", "most", "least", "over", "under",
+})
+
+
+class AnswerCache:
+    """Generated answers reused for near-identical questions over the same chunks.
+
+    An answer is only a candidate when the question retrieved exactly the same
+    chunk ids and uses the same GUARD_WORDS; the TF-IDF embeddings drop stop
+    words, so "is it covered?" and "is it not covered?" would otherwise look
+    identical. It matches when the cosine similarity of the two question
+    embeddings is at least ANSWER_CACHE_SIMILARITY. Entries expire after
+    ANSWER_CACHE_TTL_SECONDS, the least recently used are evicted beyond
+    ANSWER_CACHE_MAX_ENTRIES, and every entry citing a document is dropped
+    when that document's chunks change. Used from the event loop only.
+    """
+
+    def __init__(self, similarity: Optional[float] = None, ttl_seconds: Optional[int] = None,
+                 max_entries: Optional[int] = None):
+        self.similarity = settings.ANSWER_CACHE_SIMILARITY if similarity is None else similarity
+        self.ttl_seconds = settings.ANSWER_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = settings.ANSWER_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        # entry id -> entry, least recently used first
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # sorted chunk ids -> ids of entries answered from exactly those chunks
+        self._by_chunks: Dict[Tuple[str, ...], Set[str]] = {}
+        # document id -> ids of entries citing it
+        self._by_document: Dict[str, Set[str]] = {}
+
+    @staticmethod
+    def chunk_key(chunks: List[Dict[str, Any]]) -> Optional[Tuple[str, ...]]:
+        """The retrieved chunk ids as a cache key, or None if any chunk has no id"""
+        ids = [chunk.get("id") for chunk in chunks]
+        if not ids or not all(ids):
+            return None
+        return tuple(sorted(set(ids)))
+
+    @staticmethod
+    def guard_words(question: str) -> FrozenSet[str]:
+        """GUARD_WORDS used in a question, counting "n't" as a "not" too"""
+        words = re.findall(r"\w+", question.lower().replace("n't", " not"))
+        return GUARD_WORDS.intersection(words)
+
+    def lookup(self, embedding: Sequence[float], chunks: List[Dict[str, Any]],
+               question: str) -> Optional[Dict[str, Any]]:
+        """The cached answer for this question and these chunks, if any"""
+        key = self.chunk_key(chunks)
+        if key is None:
+            ANSWER_CACHE_REQUESTS.inc(outcome="uncacheable")
+            return None
+
+        now = time.time()
+        guard_words = self.guard_words(question)
+        best, best_score = None, self.similarity
+        for entry_id in list(self._by_chunks.get(key, ())):
+            entry = self._entries[entry_id]
+            if entry["expires_at"] <= now:
+                self._remove(entry_id)
+                continue
+            if entry["guard_words"] != guard_words:
+                continue
+            score = self._cosine(embedding, entry["embedding"])
+            if score >= best_score:
+                best, best_score = entry, score
+
+        if best is None:
+            ANSWER_CACHE_REQUESTS.inc(outcome="miss")
+            return None
+
+        self._entries.move_to_end(best["id"])
+        ANSWER_CACHE_REQUESTS.inc(outcome="hit")
+        print(f"🎯 Answer cache hit (similarity {best_score:.3f})")
+        return best["response"]
+
+    def store(self, embedding: Sequence[float], chunks: List[Dict[str, Any]],
+              question: str, response: Dict[str, Any]) -> None:
+        """Remember a generated answer; only the question-independent fields are kept"""
+        key = self.chunk_key(chunks)
+        if key is None or self.max_entries <= 0 or response.get("error"):
+            return
+
+        entry_id = uuid.uuid4().hex
+        document_ids = {
+            (chunk.get("metadata") or {}).get("document_id")
+            for chunk in chunks
+        } - {None}
+        self._entries[entry_id] = {
+            "id": entry_id,
+            "chunk_key": key,
+            "guard_words": self.guard_words(question),
+            "embedding": tuple(embedding),
+            "document_ids": document_ids,
+            "expires_at": time.time() + self.ttl_seconds,
+            "response": {
+                "answer": response["answer"],
+                "sources": response["sources"],
+                "model_used": response.get("model_used"),
+                "follow_up_questions": response.get("follow_up_questions"),
+            },
+        }
+        self._by_chunks.setdefault(key, set()).add(entry_id)
+        for document_id in document_ids:
+            self._by_document.setdefault(document_id, set()).add(entry_id)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+        ANSWER_CACHE_ENTRIES.set(len(self._entries))
+
+    def record_bypass(self) -> None:
+        """Count a request that asked for a fresh answer"""
+        ANSWER_CACHE_REQUESTS.inc(outcome="bypass")
+
+    def invalidate_document(self, document_id: str) -> int:
+        """Drop every answer citing ``document_id``; returns how many were dropped"""
+        entry_ids = list(self._by_document.get(document_id, ()))
+        for entry_id in entry_ids:
+            self._remove(entry_id)
+        if entry_ids:
+            ANSWER_CACHE_INVALIDATIONS.inc(len(entry_ids))
+            print(f"🧹 Dropped {len(entry_ids)} cached answers citing {document_id}")
+        return len(entry_ids)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_chunks.clear()
+        self._by_document.clear()
+        ANSWER_CACHE_ENTRIES.set(0)
+
+    def _remove(self, entry_id: str) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        siblings = self._by_chunks.get(entry["chunk_key"])
+        if siblings is not None:
+            siblings.discard(entry_id)
+            if not siblings:
+                del self._by_chunks[entry["chunk_key"]]
+        for document_id in entry["document_ids"]:
+            citing = self._by_document.get(document_id)
+            if citing is not None:
+                citing.discard(entry_id)
+                if not citing:
+                    del self._by_document[document_id]
+        ANSWER_CACHE_ENTRIES.set(len(self._entries))
+
+    @staticmethod
+    def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+        # Embeddings from a refitted vectorizer have another dimension: no match
+        if len(a) != len(b):
+            return -1.0
+        dot = sum(x * y for x, y in zip(a, b))
+        norm_a = sum(x * x for x in a) ** 0.5
+        norm_b = sum(y * y for y in b) ** 0.5
+        if not norm_a or not norm_b:
+            return -1.0
+        return dot / (norm_a * norm_b)
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,127 @@
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from app.core.config import settings
+from app.services.metrics import CONTEXT_CHUNKS_DROPPED
+
+# Rough characters per token for English text; close enough for budgeting
+# without a tokenizer round trip
+CHARS_PER_TOKEN = 4
+
+CHUNK_SEPARATOR = "\n\n---\n\n"
+
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of ``text``"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def shingles(text: str, size: int = 5) -> FrozenSet[int]:
+    """Hashed word ``size``-grams of ``text``, case-insensitive"""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return frozenset([hash(tuple(words))]) if words else frozenset()
+    return frozenset(hash(tuple(words[i:i + size])) for i in range(len(words) - size + 1))
+
+
+class ContextPacker:
+    """Builds prompt context from retrieved chunks within a token budget.
+
+    Chunks are taken in relevance order (lowest distance first). A chunk
+    whose shingles overlap a chunk already taken by at least
+    ``duplicate_threshold`` (Jaccard) is dropped as a near-duplicate; one
+    that does not fit the remaining budget is skipped in favour of smaller,
+    less relevant ones. The most relevant chunk is always included, cut to
+    the budget if it is larger on its own.
+    """
+
+    def __init__(self, token_budget: Optional[int] = None, duplicate_threshold: Optional[float] = None,
+                 shingle_size: int = 5):
+        self.token_budget = settings.CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+        self.duplicate_threshold = (
+            settings.CONTEXT_DUPLICATE_THRESHOLD if duplicate_threshold is None else duplicate_threshold
+        )
+        self.shingle_size = shingle_size
+
+    def pack(self, chunks: List[Dict[str, Any]], token_budget: Optional[int] = None) -> Dict[str, Any]:
+        """Select and format chunks; a ``token_budget`` of 0 means unlimited.
+
+        Returns the context ``text``, its formatted ``parts`` and the
+        ``chunks`` they came from, its estimated ``tokens`` and how many
+        chunks were ``dropped`` per reason.
+        """
+        budget = self.token_budget if token_budget is None else token_budget
+        separator_tokens = estimate_tokens(CHUNK_SEPARATOR)
+
+        parts: List[str] = []
+        packed: List[Dict[str, Any]] = []
+        kept_sizes: List[int] = []
+        # shingle -> positions of packed chunks containing it, so a candidate
+        # is only compared with chunks it shares shingles with
+        shingle_index: Dict[int, List[int]] = {}
+        dropped = {"duplicate": 0, "budget": 0}
+        tokens = 0
+
+        for chunk in sorted(chunks, key=lambda x: x.get("distance", 1.0)):
+            chunk_text = (chunk.get("text") or "").strip()
+            if not chunk_text:
+                continue
+
+            chunk_shingles = shingles(chunk_text, self.shingle_size)
+            if self._is_near_duplicate(chunk_shingles, kept_sizes, shingle_index):
+                dropped["duplicate"] += 1
+                continue
+
+            filename = (chunk.get("metadata") or {}).get("filename", "")
+            part = f"[From: {filename}]\n{chunk_text}" if filename else chunk_text
+            part_tokens = estimate_tokens(part) + (separator_tokens if parts else 0)
+
+            if budget > 0 and tokens + part_tokens > budget:
+                if parts:
+                    dropped["budget"] += 1
+                    continue
+                part = self._truncate(part, budget)
+                part_tokens = estimate_tokens(part)
+
+            parts.append(part)
+            packed.append(chunk)
+            for shingle in chunk_shingles:
+                shingle_index.setdefault(shingle, []).append(len(kept_sizes))
+            kept_sizes.append(len(chunk_shingles))
+            tokens += part_tokens
+
+        for reason, count in dropped.items():
+            if count:
+                CONTEXT_CHUNKS_DROPPED.inc(count, reason=reason)
+
+        return {
+            "text": CHUNK_SEPARATOR.join(parts),
+            "parts": parts,
+            "chunks": packed,
+            "tokens": tokens,
+            "dropped": dropped,
+        }
+
+    def _is_near_duplicate(self, candidate: FrozenSet[int], kept_sizes: List[int],
+                           shingle_index: Dict[int, List[int]]) -> bool:
+        shared = Counter(
+            position
+            for shingle in candidate
+            for position in shingle_index.get(shingle, ())
+        )
+        return any(
+            count / (len(candidate) + kept_sizes[position] - count) >= self.duplicate_threshold
+            for position, count in shared.items()
+        )
+
+    @staticmethod
+    def _truncate(text: str, budget: int) -> str:
+        limit = budget * CHARS_PER_TOKEN
+        if len(text) <= limit:
+            return text
+        cut = text.rfind(" ", 0, limit)
+        return text[:cut if cut > 0 else limit]
@@ -66,6 +66,24 @@ async def create_indexes():
         await db.database.documents.create_index("user_id")
         await db.database.documents.create_index("filename")
         await db.database.documents.create_index("uploaded_at")
+        await db.database.documents.create_index("content_hash")
+        await db.database.documents.create_index([("user_id", 1), ("content_hash", 1)])
+        
+        # Chunk sets collection indexes (content-addressed, shared between owners)
+        await db.database.chunk_sets.create_index("content_hash", unique=True)
+        await db.database.chunk_sets.create_index("document_id")
+        
+        # Resumable upload sessions (MongoDB drops them once expired)
+        await db.database.upload_sessions.create_index("upload_id", unique=True)
+        await db.database.upload_sessions.create_index("expires_at", expireAfterSeconds=0)
+        
+        # Generated summaries and key points, one per document, kind and prompt version
+        await db.database.document_artifacts.create_index(
+            [("document_id", 1), ("kind", 1), ("prompt_version", 1)], unique=True
+        )
+        
+        # Partial summaries from map-reduce summarization, keyed by the hash of their input
+        await db.database.summary_partials.create_index("group_hash", unique=True)
         
         logger.info("Database indexes created successfully")
         
@@ -97,3 +115,23 @@ def get_documents_collection():
     if db.database is None:
         return None
     return db.database.documents
+
+def get_chunk_sets_collection():
+    if db.database is None:
+        return None
+    return db.database.chunk_sets
+
+def get_upload_sessions_collection():
+    if db.database is None:
+        return None
+    return db.database.upload_sessions
+
+def get_document_artifacts_collection():
+    if db.database is None:
+        return None
+    return db.database.document_artifacts
+
+def get_summary_partials_collection():
+    if db.database is None:
+        return None
+    return db.database.summary_partials
\ No newline at end of file
@@ -0,0 +1,113 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.services.ai_service import PROMPT_VERSIONS, AIService
+from app.services.database import get_document_artifacts_collection
+from app.services.metrics import DOCUMENT_ARTIFACT_GENERATIONS, DOCUMENT_ARTIFACT_REQUESTS
+from app.services.vector_store import VectorStore
+
+ARTIFACT_KINDS = tuple(PROMPT_VERSIONS)
+
+
+class DocumentArtifacts:
+    """Summaries and key points stored per (document_id, kind, prompt version).
+
+    Each artifact is generated once from all of a document's chunks and kept
+    in MongoDB, normally in the background right after ingestion; a request
+    that arrives first generates it itself. Concurrent requests for the same
+    artifact share one generation. ``discard`` drops a document's artifacts
+    when its chunks change. Used from the event loop only.
+    """
+
+    def __init__(self, get_vector_store: Callable[[], VectorStore], get_ai_service: Callable[[], AIService]):
+        self.get_vector_store = get_vector_store
+        self.get_ai_service = get_ai_service
+        self._pending: Dict[Tuple[str, str], asyncio.Task] = {}
+        # Bumped by discard, so a generation that started earlier is not stored
+        self._generations: Dict[str, int] = {}
+        # Keeps background tasks referenced until they finish
+        self._background: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _key(document_id: str, kind: str) -> Dict[str, Any]:
+        return {"document_id": document_id, "kind": kind, "prompt_version": PROMPT_VERSIONS[kind]}
+
+    async def get(self, document_id: str, kind: str) -> Optional[Any]:
+        """The stored artifact, generated first if needed; None for a document without chunks"""
+        collection = get_document_artifacts_collection()
+        if collection is not None:
+            stored = await collection.find_one(self._key(document_id, kind))
+            if stored is not None:
+                DOCUMENT_ARTIFACT_REQUESTS.inc(kind=kind, outcome="stored")
+                return stored["content"]
+
+        DOCUMENT_ARTIFACT_REQUESTS.inc(kind=kind, outcome="generated")
+        return await self._generate_once(document_id, kind)
+
+    def schedule(self, document_id: str) -> None:
+        """Generate any missing artifacts for a document in the background"""
+        if not settings.DOCUMENT_ARTIFACTS_PREGENERATE:
+            return
+        task = asyncio.get_running_loop().create_task(self._pregenerate(document_id))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def discard(self, document_id: str) -> None:
+        """Drop a document's stored artifacts, e.g. after its chunks changed"""
+        self._generations[document_id] = self._generations.get(document_id, 0) + 1
+        for kind in ARTIFACT_KINDS:
+            self._pending.pop((document_id, kind), None)
+        collection = get_document_artifacts_collection()
+        if collection is not None:
+            await collection.delete_many({"document_id": document_id})
+
+    async def _pregenerate(self, document_id: str) -> None:
+        collection = get_document_artifacts_collection()
+        for kind in ARTIFACT_KINDS:
+            try:
+                if collection is not None and await collection.find_one(self._key(document_id, kind)):
+                    continue
+                await self._generate_once(document_id, kind)
+            except Exception as e:
+                print(f"⚠️ Background {kind} generation failed for {document_id}: {str(e)}")
+
+    async def _generate_once(self, document_id: str, kind: str) -> Optional[Any]:
+        key = (document_id, kind)
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._generate(document_id, kind))
+            self._pending[key] = task
+
+            def forget(done: asyncio.Task) -> None:
+                if self._pending.get(key) is done:
+                    del self._pending[key]
+
+            task.add_done_callback(forget)
+        # A caller going away must not cancel the generation others wait on
+        return await asyncio.shield(task)
+
+    async def _generate(self, document_id: str, kind: str) -> Optional[Any]:
+        generation = self._generations.get(document_id, 0)
+        chunks = await asyncio.to_thread(self.get_vector_store().get_document_chunks, document_id)
+        if not chunks:
+            return None
+        chunks.sort(key=lambda chunk: (chunk.get("metadata") or {}).get("chunk_index", 0))
+
+        try:
+            content = await self.get_ai_service().generate_artifact(kind, chunks)
+        except Exception:
+            DOCUMENT_ARTIFACT_GENERATIONS.inc(kind=kind, outcome="failed")
+            raise
+        DOCUMENT_ARTIFACT_GENERATIONS.inc(kind=kind, outcome="generated")
+
+        collection = get_document_artifacts_collection()
+        if collection is not None and self._generations.get(document_id, 0) == generation:
+            await collection.update_one(
+                self._key(document_id, kind),
+                {"$set": {"content": content, "created_at": datetime.utcnow()}},
+                upsert=True
+            )
+            print(f"📝 Stored {kind} for document {document_id}")
+        return content
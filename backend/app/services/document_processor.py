@@ -1,61 +1,123 @@
+import bisect
+import codecs
+import hashlib
+import io
+import mmap
 import os
+import unicodedata
 import uuid
+import zlib
+from contextlib import contextmanager
+import zipfile
+from xml.etree import ElementTree
 import PyPDF2  # Changed from fitz (PyMuPDF)
-from docx import Document
-from typing import List, Dict, Any
+from typing import List, Dict, Any, BinaryIO, Iterable, Iterator, Optional, Tuple, Union
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from app.core.config import settings
+from app.services.metrics import IngestStats
+from app.services.text_cache import TextCache
+
+# A document can be read from a path on disk, a bytes-like buffer, or an open binary file
+DocumentSource = Union[str, bytes, bytearray, memoryview, BinaryIO]
+
+def chunk_hash(text: str) -> str:
+    """Content hash identifying a chunk across document revisions"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+# WordprocessingML tags used by the streaming DOCX extractor
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_BODY = f"{W_NS}body"
+W_P = f"{W_NS}p"
+W_T = f"{W_NS}t"
+W_TAB = f"{W_NS}tab"
+W_BR = f"{W_NS}br"
+W_CR = f"{W_NS}cr"
+W_TR = f"{W_NS}tr"
+W_TC = f"{W_NS}tc"
+
+# Available DOCX extractors; "iterparse" streams the XML, "python-docx" loads the object model
+DOCX_EXTRACTORS = ("iterparse", "python-docx")
+
+# Byte order marks, longest first so UTF-32 LE is not mistaken for UTF-16 LE
+TEXT_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+# "windows" stores overlapping chunks as split; "segments" stores each stretch of
+# text once, and search rebuilds the overlap from neighbouring segments
+CHUNK_STORAGE_MODES = ("windows", "segments")
+
+# Separates pages in extracted PDF text
+PAGE_BREAK = "\f"
+
+# Bump an extractor's version whenever its output changes, so cached text is re-extracted
+EXTRACTOR_VERSIONS = {
+    ".pdf": "pypdf2-2",
+    ".docx": {"iterparse": "docx-iterparse-1", "python-docx": "python-docx-1"},
+    ".txt": "txt-detect-1",
+}
 
 class DocumentProcessor:
-    def __init__(self):
+    # Characters per chunk, and characters shared by consecutive chunks in
+    # "windows" mode. Segments are CHUNK_SIZE - CHUNK_OVERLAP long, so a
+    # segment plus the context borrowed from its neighbours is CHUNK_SIZE.
+    CHUNK_SIZE = 1000
+    CHUNK_OVERLAP = 200
+    # Characters of extracted text buffered before each split, so splitting
+    # memory stays flat however long the document is
+    SPLIT_BUFFER_CHARS = 64 * 1024
+    # A non-blank line ends a section when its CRC-32 is a multiple of
+    # SECTION_ANCHOR_MODULUS and the section has SECTION_MIN_CHARS or more.
+    # Boundaries depend only on nearby text, so they survive edits elsewhere.
+    SECTION_MIN_CHARS = 4 * 1024
+    SECTION_ANCHOR_MODULUS = 16
+    # Bytes decoded per read when streaming plain text
+    TEXT_READ_BYTES = 1024 * 1024
+    # Leading bytes of a plain text file sampled to detect its encoding
+    TEXT_DETECT_BYTES = 64 * 1024
+
+    def __init__(self, docx_extractor: str = "iterparse", text_cache: Optional[TextCache] = None,
+                 storage_mode: Optional[str] = None):
+        if docx_extractor not in DOCX_EXTRACTORS:
+            raise ValueError(f"Unknown DOCX extractor: {docx_extractor}")
+        storage_mode = storage_mode or settings.CHUNK_STORAGE_MODE
+        if storage_mode not in CHUNK_STORAGE_MODES:
+            raise ValueError(f"Unknown chunk storage mode: {storage_mode}")
+        self.docx_extractor = docx_extractor
+        self.text_cache = text_cache
+        self.storage_mode = storage_mode
+        segments = storage_mode == "segments"
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
+            chunk_size=self.CHUNK_SIZE - self.CHUNK_OVERLAP if segments else self.CHUNK_SIZE,
+            chunk_overlap=0 if segments else self.CHUNK_OVERLAP,
             length_function=len,
             separators=["\n\n", "\n", " ", ""]
         )
     
-    def process_document(self, file_path: str, filename: str, user_id: str = None) -> Dict[str, Any]:
-        """Process uploaded document and return chunks with metadata"""
+    def process_document(self, source: DocumentSource, filename: str, user_id: str = None,
+                         document_id: Optional[str] = None, content_hash: Optional[str] = None,
+                         stats: Optional[IngestStats] = None) -> Dict[str, Any]:
+        """Process uploaded document and return chunks with metadata.
+
+        ``source`` is a file path, a bytes-like object or a binary file object,
+        so uploads held in memory never need to be written to disk. Pass
+        ``document_id`` to rebuild the chunks of an existing chunk set.
+        Every chunk is kept in memory; use ``iter_chunk_windows`` for large
+        documents. With a ``content_hash`` the extracted text is served from
+        (or written to) the text cache. Stage timings and counts are added to
+        ``stats`` when given.
+        """
         print(f"Starting document processing for: {filename}")
         try:
-            # Extract text based on file type
-            print(f"Extracting text from: {file_path}")
-            text = self._extract_text(file_path, filename)
-            print(f"Extracted text length: {len(text) if text else 0} characters")
-            
-            # Check if text is empty
-            if not text or len(text.strip()) == 0:
-                raise Exception("No text could be extracted from the document")
-            
-            # Split text into chunks
-            chunks = self._split_text(text)
-            print(f"Split into {len(chunks)} chunks")
-            
-            # Limit chunks to prevent memory issues (max ~500 chunks = ~500KB of text)
-            MAX_CHUNKS = 500
-            if len(chunks) > MAX_CHUNKS:
-                print(f"⚠️ Document has {len(chunks)} chunks, limiting to {MAX_CHUNKS}")
-                chunks = chunks[:MAX_CHUNKS]
-                print(f"⚠️ Warning: Document truncated to first {MAX_CHUNKS} chunks")
-            
             # Generate document ID
-            document_id = str(uuid.uuid4())
-            
-            # Prepare chunks with metadata
-            processed_chunks = []
-            for i, chunk in enumerate(chunks):
-                chunk_metadata = {
-                    "id": f"{document_id}_chunk_{i}",
-                    "text": chunk,
-                    "document_id": document_id,
-                    "chunk_index": i,
-                    "filename": filename
-                }
-                if user_id:
-                    chunk_metadata["user_id"] = user_id
-                processed_chunks.append(chunk_metadata)
-            
+            document_id = document_id or str(uuid.uuid4())
+
+            processed_chunks = list(self.iter_chunks(source, filename, document_id, user_id, content_hash, stats))
+
             print(f"✅ Document processed: {len(processed_chunks)} chunks ready")
             
             return {
@@ -63,95 +125,508 @@ class DocumentProcessor:
                 "filename": filename,
                 "chunks": processed_chunks,
                 "total_chunks": len(processed_chunks),
-                "file_size": os.path.getsize(file_path)
+                "file_size": self._source_size(source)
             }
             
         except Exception as e:
-            print(f"❌ Error processing document {filename}: {str(e)}")
-            import traceback
-            traceback.print_exc()
-
-            # Provide user-friendly error messages
-            error_message = str(e)
-            if "scanned or image-based PDF" in error_message.lower():
-                raise Exception("This PDF appears to be scanned or image-based. Please use OCR tools to convert it to a text-searchable PDF, or save it as a proper PDF with selectable text.")
-            elif "no text could be extracted" in error_message.lower():
-                raise Exception("This document doesn't contain extractable text. Please ensure it's a proper text-based document (not scanned images).")
-            elif "unsupported file format" in error_message.lower():
-                raise Exception(f"File type not supported. Please upload PDF, DOCX, or TXT files only.")
-            elif "file size" in error_message.lower():
-                raise Exception(f"File too large. Maximum allowed size is {settings.MAX_FILE_SIZE // (1024*1024)}MB.")
-            else:
-                raise Exception(f"Error processing document: {error_message}")
+            raise self._processing_error(e, filename)
+
+    def iter_chunk_windows(self, source: Optional[DocumentSource], filename: str, document_id: str,
+                           user_id: str = None, window_size: int = 200,
+                           content_hash: Optional[str] = None,
+                           stats: Optional[IngestStats] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the document's chunks in lists of at most ``window_size``.
+
+        Extraction, splitting and chunk construction are all streamed, so the
+        caller can embed and index one window at a time with flat memory.
+        ``source`` may be None when the text is known to be cached.
+        """
+        print(f"Starting windowed document processing for: {filename}")
+        try:
+            window: List[Dict[str, Any]] = []
+            for chunk in self.iter_chunks(source, filename, document_id, user_id, content_hash, stats):
+                window.append(chunk)
+                if len(window) >= window_size:
+                    yield window
+                    window = []
+            if window:
+                yield window
+        except Exception as e:
+            raise self._processing_error(e, filename)
+
+    def iter_chunks(self, source: Optional[DocumentSource], filename: str, document_id: str,
+                    user_id: str = None, content_hash: Optional[str] = None,
+                    stats: Optional[IngestStats] = None) -> Iterator[Dict[str, Any]]:
+        """Stream chunks with metadata in document order.
+
+        Every chunk carries its character span in the normalized text
+        (``start_offset``/``end_offset``); PDF chunks also carry the 1-based
+        ``page`` they start on. In "segments" mode chunks do not overlap and
+        are marked ``storage="segment"``. The characters stored (and so
+        embedded) are counted as ``stored_chars``.
+        """
+        is_pdf = os.path.splitext(filename)[1].lower() == ".pdf"
+        page_breaks: List[int] = []
+
+        text = self._iter_cached_text(source, filename, content_hash, stats)
+        if is_pdf:
+            text = self._track_page_breaks(text, page_breaks)
+
+        chunks = self._split_stream(text)
+        if stats is not None:
+            chunks = stats.timed("split", chunks)
+
+        segments = self.storage_mode == "segments"
+        chunk_count = 0
+        stored_chars = 0
+        for start_offset, end_offset, chunk in chunks:
+            if is_pdf:
+                chunk = chunk.replace(PAGE_BREAK, "")
+            chunk_metadata = {
+                "id": f"{document_id}_chunk_{chunk_count}",
+                "text": chunk,
+                "document_id": document_id,
+                "chunk_index": chunk_count,
+                "filename": filename,
+                "chunk_hash": chunk_hash(chunk),
+                "start_offset": start_offset,
+                "end_offset": end_offset
+            }
+            if is_pdf:
+                chunk_metadata["page"] = bisect.bisect_right(page_breaks, start_offset) + 1
+            if segments:
+                chunk_metadata["storage"] = "segment"
+            if user_id:
+                chunk_metadata["user_id"] = user_id
+            chunk_count += 1
+            stored_chars += len(chunk)
+            yield chunk_metadata
+
+        print(f"Split into {chunk_count} {'segments' if segments else 'chunks'} ({stored_chars} chars stored)")
+        if stats is not None:
+            stats.count("chunks", chunk_count)
+            stats.count("stored_chars", stored_chars)
+
+        # Check if text is empty
+        if chunk_count == 0:
+            raise Exception("No text could be extracted from the document")
+
+    def _processing_error(self, e: Exception, filename: str) -> Exception:
+        """Translate an extraction failure into a user-friendly error"""
+        print(f"❌ Error processing document {filename}: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+        # Provide user-friendly error messages
+        error_message = str(e)
+        if "scanned or image-based PDF" in error_message.lower():
+            return Exception("This PDF appears to be scanned or image-based. Please use OCR tools to convert it to a text-searchable PDF, or save it as a proper PDF with selectable text.")
+        elif "no text could be extracted" in error_message.lower():
+            return Exception("This document doesn't contain extractable text. Please ensure it's a proper text-based document (not scanned images).")
+        elif "unsupported file format" in error_message.lower():
+            return Exception(f"File type not supported. Please upload PDF, DOCX, or TXT files only.")
+        elif "file size" in error_message.lower():
+            return Exception(f"File too large. Maximum allowed size is {settings.MAX_FILE_SIZE // (1024*1024)}MB.")
+        else:
+            return Exception(f"Error processing document: {error_message}")
     
-    def _extract_text(self, file_path: str, filename: str) -> str:
-        """Extract text from different file formats"""
+    @staticmethod
+    def _describe_source(source: DocumentSource) -> str:
+        if isinstance(source, str):
+            return source
+        return f"<in-memory {type(source).__name__}>"
+
+    @staticmethod
+    def _source_size(source: DocumentSource) -> int:
+        """Size in bytes of a document source without reading it"""
+        if isinstance(source, str):
+            return os.path.getsize(source)
+        if isinstance(source, memoryview):
+            return source.nbytes
+        if isinstance(source, (bytes, bytearray)):
+            return len(source)
+        position = source.tell()
+        size = source.seek(0, io.SEEK_END)
+        source.seek(position)
+        return size
+
+    @contextmanager
+    def _open_source(self, source: DocumentSource):
+        """Yield a binary file object positioned at the start of the document"""
+        if isinstance(source, str):
+            with open(source, 'rb') as file:
+                yield file
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            # BytesIO shares the buffer of a bytes object instead of copying it
+            yield io.BytesIO(source)
+        else:
+            source.seek(0)
+            yield source
+
+    def extractor_version(self, filename: str) -> str:
+        """Version of the extractor that handles this file type"""
+        file_extension = os.path.splitext(filename)[1].lower()
+        version = EXTRACTOR_VERSIONS.get(file_extension)
+        if isinstance(version, dict):
+            version = version[self.docx_extractor]
+        if version is None:
+            raise ValueError(f"Unsupported file format: {file_extension}")
+        return version
+
+    def has_cached_text(self, filename: str, content_hash: Optional[str]) -> bool:
+        """Whether extracted text for these bytes is already in the text cache"""
+        return bool(
+            self.text_cache is not None and content_hash
+            and self.text_cache.has(content_hash, self.extractor_version(filename))
+        )
+
+    def discard_cached_text(self, content_hash: Optional[str]) -> None:
+        """Drop the cached text of bytes no document refers to any more"""
+        if self.text_cache is not None and content_hash:
+            self.text_cache.discard(content_hash)
+
+    def _iter_cached_text(self, source: Optional[DocumentSource], filename: str,
+                          content_hash: Optional[str] = None,
+                          stats: Optional[IngestStats] = None) -> Iterator[str]:
+        """Stream normalized text, skipping extraction on a text cache hit"""
+        if self.has_cached_text(filename, content_hash):
+            print(f"💾 Using cached extracted text for {filename}")
+            text = self.text_cache.iter_text(content_hash, self.extractor_version(filename))
+            if stats is not None:
+                stats.count("text_cache_hits")
+        elif source is None:
+            raise Exception("Original file is not available and its text is not cached")
+        else:
+            print(f"Extracting text from: {self._describe_source(source)}")
+            text = self._normalize_text(self._iter_text(source, filename, stats))
+
+            if self.text_cache is not None and content_hash:
+                text = self.text_cache.write_through(content_hash, self.extractor_version(filename), text)
+
+        if stats is not None:
+            text = stats.timed("extract", self._count_chars(text, stats))
+        return text
+
+    @staticmethod
+    def _track_page_breaks(segments: Iterable[str], page_breaks: List[int]) -> Iterator[str]:
+        """Record the text offset of every PAGE_BREAK while passing segments on"""
+        offset = 0
+        for segment in segments:
+            position = segment.find(PAGE_BREAK)
+            while position >= 0:
+                page_breaks.append(offset + position)
+                position = segment.find(PAGE_BREAK, position + 1)
+            offset += len(segment)
+            yield segment
+
+    @staticmethod
+    def _count_chars(segments: Iterable[str], stats: IngestStats) -> Iterator[str]:
+        for segment in segments:
+            stats.count("chars", len(segment))
+            yield segment
+
+    @staticmethod
+    def _normalize_text(segments: Iterable[str]) -> Iterator[str]:
+        """Normalize extracted text: NFC, Unix newlines, no NUL characters"""
+        for segment in segments:
+            segment = segment.replace("\r\n", "\n").replace("\r", "\n").replace("\x00", "")
+            yield unicodedata.normalize("NFC", segment)
+
+    def _extract_text(self, source: DocumentSource, filename: str) -> str:
+        """Extract the full text of a document into one string"""
+        return "".join(self._iter_text(source, filename))
+
+    def _iter_text(self, source: DocumentSource, filename: str,
+                   stats: Optional[IngestStats] = None) -> Iterator[str]:
+        """Stream text from different file formats in document order"""
         file_extension = os.path.splitext(filename)[1].lower()
         
         if file_extension == ".pdf":
-            return self._extract_pdf_text(file_path)
+            return self._iter_pdf_text(source, stats)
         elif file_extension == ".docx":
-            return self._extract_docx_text(file_path)
+            return self._iter_docx_text(source)
         elif file_extension == ".txt":
-            return self._extract_txt_text(file_path)
+            return self._iter_txt_text(source)
         else:
             raise ValueError(f"Unsupported file format: {file_extension}")
     
-    def _extract_pdf_text(self, file_path: str) -> str:
-        """Extract text from PDF file using PyPDF2"""
+    def _iter_pdf_text(self, source: DocumentSource, stats: Optional[IngestStats] = None) -> Iterator[str]:
+        """Extract text from PDF file using PyPDF2, one page at a time"""
         try:
-            print(f"Extracting PDF text from: {file_path}")
-            text = ""
-            with open(file_path, 'rb') as file:
+            print(f"Extracting PDF text from: {self._describe_source(source)}")
+            total_chars = 0
+            with self._open_source(source) as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 print(f"PDF has {len(pdf_reader.pages)} pages")
                 for i, page in enumerate(pdf_reader.pages):
                     page_text = page.extract_text()
-                    text += page_text + "\n"
+                    total_chars += len(page_text.strip())
                     print(f"Extracted {len(page_text)} characters from page {i+1}")
+                    if stats is not None:
+                        stats.count("pages")
+                    # Pages after the first start with a form feed so chunk
+                    # page numbers survive the text cache
+                    yield (PAGE_BREAK if i else "") + page_text + "\n"
 
-            print(f"Total PDF text extracted: {len(text)} characters")
+            print(f"Total PDF text extracted: {total_chars} characters")
 
             # Check if text was actually extracted
-            if not text or len(text.strip()) < 10:
-                print(f"⚠️ Warning: Very little text extracted ({len(text)} characters)")
+            if total_chars < 10:
+                print(f"⚠️ Warning: Very little text extracted ({total_chars} characters)")
                 print("This might be a scanned PDF or image-based document.")
                 print("Consider using OCR tools or converting to text-searchable PDF.")
                 raise Exception("This appears to be a scanned or image-based PDF. Please use a text-searchable PDF or convert it using OCR tools first.")
 
-            return text
         except Exception as e:
             print(f"Error extracting PDF text: {str(e)}")
             if "No text could be extracted" in str(e):
                 raise Exception("This appears to be a scanned or image-based PDF. Please convert it to a text-searchable format using OCR tools or save it as a proper PDF with text content.")
             raise Exception(f"Error extracting PDF text: {str(e)}")
     
-    def _extract_docx_text(self, file_path: str) -> str:
-        """Extract text from DOCX file"""
+    def _iter_docx_text(self, source: DocumentSource) -> Iterator[str]:
+        """Extract text from DOCX file with the configured extractor"""
+        if self.docx_extractor == "python-docx":
+            return self._iter_docx_text_python_docx(source)
+        return self._iter_docx_text_iterparse(source)
+
+    def _iter_docx_text_iterparse(self, source: DocumentSource) -> Iterator[str]:
+        """Stream paragraphs and table rows from word/document.xml in document order.
+
+        Table rows are emitted as their cell texts joined by " | ". Elements are
+        cleared as soon as they are consumed, so memory does not grow with the
+        size of the document.
+        """
+        try:
+            print(f"Extracting DOCX text from: {self._describe_source(source)}")
+            total_chars = 0
+            block_count = 0
+            with self._open_source(source) as file, zipfile.ZipFile(file) as archive:
+                with archive.open("word/document.xml") as document_xml:
+                    for block in self._iter_docx_blocks(document_xml):
+                        total_chars += len(block) + 1
+                        block_count += 1
+                        yield block + "\n"
+            print(f"Extracted {block_count} paragraphs and table rows from DOCX")
+            print(f"Total DOCX text extracted: {total_chars} characters")
+        except Exception as e:
+            print(f"Error extracting DOCX text: {str(e)}")
+            raise Exception(f"Error extracting DOCX text: {str(e)}")
+
+    @staticmethod
+    def _iter_docx_blocks(document_xml) -> Iterator[str]:
+        """Yield the non-empty paragraphs and table rows of a WordprocessingML body"""
+        paragraphs: List[List[str]] = []  # text runs of open paragraphs (text boxes nest)
+        cells: List[List[str]] = []       # paragraphs of open table cells (tables nest)
+        rows: List[List[str]] = []        # cells of open table rows
+        body = None
+        depth = 0
+        body_depth = -1
+
+        for event, elem in ElementTree.iterparse(document_xml, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                depth += 1
+                if tag == W_BODY:
+                    body, body_depth = elem, depth
+                elif tag == W_P:
+                    paragraphs.append([])
+                elif tag == W_TR:
+                    rows.append([])
+                elif tag == W_TC:
+                    cells.append([])
+                continue
+
+            if tag == W_T and paragraphs:
+                paragraphs[-1].append(elem.text or "")
+            elif tag == W_TAB and paragraphs:
+                paragraphs[-1].append("\t")
+            elif tag in (W_BR, W_CR) and paragraphs:
+                paragraphs[-1].append("\n")
+            elif tag == W_P:
+                text = "".join(paragraphs.pop()).strip()
+                if text:
+                    if cells:
+                        cells[-1].append(text)
+                    else:
+                        yield text
+            elif tag == W_TC:
+                rows[-1].append(" ".join(cells.pop()))
+            elif tag == W_TR:
+                row = rows.pop()
+                if any(cell.strip() for cell in row):
+                    row_text = " | ".join(cell.strip() for cell in row)
+                    if cells:
+                        # Row of a table nested inside a cell
+                        cells[-1].append(row_text)
+                    else:
+                        yield row_text
+
+            # Drop top-level blocks once consumed so the tree never grows
+            if body is not None and depth == body_depth + 1:
+                body.clear()
+            depth -= 1
+
+    def _iter_docx_text_python_docx(self, source: DocumentSource) -> Iterator[str]:
+        """Extract paragraph text via the python-docx object model (no tables)"""
+        from docx import Document
+
         try:
-            print(f"Extracting DOCX text from: {file_path}")
-            doc = Document(file_path)
-            text = ""
+            print(f"Extracting DOCX text from: {self._describe_source(source)}")
+            with self._open_source(source) as file:
+                doc = Document(file)
+            total_chars = 0
             paragraph_count = 0
             for paragraph in doc.paragraphs:
                 if paragraph.text.strip():  # Only add non-empty paragraphs
-                    text += paragraph.text + "\n"
+                    total_chars += len(paragraph.text) + 1
                     paragraph_count += 1
+                    yield paragraph.text + "\n"
             print(f"Extracted {paragraph_count} paragraphs from DOCX")
-            print(f"Total DOCX text extracted: {len(text)} characters")
-            return text
+            print(f"Total DOCX text extracted: {total_chars} characters")
         except Exception as e:
             print(f"Error extracting DOCX text: {str(e)}")
             raise Exception(f"Error extracting DOCX text: {str(e)}")
     
-    def _extract_txt_text(self, file_path: str) -> str:
-        """Extract text from TXT file"""
+    def _iter_txt_text(self, source: DocumentSource) -> Iterator[str]:
+        """Extract text from TXT file, decoding incrementally.
+
+        The encoding is detected from the first TEXT_DETECT_BYTES, and files
+        on disk are memory-mapped rather than read, so arbitrarily large
+        files are decoded in constant memory.
+        """
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
+            decoder = None
+            for block in self._iter_source_blocks(source, self.TEXT_READ_BYTES):
+                if decoder is None:
+                    encoding, bom_length = self._detect_text_encoding(bytes(block[:self.TEXT_DETECT_BYTES]))
+                    print(f"Detected text encoding: {encoding}")
+                    # Bytes past the sampled prefix may still be invalid; keep going
+                    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+                    block = block[bom_length:]
+                yield decoder.decode(block)
+            if decoder is not None:
+                yield decoder.decode(b"", final=True)
         except Exception as e:
             raise Exception(f"Error extracting TXT text: {str(e)}")
-    
+
+    @staticmethod
+    def _detect_text_encoding(prefix: bytes) -> Tuple[str, int]:
+        """Guess the encoding of a text file from its first bytes.
+
+        Returns the codec name and the length of the byte order mark to skip.
+        Without a BOM, UTF-8 is tried first, then Windows-1252; Latin-1 always
+        decodes, so it is the last resort.
+        """
+        for bom, encoding in TEXT_BOMS:
+            if prefix.startswith(bom):
+                return encoding, len(bom)
+
+        for encoding in ("utf-8", "cp1252"):
+            try:
+                # Not final: the prefix may end in the middle of a character
+                codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)
+                return encoding, 0
+            except UnicodeDecodeError:
+                continue
+        return "latin-1", 0
+
+    @staticmethod
+    def _iter_source_blocks(source: DocumentSource, block_size: int) -> Iterator[Union[bytes, memoryview]]:
+        """Yield a source's bytes in blocks without loading the whole document.
+
+        Paths are memory-mapped and pages already consumed are released, so
+        resident memory stays flat; in-memory sources are sliced in place.
+        """
+        if isinstance(source, str):
+            with open(source, "rb") as file:
+                size = os.fstat(file.fileno()).st_size
+                if size == 0:
+                    return
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    if hasattr(mapped, "madvise"):
+                        mapped.madvise(mmap.MADV_SEQUENTIAL)
+                    for start in range(0, size, block_size):
+                        yield mapped[start:start + block_size]
+                        if hasattr(mmap, "MADV_DONTNEED") and block_size % mmap.PAGESIZE == 0:
+                            mapped.madvise(mmap.MADV_DONTNEED, start, min(block_size, size - start))
+        elif isinstance(source, (bytes, bytearray, memoryview)) or isinstance(source, io.BytesIO):
+            with (source.getbuffer() if isinstance(source, io.BytesIO) else memoryview(source)) as view:
+                for start in range(0, view.nbytes, block_size):
+                    yield view[start:start + block_size]
+        else:
+            source.seek(0)
+            while True:
+                block = source.read(block_size)
+                if not block:
+                    break
+                yield block
+
+    def _split_stream(self, segments: Iterable[str]) -> Iterator[Tuple[int, int, str]]:
+        """Split streamed text into chunks using a bounded buffer.
+
+        Yields ``(start_offset, end_offset, chunk)`` with the chunk's character
+        span in the full text. Text is cut into sections at content-defined
+        line endings (see SECTION_ANCHOR_MODULUS) and each section is split on
+        its own, so an edit only changes the chunks of the section it falls in
+        and a revised document shares every other chunk with its previous
+        version. When no boundary shows up within SPLIT_BUFFER_CHARS, the
+        buffer is split and its last chunk carried into the next one, so
+        chunks that straddle the cut come out as they would from a single pass.
+        """
+        buffer = ""
+        offset = 0  # position of buffer[0] in the full text
+        start = 0   # start of the current section in buffer
+        scan = 0    # start of the first line not inspected yet
+        for segment in segments:
+            buffer = buffer[start:] + segment
+            offset += start
+            scan -= start
+            start = 0
+
+            while True:
+                newline = buffer.find("\n", scan)
+                if newline < 0:
+                    break
+                line = buffer[scan:newline]
+                scan = newline + 1
+                if (
+                    scan - start >= self.SECTION_MIN_CHARS
+                    and line.strip()
+                    and zlib.crc32(line.encode("utf-8")) % self.SECTION_ANCHOR_MODULUS == 0
+                ):
+                    yield from self._locate_chunks(buffer[start:scan], offset + start)
+                    start = scan
+
+            if len(buffer) - start < self.SPLIT_BUFFER_CHARS:
+                continue
+
+            # No section boundary in sight: fall back to carrying the last chunk
+            section = buffer[start:]
+            located = list(self._locate_chunks(section, offset + start))
+            offset += start
+            if len(located) > 1:
+                yield from located[:-1]
+                tail_start = located[-1][0] - offset
+                section = section[tail_start:]
+                offset += tail_start
+            buffer = section
+            start = scan = 0
+
+        section = buffer[start:]
+        if section.strip():
+            yield from self._locate_chunks(section, offset + start)
+
+    def _locate_chunks(self, text: str, offset: int) -> Iterator[Tuple[int, int, str]]:
+        """Split ``text`` and pair each chunk with its span, shifted by ``offset``"""
+        cursor = 0
+        for chunk in self._split_text(text):
+            position = text.find(chunk, cursor)
+            if position < 0:
+                position = cursor
+            # Overlapping chunks may start before the previous one ends
+            cursor = position + 1
+            yield offset + position, offset + position + len(chunk), chunk
+
     def _split_text(self, text: str) -> List[str]:
         """Split text into meaningful chunks"""
         try:
@@ -0,0 +1,842 @@
+import asyncio
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.services.admission import AdmissionController
+from app.services.answer_cache import answer_cache
+from app.services.database import (
+    get_chunk_sets_collection,
+    get_documents_collection,
+)
+from app.services.document_artifacts import DocumentArtifacts
+from app.services.document_processor import DocumentProcessor
+from app.services.metrics import IngestStats
+from app.services.upload_receiver import upload_source
+from app.services.vector_store import VectorStore
+
+
+class ChunkQuotaExceeded(Exception):
+    """Raised when indexing a document would exceed the user's chunk quota"""
+
+
+class ReindexUnavailable(Exception):
+    """Raised when a document cannot be re-indexed without its original file"""
+
+
+class IngestionService:
+    """Turns received uploads into indexed, owned documents.
+
+    Chunk sets are content addressed: the sha256 of the uploaded bytes maps to
+    one ``document_id`` in the vector store, shared by every owner who
+    uploaded the same file. ``chunk_sets.ref_count`` counts the owners so the
+    chunks are only dropped when the last owner deletes the document.
+
+    With an ``admission`` controller, extraction and indexing only start once
+    the document's estimated memory fits the shared budget. Extraction,
+    embedding and vector store writes (in-place replacement and re-indexing
+    included) run in worker threads so the event loop keeps serving chat
+    meanwhile.
+
+    Whenever a document's chunks change or are deleted, cached answers
+    citing it are dropped from the answer cache. With ``artifacts``, stored
+    summaries and key points are dropped too, and those of new or changed
+    documents are generated in the background.
+    """
+
+    def __init__(self, document_processor: DocumentProcessor, get_vector_store: Callable[[], VectorStore],
+                 admission: Optional[AdmissionController] = None, artifacts: Optional[DocumentArtifacts] = None):
+        self.document_processor = document_processor
+        self.get_vector_store = get_vector_store
+        self.admission = admission
+        self.artifacts = artifacts
+
+    async def ingest(self, received: Dict[str, Any], filename: str, user_id: str,
+                     freed_chunks: int = 0) -> Dict[str, Any]:
+        """Index a received upload for ``user_id`` and record ownership.
+
+        ``freed_chunks`` are chunks of a document this upload replaces; they
+        are not counted against the user's quota.
+        """
+        content_hash = received["sha256"]
+        stats = self._new_stats(received)
+        outcome = "failed"
+
+        try:
+            with stats.stage("metadata"):
+                plan = await self._plan(content_hash, user_id)
+
+            if plan["action"] in ("owned", "rebuild"):
+                # Re-upload of a file this user already owns
+                print(f"♻️ {filename} already uploaded by user {user_id} as {plan['document_id']}")
+                if plan["action"] == "rebuild":
+                    # Chunks were lost with the in-memory vector store: rebuild them
+                    async with self._admitted([received], [stats]):
+                        await asyncio.to_thread(
+                            self._index,
+                            upload_source(received),
+                            filename,
+                            user_id,
+                            plan["document_id"],
+                            content_hash=content_hash,
+                            stats=stats
+                        )
+                    self._schedule_artifacts(plan["document_id"])
+                outcome = "deduplicated" if plan["action"] == "owned" else "rebuilt"
+                return self._result(plan["record"], deduplicated=plan["action"] == "owned")
+
+            with stats.stage("metadata"):
+                remaining_quota = await self._remaining_chunk_quota(user_id)
+            if remaining_quota is not None:
+                remaining_quota += freed_chunks
+
+            if plan["action"] == "link":
+                # Same bytes already processed for someone else: link, don't reprocess
+                with stats.stage("metadata"):
+                    chunk_count = await self._link(plan["chunk_set"], filename, remaining_quota)
+                document_id = plan["document_id"]
+            else:
+                # Either new content, or a chunk set whose chunks are gone from the
+                # (in-memory) vector store; the latter is rebuilt under its old id
+                async with self._admitted([received], [stats]):
+                    indexed_id, chunk_count = await asyncio.to_thread(
+                        self._index,
+                        upload_source(received),
+                        filename,
+                        user_id,
+                        plan["document_id"],
+                        max_chunks=remaining_quota,
+                        content_hash=content_hash,
+                        stats=stats
+                    )
+                with stats.stage("metadata"):
+                    document_id = await self._register_chunk_set(
+                        content_hash,
+                        indexed_id,
+                        chunk_count,
+                        reindexed=plan["reindexed"]
+                    )
+
+            # The record's own write only shows up in the exported histograms
+            document_record = self._document_record(
+                document_id, filename, received, user_id, chunk_count, stats.as_dict()
+            )
+
+            documents_collection = get_documents_collection()
+            if documents_collection is not None:
+                with stats.stage("metadata"):
+                    try:
+                        await documents_collection.insert_one(document_record)
+                    except BaseException:
+                        # Give back the chunk set reference the record would have held
+                        await self.release(document_id)
+                        raise
+                print("Saved document metadata to MongoDB")
+
+            if plan["action"] != "link":
+                self._schedule_artifacts(document_id)
+            outcome = "linked" if plan["action"] == "link" else "processed"
+            return self._result(document_record, deduplicated=plan["action"] == "link")
+
+        finally:
+            stats.observe(outcome)
+
+    async def index_unowned(self, received: Dict[str, Any], filename: str,
+                            max_chunks: Optional[int] = None) -> Tuple[str, int]:
+        """Index an upload nobody owns, such as a guest's demo document.
+
+        No record or chunk set is written, and the ingestion metrics are not
+        updated. Returns (document_id, chunk_count); raises
+        ChunkQuotaExceeded past ``max_chunks`` and AdmissionRejected when
+        the ingestion budget is exhausted.
+        """
+        stats = self._new_stats(received)
+        async with self._admitted([received], [stats]):
+            return await asyncio.to_thread(
+                self._index,
+                upload_source(received),
+                filename,
+                None,
+                max_chunks=max_chunks,
+                stats=stats
+            )
+
+    async def ingest_batch(self, uploads: List[Tuple[Dict[str, Any], str]], user_id: str) -> List[Dict[str, Any]]:
+        """Index several received uploads for ``user_id`` in one pass.
+
+        Extraction and splitting run concurrently (BATCH_UPLOAD_CONCURRENCY
+        threads), chunks of all new documents are embedded and indexed
+        together so embedding batches are shared across documents, and the
+        document records are written with a single insert_many. Returns one
+        result per upload, in order; a failing file does not fail the others.
+        Time spent on shared work is attributed to each document in
+        proportion to its chunks (or evenly, for the record write).
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(uploads)
+        stats = [self._new_stats(received) for received, _ in uploads]
+        outcomes = ["failed"] * len(uploads)
+        records: List[Dict[str, Any]] = []
+        first_copies: Dict[str, Dict[str, Any]] = {}  # content_hash -> first file with it
+        jobs: Dict[str, Dict[str, Any]] = {}  # content_hash -> processing job
+        remaining_quota = await self._remaining_chunk_quota(user_id)
+        # Chunk sets referenced by records not written yet; the references are
+        # given back if the batch fails before insert_many succeeds
+        referenced: List[str] = []
+
+        try:
+            # Decide what each file needs; identical files in the batch are only
+            # planned (and linked or processed) once
+            for i, (received, filename) in enumerate(uploads):
+                content_hash = received["sha256"]
+                if content_hash in first_copies:
+                    first_copies[content_hash]["duplicates"].append(i)
+                    continue
+                first_copies[content_hash] = {"index": i, "duplicates": []}
+
+                try:
+                    with stats[i].stage("metadata"):
+                        plan = await self._plan(content_hash, user_id)
+
+                    if plan["action"] == "owned":
+                        results[i] = self._result(plan["record"], deduplicated=True)
+                        outcomes[i] = "deduplicated"
+                    elif plan["action"] == "link":
+                        with stats[i].stage("metadata"):
+                            chunk_count = await self._link(plan["chunk_set"], filename, remaining_quota)
+                        referenced.append(plan["document_id"])
+                        if remaining_quota is not None:
+                            remaining_quota -= chunk_count
+                        record = self._document_record(plan["document_id"], filename, received, user_id,
+                                                       chunk_count, stats[i].as_dict())
+                        records.append(record)
+                        results[i] = self._result(record, deduplicated=True)
+                        outcomes[i] = "linked"
+                    else:
+                        jobs[content_hash] = first_copies[content_hash]
+                        jobs[content_hash].update(plan, received=received, filename=filename)
+                except Exception as e:
+                    results[i] = self._failure(filename, e)
+
+            # Extract, split and index new content under a single reservation
+            async with self._admitted(
+                [job["received"] for job in jobs.values()],
+                [stats[job["index"]] for job in jobs.values()]
+            ):
+                # Extract and split new content concurrently
+                semaphore = asyncio.Semaphore(max(settings.BATCH_UPLOAD_CONCURRENCY, 1))
+
+                async def extract(job: Dict[str, Any]) -> None:
+                    async with semaphore:
+                        job["result"] = await asyncio.to_thread(
+                            self.document_processor.process_document,
+                            upload_source(job["received"]),
+                            job["filename"],
+                            user_id,
+                            job["document_id"],
+                            job["received"]["sha256"],
+                            stats[job["index"]]
+                        )
+
+                outcomes_by_job = await asyncio.gather(
+                    *(extract(job) for job in jobs.values()),
+                    return_exceptions=True
+                )
+
+                to_index: List[Dict[str, Any]] = []
+                for job, outcome in zip(list(jobs.values()), outcomes_by_job):
+                    try:
+                        if isinstance(outcome, BaseException):
+                            raise outcome
+                        # Rebuilt documents are already counted against the quota
+                        if job["action"] != "rebuild":
+                            chunk_count = job["result"]["total_chunks"]
+                            self._check_quota(chunk_count, remaining_quota)
+                            if remaining_quota is not None:
+                                remaining_quota -= chunk_count
+                        to_index.append(job)
+                    except Exception as e:
+                        results[job["index"]] = self._failure(job["filename"], e)
+
+                # Embed and index every new document's chunks in shared batches
+                all_chunks = [chunk for job in to_index for chunk in job["result"]["chunks"]]
+                vector_store = self.get_vector_store()
+                shared = IngestStats("batch")
+                indexed = bool(all_chunks) and await asyncio.to_thread(vector_store.add_documents, all_chunks, shared)
+
+                for job in to_index:
+                    job_stats = stats[job["index"]]
+                    share = job["result"]["total_chunks"] / len(all_chunks)
+                    for stage, seconds in shared.stages.items():
+                        job_stats.add_time(stage, seconds * share)
+
+            for job in to_index:
+                filename = job["filename"]
+                received = job["received"]
+                job_stats = stats[job["index"]]
+                try:
+                    if not indexed:
+                        await asyncio.to_thread(vector_store.delete_document, job["document_id"])
+                        raise Exception("Failed to index document")
+
+                    chunk_count = job["result"]["total_chunks"]
+
+                    if job["action"] == "rebuild":
+                        self._schedule_artifacts(job["document_id"])
+                        results[job["index"]] = self._result(job["record"], deduplicated=False)
+                        outcomes[job["index"]] = "rebuilt"
+                        continue
+
+                    with job_stats.stage("metadata"):
+                        document_id = await self._register_chunk_set(
+                            received["sha256"],
+                            job["document_id"],
+                            chunk_count,
+                            reindexed=job["reindexed"]
+                        )
+                    referenced.append(document_id)
+                    record = self._document_record(document_id, filename, received, user_id,
+                                                   chunk_count, job_stats.as_dict())
+                    records.append(record)
+                    self._schedule_artifacts(document_id)
+                    results[job["index"]] = self._result(record, deduplicated=False)
+                    outcomes[job["index"]] = "processed"
+                except Exception as e:
+                    results[job["index"]] = self._failure(filename, e)
+
+            # Files repeated inside the batch resolve to the first copy's outcome
+            for copy in first_copies.values():
+                first = results[copy["index"]]
+                for i in copy["duplicates"]:
+                    if first.get("status") == "failed":
+                        results[i] = {**first, "filename": uploads[i][1]}
+                    else:
+                        results[i] = {**first, "filename": uploads[i][1], "deduplicated": True}
+                        outcomes[i] = "deduplicated"
+
+            documents_collection = get_documents_collection()
+            if records and documents_collection is not None:
+                started = time.perf_counter()
+                await documents_collection.insert_many(records)
+                print(f"Saved {len(records)} document records to MongoDB")
+                write_seconds = (time.perf_counter() - started) / len(records)
+                for i, outcome in enumerate(outcomes):
+                    if outcome in ("linked", "processed"):
+                        stats[i].add_time("metadata", write_seconds)
+        except BaseException:
+            for document_id in referenced:
+                await self.release(document_id)
+            raise
+
+        for job_stats, outcome in zip(stats, outcomes):
+            job_stats.observe(outcome)
+
+        return results
+
+    async def _plan(self, content_hash: str, user_id: str) -> Dict[str, Any]:
+        """Decide how an upload with this content hash should be ingested.
+
+        ``action`` is one of:
+        - "owned": the user already has this content indexed
+        - "rebuild": the user has it, but its chunks are gone from the vector store
+        - "link": another owner's chunk set can be shared
+        - "process": the content must be extracted and indexed
+        """
+        vector_store = self.get_vector_store()
+
+        documents_collection = get_documents_collection()
+        if documents_collection is not None:
+            existing = await documents_collection.find_one(
+                {"user_id": user_id, "content_hash": content_hash}
+            )
+            if existing:
+                return {
+                    "action": "owned" if await asyncio.to_thread(
+                        vector_store.has_document, existing["document_id"]
+                    ) else "rebuild",
+                    "document_id": existing["document_id"],
+                    "record": existing,
+                    "reindexed": True,
+                }
+
+        chunk_set = None
+        chunk_sets_collection = get_chunk_sets_collection()
+        if chunk_sets_collection is not None:
+            chunk_set = await chunk_sets_collection.find_one({"content_hash": content_hash})
+
+        if chunk_set and await asyncio.to_thread(vector_store.has_document, chunk_set["document_id"]):
+            return {"action": "link", "document_id": chunk_set["document_id"], "chunk_set": chunk_set}
+
+        return {
+            "action": "process",
+            "document_id": chunk_set["document_id"] if chunk_set else str(uuid.uuid4()),
+            "reindexed": chunk_set is not None,
+        }
+
+    async def _link(self, chunk_set: Dict[str, Any], filename: str, remaining_quota: Optional[int]) -> int:
+        """Take a reference to an existing chunk set; returns its chunk count"""
+        chunk_count = chunk_set.get("chunk_count", 0)
+        self._check_quota(chunk_count, remaining_quota)
+        await get_chunk_sets_collection().update_one(
+            {"_id": chunk_set["_id"]},
+            {"$inc": {"ref_count": 1}}
+        )
+        print(f"♻️ Linked {filename} to existing chunk set {chunk_set['document_id']}")
+        return chunk_count
+
+    @asynccontextmanager
+    async def _admitted(self, uploads: List[Dict[str, Any]], stats: List[IngestStats]) -> AsyncIterator[None]:
+        """Reserve the estimated memory of ingesting ``uploads`` for the enclosed block.
+
+        Time spent waiting for admission is recorded as the "queue" stage.
+        Raises AdmissionRejected when the queue is full or the wait times out.
+        """
+        if self.admission is None or not uploads:
+            yield
+            return
+
+        cost = sum(
+            self.admission.estimate(upload["file_size"], upload.get("file_extension"))
+            for upload in uploads
+        )
+        started = time.perf_counter()
+        async with self.admission.admit(cost):
+            waited = time.perf_counter() - started
+            for upload_stats in stats:
+                upload_stats.add_time("queue", waited)
+            yield
+
+    @staticmethod
+    def _new_stats(received: Dict[str, Any]) -> IngestStats:
+        stats = IngestStats(received.get("file_extension"))
+        stats.add_time("receive", received.get("receive_seconds", 0.0))
+        stats.count("bytes", received["file_size"])
+        return stats
+
+    @staticmethod
+    def _document_record(document_id: str, filename: str, received: Dict[str, Any],
+                         user_id: str, chunk_count: int,
+                         ingest_stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return {
+            "document_id": document_id,
+            "filename": filename,
+            "original_filename": filename,
+            "file_size": received["file_size"],
+            "content_hash": received["sha256"],
+            "user_id": user_id,
+            "uploaded_at": datetime.utcnow(),
+            "status": "processed",
+            "chunk_count": chunk_count,
+            "ingest_stats": ingest_stats,
+        }
+
+    async def reindex(self, document_record: Dict[str, Any]) -> Dict[str, Any]:
+        """Rebuild a document's chunks from the text cache.
+
+        Uploaded files are not kept, so this only works while the extracted
+        text for the document's content hash is cached.
+        """
+        document_id = document_record["document_id"]
+        filename = document_record["filename"]
+        content_hash = document_record.get("content_hash")
+
+        if not self.document_processor.has_cached_text(filename, content_hash):
+            raise ReindexUnavailable(
+                "The original file is no longer available. Please upload it again."
+            )
+
+        stats = IngestStats(os.path.splitext(filename)[1].lower())
+        outcome = "failed"
+        try:
+            upload = {
+                "file_size": document_record.get("file_size", 0),
+                "file_extension": os.path.splitext(filename)[1].lower(),
+            }
+            async with self._admitted([upload], [stats]):
+                await asyncio.to_thread(self.get_vector_store().delete_document, document_id)
+                _, chunk_count = await asyncio.to_thread(
+                    self._index,
+                    None,
+                    filename,
+                    document_record.get("user_id"),
+                    document_id,
+                    content_hash=content_hash,
+                    stats=stats
+                )
+            answer_cache.invalidate_document(document_id)
+
+            with stats.stage("metadata"):
+                chunk_sets_collection = get_chunk_sets_collection()
+                if chunk_sets_collection is not None:
+                    await chunk_sets_collection.update_one(
+                        {"document_id": document_id},
+                        {"$set": {"chunk_count": chunk_count}}
+                    )
+
+                documents_collection = get_documents_collection()
+                if documents_collection is not None:
+                    await documents_collection.update_many(
+                        {"document_id": document_id},
+                        {"$set": {"chunk_count": chunk_count}}
+                    )
+            outcome = "reindexed"
+        finally:
+            stats.observe(outcome)
+
+        return {**self._result(document_record, deduplicated=False), "chunk_count": chunk_count}
+
+    async def replace(self, document_record: Dict[str, Any], received: Dict[str, Any],
+                      filename: str) -> Dict[str, Any]:
+        """Replace a document with a new revision, re-indexing only what changed.
+
+        The new version is split as usual and each chunk's hash is looked up
+        among the stored chunks: matches keep their id and embedding (only
+        their metadata is rewritten), new chunks are embedded and inserted in
+        windows, and stored chunks left unmatched are deleted at the end.
+        A chunk set shared with other owners is never edited in place; the
+        revision is ingested as a separate document instead.
+        """
+        document_id = document_record["document_id"]
+        user_id = document_record["user_id"]
+        content_hash = received["sha256"]
+        old_chunk_count = document_record.get("chunk_count", 0)
+
+        if content_hash == document_record.get("content_hash"):
+            print(f"♻️ {filename} is unchanged, nothing to re-index")
+            return {**self._result(document_record, deduplicated=True),
+                    "added": 0, "reused": old_chunk_count, "removed": 0}
+
+        chunk_sets_collection = get_chunk_sets_collection()
+        documents_collection = get_documents_collection()
+        chunk_set = target_set = None
+        if chunk_sets_collection is not None:
+            chunk_set = await chunk_sets_collection.find_one({"document_id": document_id})
+            target_set = await chunk_sets_collection.find_one({"content_hash": content_hash})
+
+        if (chunk_set and chunk_set.get("ref_count", 1) > 1) or target_set:
+            # Other owners still see the old chunks, or the new bytes are already
+            # a chunk set of their own: swap references instead of editing. The
+            # old document is only let go once the new one is in place
+            print(f"🔀 Replacing shared document {document_id} with a separate copy")
+            result = await self.ingest(received, filename, user_id, freed_chunks=old_chunk_count)
+            if documents_collection is not None:
+                await documents_collection.delete_one({"_id": document_record["_id"]})
+            await self.release(document_id)
+            return {**result, "added": result["chunk_count"], "reused": 0, "removed": 0}
+
+        stats = self._new_stats(received)
+        outcome = "failed"
+        try:
+            async with self._admitted([received], [stats]):
+                result = await self._replace_in_place(document_record, received, filename, stats)
+            outcome = "replaced"
+            return result
+        finally:
+            stats.observe(outcome)
+
+    async def _replace_in_place(self, document_record: Dict[str, Any], received: Dict[str, Any],
+                                filename: str, stats: IngestStats) -> Dict[str, Any]:
+        """Diff a new revision against the stored chunks of a single-owner document"""
+        document_id = document_record["document_id"]
+        user_id = document_record["user_id"]
+        content_hash = received["sha256"]
+        old_chunk_count = document_record.get("chunk_count", 0)
+
+        vector_store = self.get_vector_store()
+        with stats.stage("index"):
+            stored = await asyncio.to_thread(vector_store.get_chunk_hashes, document_id)
+        revision = document_record.get("revision", 1) + 1
+
+        with stats.stage("metadata"):
+            remaining_quota = await self._remaining_chunk_quota(user_id)
+        max_chunks = None if remaining_quota is None else remaining_quota + old_chunk_count
+
+        added_ids, reused, chunk_count = await asyncio.to_thread(
+            self._index_revision,
+            upload_source(received),
+            filename,
+            document_id,
+            user_id,
+            revision,
+            stored,
+            max_chunks=max_chunks,
+            content_hash=content_hash,
+            stats=stats
+        )
+
+        removed_ids = [chunk_id for ids in stored.values() for chunk_id in ids]
+        with stats.stage("index"):
+            await asyncio.to_thread(self._commit_revision, reused, removed_ids)
+        stats.count("chunks_reused", len(reused))
+        # Nothing refers to the old revision's bytes any more
+        self.document_processor.discard_cached_text(document_record.get("content_hash"))
+        answer_cache.invalidate_document(document_id)
+        if self.artifacts is not None:
+            await self.artifacts.discard(document_id)
+
+        print(f"🔁 Re-indexed {filename}: {len(added_ids)} new, "
+              f"{len(reused)} unchanged, {len(removed_ids)} removed chunks")
+
+        chunk_sets_collection = get_chunk_sets_collection()
+        if chunk_sets_collection is not None:
+            with stats.stage("metadata"):
+                await chunk_sets_collection.update_one(
+                    {"document_id": document_id},
+                    {"$set": {"content_hash": content_hash, "chunk_count": chunk_count}}
+                )
+
+        document_record = {
+            **document_record,
+            "filename": filename,
+            "file_size": received["file_size"],
+            "content_hash": content_hash,
+            "chunk_count": chunk_count,
+            "revision": revision,
+            "updated_at": datetime.utcnow(),
+            "ingest_stats": stats.as_dict(),
+        }
+        documents_collection = get_documents_collection()
+        if documents_collection is not None:
+            with stats.stage("metadata"):
+                await documents_collection.update_one(
+                    {"_id": document_record["_id"]},
+                    {"$set": {key: document_record[key] for key in (
+                        "filename", "file_size", "content_hash", "chunk_count", "revision",
+                        "updated_at", "ingest_stats"
+                    )}}
+                )
+
+        self._schedule_artifacts(document_id)
+        return {
+            **self._result(document_record, deduplicated=False),
+            "added": len(added_ids),
+            "reused": len(reused),
+            "removed": len(removed_ids),
+        }
+
+    def _index_revision(self, source, filename: str, document_id: str, user_id: str,
+                        revision: int, stored: Dict[str, List[str]],
+                        max_chunks: Optional[int] = None, content_hash: Optional[str] = None,
+                        stats: Optional[IngestStats] = None) -> Tuple[List[str], List[Dict[str, Any]], int]:
+        """Index the chunks of a revision that are not among ``stored``.
+
+        ``stored`` maps chunk hashes to the ids of stored chunks; ids reused
+        by the revision are taken out of it, so what is left afterwards is
+        stale. Returns (added chunk ids, reused chunks, chunk_count). Anything
+        added is removed again if a later window fails or the quota runs out.
+        """
+        vector_store = self.get_vector_store()
+        added_ids: List[str] = []
+        reused: List[Dict[str, Any]] = []
+        chunk_count = 0
+
+        try:
+            for window in self.document_processor.iter_chunk_windows(
+                source,
+                filename,
+                document_id,
+                user_id,
+                window_size=settings.INGEST_WINDOW_CHUNKS,
+                content_hash=content_hash,
+                stats=stats
+            ):
+                chunk_count += len(window)
+                self._check_quota(chunk_count, max_chunks)
+
+                new_chunks = []
+                for chunk in window:
+                    matches = stored.get(chunk["chunk_hash"])
+                    if matches:
+                        # Unchanged text: keep the stored chunk and its embedding
+                        chunk["id"] = matches.pop()
+                        chunk.pop("text")
+                        reused.append(chunk)
+                    else:
+                        # Revision-scoped ids never collide with ids still in use
+                        chunk["id"] = f"{document_id}_r{revision}_chunk_{chunk['chunk_index']}"
+                        new_chunks.append(chunk)
+
+                if new_chunks:
+                    if not vector_store.add_documents(new_chunks, stats):
+                        raise Exception("Failed to index document")
+                    added_ids.extend(chunk["id"] for chunk in new_chunks)
+
+        except BaseException:
+            # The stored revision is left untouched until the new one is complete
+            if added_ids:
+                vector_store.delete_chunks(added_ids)
+            raise
+
+        return added_ids, reused, chunk_count
+
+    def _commit_revision(self, reused: List[Dict[str, Any]], removed_ids: List[str]) -> None:
+        """Point reused chunks at the new revision and drop the stale ones"""
+        vector_store = self.get_vector_store()
+        vector_store.update_chunk_metadata(reused)
+        vector_store.delete_chunks(removed_ids)
+
+    def _index(self, source, filename: str, user_id: Optional[str],
+               document_id: Optional[str] = None, max_chunks: Optional[int] = None,
+               content_hash: Optional[str] = None,
+               stats: Optional[IngestStats] = None) -> Tuple[str, int]:
+        """Extract, split and index a document; returns (document_id, chunk_count).
+
+        The document is streamed through in windows of INGEST_WINDOW_CHUNKS,
+        each embedded and indexed before the next is extracted, so memory
+        stays flat however long the document is. Anything already indexed is
+        removed again if a later window fails or the quota runs out.
+        """
+        document_id = document_id or str(uuid.uuid4())
+        vector_store = self.get_vector_store()
+        chunk_count = 0
+
+        try:
+            for window in self.document_processor.iter_chunk_windows(
+                source,
+                filename,
+                document_id,
+                user_id,
+                window_size=settings.INGEST_WINDOW_CHUNKS,
+                content_hash=content_hash,
+                stats=stats
+            ):
+                chunk_count += len(window)
+                self._check_quota(chunk_count, max_chunks)
+
+                if not vector_store.add_documents(window, stats):
+                    raise Exception("Failed to index document")
+
+                print(f"Indexed {chunk_count} chunks of {filename} so far")
+
+        except BaseException:
+            if chunk_count:
+                vector_store.delete_document(document_id)
+            raise
+
+        return document_id, chunk_count
+
+    async def _remaining_chunk_quota(self, user_id: str) -> Optional[int]:
+        """Chunks the user may still index, or None when unlimited"""
+        documents_collection = get_documents_collection()
+        if not settings.USER_CHUNK_QUOTA or documents_collection is None:
+            return None
+
+        totals = await documents_collection.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$group": {"_id": None, "chunks": {"$sum": "$chunk_count"}}}
+        ]).to_list(length=1)
+        used = totals[0]["chunks"] if totals else 0
+
+        return max(settings.USER_CHUNK_QUOTA - used, 0)
+
+    @staticmethod
+    def _check_quota(chunk_count: int, max_chunks: Optional[int]) -> None:
+        if max_chunks is not None and chunk_count > max_chunks:
+            raise ChunkQuotaExceeded(
+                f"Document exceeds your remaining quota of {max_chunks} chunks "
+                f"(limit {settings.USER_CHUNK_QUOTA} chunks per user). "
+                "Delete some documents and try again."
+            )
+
+    async def _register_chunk_set(self, content_hash: str, document_id: str, chunk_count: int,
+                                  reindexed: bool = False) -> str:
+        """Record a freshly indexed chunk set and take one reference to it.
+
+        Returns the document_id owners should point at. If a concurrent upload
+        of the same bytes registered first, our chunks are dropped and theirs
+        are used instead.
+        """
+        chunk_sets_collection = get_chunk_sets_collection()
+        if chunk_sets_collection is None:
+            return document_id
+
+        update: Dict[str, Any] = {
+            "$setOnInsert": {
+                "content_hash": content_hash,
+                "document_id": document_id,
+                "created_at": datetime.utcnow(),
+            },
+            "$set": {"chunk_count": chunk_count},
+            "$inc": {"ref_count": 1},
+        }
+
+        chunk_set = await chunk_sets_collection.find_one_and_update(
+            {"content_hash": content_hash},
+            update,
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+        if chunk_set["document_id"] != document_id:
+            print(f"♻️ Lost registration race for {content_hash[:12]}, using {chunk_set['document_id']}")
+            await asyncio.to_thread(self.get_vector_store().delete_document, document_id)
+        elif reindexed:
+            print(f"🔄 Re-indexed chunk set {document_id}")
+
+        return chunk_set["document_id"]
+
+    async def release(self, document_id: str) -> bool:
+        """Drop one reference to a chunk set; delete its chunks at zero.
+
+        Returns True when the chunks were removed from the vector store.
+        """
+        chunk_sets_collection = get_chunk_sets_collection()
+
+        if chunk_sets_collection is not None:
+            chunk_set = await chunk_sets_collection.find_one_and_update(
+                {"document_id": document_id},
+                {"$inc": {"ref_count": -1}},
+                return_document=ReturnDocument.AFTER
+            )
+            if chunk_set is not None:
+                if chunk_set["ref_count"] > 0:
+                    return False
+                deleted = await chunk_sets_collection.delete_one(
+                    {"_id": chunk_set["_id"], "ref_count": {"$lte": 0}}
+                )
+                if deleted.deleted_count == 0:
+                    # Re-linked by a concurrent upload in the meantime
+                    return False
+                self.document_processor.discard_cached_text(chunk_set.get("content_hash"))
+            else:
+                # Documents uploaded before chunk sets existed have a single owner
+                # unless another record points at the same document_id
+                documents_collection = get_documents_collection()
+                if documents_collection is not None and await documents_collection.find_one(
+                    {"document_id": document_id}
+                ):
+                    return False
+
+        answer_cache.invalidate_document(document_id)
+        if self.artifacts is not None:
+            await self.artifacts.discard(document_id)
+        return await asyncio.to_thread(self.get_vector_store().delete_document, document_id)
+
+    def _schedule_artifacts(self, document_id: str) -> None:
+        if self.artifacts is not None:
+            self.artifacts.schedule(document_id)
+
+    @staticmethod
+    def _result(document_record: Dict[str, Any], deduplicated: bool) -> Dict[str, Any]:
+        return {
+            "document_id": document_record["document_id"],
+            "filename": document_record["filename"],
+            "file_size": document_record["file_size"],
+            "chunk_count": document_record.get("chunk_count", 0),
+            "deduplicated": deduplicated,
+            "status": "processed",
+        }
+
+    @staticmethod
+    def _failure(filename: str, error: Exception) -> Dict[str, Any]:
+        print(f"❌ Batch upload of {filename} failed: {str(error)}")
+        return {
+            "filename": filename,
+            "status": "failed",
+            "error": str(error),
+        }
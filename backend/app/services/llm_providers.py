@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import random
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+from app.services.context_packer import estimate_tokens
+
+LLM_PROVIDERS = ("gemini", "stub")
+STUB_LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+STUB_MODES = ("echo", "canned")
+
+# HTTP statuses of provider errors worth retrying: timeouts, rate limits
+# and transient server errors
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+# Generation settings shared by the providers
+DEFAULT_GENERATION_CONFIG = {
+    "temperature": 0.1,  # Lower temperature for more accurate, focused responses
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 2048,
+}
+
+
+class LLMProvider:
+    """A text generation backend for AIService.
+
+    ``name``, ``model_name`` and ``generation_config`` identify what a prompt
+    is sent to; identical prompts to the same model and config are
+    interchangeable.
+    """
+
+    name = ""
+
+    def __init__(self, model_name: str, generation_config: Optional[Dict[str, Any]] = None):
+        self.model_name = model_name
+        self.generation_config = dict(generation_config or DEFAULT_GENERATION_CONFIG)
+
+    async def generate(self, prompt: str) -> str:
+        """The complete response text for ``prompt``"""
+        raise NotImplementedError
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Response text for ``prompt`` as it is generated"""
+        yield await self.generate(prompt)
+
+    async def count_tokens(self, text: str) -> int:
+        """Tokens ``text`` takes up for this model"""
+        return estimate_tokens(text)
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """Whether a failed call may succeed if sent again"""
+        return isinstance(error, (asyncio.TimeoutError, ConnectionError))
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini through google-generativeai"""
+
+    name = "gemini"
+
+    def __init__(self, model_name: str = "models/gemini-2.5-flash",
+                 generation_config: Optional[Dict[str, Any]] = None):
+        super().__init__(model_name, generation_config)
+        import google.generativeai as genai
+
+        # Configure Gemini API
+        print(f"🤖 Initializing Gemini AI with API key: {settings.GOOGLE_API_KEY[:20]}...")
+        genai.configure(api_key=settings.GOOGLE_API_KEY)
+        self.model = genai.GenerativeModel(
+            self.model_name,
+            generation_config=genai.types.GenerationConfig(**self.generation_config)
+        )
+        print("✅ Gemini AI initialized successfully")
+
+    async def generate(self, prompt: str) -> str:
+        """Uses the client's async API, or a worker thread when it has none"""
+        generate_async = getattr(self.model, "generate_content_async", None)
+        if generate_async is not None:
+            response = await generate_async(prompt)
+        else:
+            response = await asyncio.to_thread(self.model.generate_content, prompt)
+        return self._extract_response_text(response)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Without an async client the whole response is yielded at once"""
+        generate_async = getattr(self.model, "generate_content_async", None)
+        if generate_async is None:
+            yield await self.generate(prompt)
+            return
+
+        response = await generate_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts, e.g. a final safety rating
+                continue
+            if text:
+                yield text
+
+    async def count_tokens(self, text: str) -> int:
+        """Counted by the API; estimated when that fails"""
+        try:
+            count_async = getattr(self.model, "count_tokens_async", None)
+            if count_async is not None:
+                result = await count_async(text)
+            else:
+                result = await asyncio.to_thread(self.model.count_tokens, text)
+            return result.total_tokens
+        except Exception as e:
+            print(f"⚠️ Token count failed, estimating: {str(e)}")
+            return estimate_tokens(text)
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """google.api_core errors carry their HTTP status as ``code``"""
+        return super().is_retryable(error) or getattr(error, "code", None) in RETRYABLE_STATUS_CODES
+
+    @staticmethod
+    def _extract_response_text(response) -> str:
+        """Extract text from Gemini API response safely"""
+        try:
+            # Try the new format first (parts-based)
+            if hasattr(response, 'parts') and response.parts:
+                return response.parts[0].text
+            elif hasattr(response, 'candidates') and response.candidates:
+                # Access through candidates structure
+                candidate = response.candidates[0]
+                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
+                    return candidate.content.parts[0].text
+                elif hasattr(candidate, 'text'):
+                    return candidate.text
+            elif hasattr(response, 'text'):
+                # Fallback for simple text response
+                return response.text
+            else:
+                # Last resort - convert to string
+                return str(response)
+        except Exception as e:
+            print(f"❌ Error extracting response text: {str(e)}")
+            return f"Error extracting response: {str(e)}"
+
+
+class StubProviderError(ConnectionError):
+    """A failure injected by StubProvider; retryable"""
+
+
+class StubProvider(LLMProvider):
+    """Local stand-in for benchmarking and load tests without network access.
+
+    Each call waits for a latency drawn from LLM_STUB_LATENCY_DISTRIBUTION
+    around LLM_STUB_LATENCY_MS, then answers with LLM_STUB_RESPONSE
+    ("canned") or a digest of the prompt and its last line ("echo"). Draws
+    come from a generator seeded with LLM_STUB_SEED, so a run is repeatable.
+    Streams split the response into words spread over the same latency. A
+    fraction LLM_STUB_ERROR_RATE of calls fail with StubProviderError after
+    their latency, to exercise retries and the circuit breaker.
+    """
+
+    name = "stub"
+
+    def __init__(self, model_name: str = "stub", generation_config: Optional[Dict[str, Any]] = None,
+                 mode: Optional[str] = None, latency_ms: Optional[float] = None,
+                 distribution: Optional[str] = None, spread: Optional[float] = None,
+                 seed: Optional[int] = None, response: Optional[str] = None,
+                 error_rate: Optional[float] = None):
+        super().__init__(model_name, generation_config)
+        self.mode = mode or settings.LLM_STUB_MODE
+        self.latency_ms = settings.LLM_STUB_LATENCY_MS if latency_ms is None else latency_ms
+        self.distribution = distribution or settings.LLM_STUB_LATENCY_DISTRIBUTION
+        self.spread = settings.LLM_STUB_LATENCY_SPREAD if spread is None else spread
+        self.response = settings.LLM_STUB_RESPONSE if response is None else response
+        self.error_rate = settings.LLM_STUB_ERROR_RATE if error_rate is None else error_rate
+        self._random = random.Random(settings.LLM_STUB_SEED if seed is None else seed)
+
+        if self.mode not in STUB_MODES:
+            raise ValueError(f"Unknown stub mode: {self.mode}")
+        if self.distribution not in STUB_LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown stub latency distribution: {self.distribution}")
+        print(f"🧪 Using stub LLM ({self.mode}, {self.distribution} ~{self.latency_ms}ms)")
+
+    def latency_seconds(self) -> float:
+        """One latency draw, in seconds"""
+        if self.distribution == "fixed":
+            latency = self.latency_ms
+        elif self.distribution == "uniform":
+            latency = self._random.uniform(self.latency_ms * (1 - self.spread), self.latency_ms * (1 + self.spread))
+        else:
+            # Median latency_ms; spread is the sigma of the underlying normal
+            latency = self.latency_ms * self._random.lognormvariate(0, self.spread)
+        return max(latency, 0) / 1000
+
+    def output(self, prompt: str) -> str:
+        if self.mode == "canned":
+            return self.response
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        lines = [line.strip() for line in prompt.strip().splitlines() if line.strip()]
+        return f"[stub {digest}] {lines[-1] if lines else ''}"
+
+    def _maybe_fail(self) -> None:
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise StubProviderError("Injected stub provider failure")
+
+    async def generate(self, prompt: str) -> str:
+        await asyncio.sleep(self.latency_seconds())
+        self._maybe_fail()
+        return self.output(prompt)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        words = self.output(prompt).split(" ")
+        delay = self.latency_seconds() / len(words)
+        for i, word in enumerate(words):
+            await asyncio.sleep(delay)
+            if i == 0:
+                self._maybe_fail()
+            yield word if i == 0 else " " + word
+
+
+def create_provider(name: Optional[str] = None) -> LLMProvider:
+    """The provider selected by ``name``, or by LLM_PROVIDER"""
+    name = (name or settings.LLM_PROVIDER).lower()
+    if name == "gemini":
+        return GeminiProvider()
+    if name == "stub":
+        return StubProvider()
+    raise ValueError(f"Unknown LLM provider: {name} (expected one of {', '.join(LLM_PROVIDERS)})")
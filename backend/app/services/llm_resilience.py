@@ -0,0 +1,251 @@
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Optional
+
+from app.core.config import settings
+from app.services.metrics import LLM_ATTEMPTS, LLM_CALLS, LLM_CIRCUIT_STATE, LLM_HEDGES
+
+# Successful call latencies kept for the hedging delay, and how many are
+# needed before hedging starts
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class LLMUnavailable(Exception):
+    """Raised when the LLM provider cannot answer; retry after ``retry_after`` seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Fails fast while a provider keeps failing.
+
+    After ``failure_threshold`` consecutive failed calls the circuit opens
+    and calls are rejected for ``reset_seconds``. Then one probe call is let
+    through (half open): its success closes the circuit, its failure opens
+    it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._set_state("closed")
+
+    def retry_after(self) -> int:
+        remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+        return max(math.ceil(remaining), 1)
+
+    def allow(self) -> None:
+        """Raise LLMUnavailable unless a call may go to the provider"""
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self._set_state("half_open")
+        if self.state == "closed":
+            return
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return
+        LLM_CALLS.inc(provider=self.name, outcome="rejected")
+        raise LLMUnavailable(
+            "The AI service is temporarily unavailable. Please try again shortly.",
+            self.retry_after()
+        )
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        if self.state != "closed":
+            print(f"✅ LLM circuit for {self.name} closed")
+            self._set_state("closed")
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"🔌 LLM circuit for {self.name} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            self._set_state("open")
+
+    def release(self) -> None:
+        """Let another probe through if a call ended without an outcome, e.g. cancelled"""
+        if self.state == "half_open":
+            self._probing = False
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        LLM_CIRCUIT_STATE.set(CIRCUIT_STATES[state], provider=self.name)
+
+
+class ResilientCaller:
+    """Timeouts, retries, hedging and circuit breaking around provider calls.
+
+    Every attempt is limited to LLM_TIMEOUT_SECONDS. Attempts failing with a
+    retryable error (``is_retryable``) are retried up to LLM_MAX_RETRIES
+    times after a full-jitter exponential backoff. With LLM_HEDGE_ENABLED, an
+    attempt still running after the p95 of recent call latencies gets a
+    duplicate request, and whichever finishes first wins. The circuit
+    breaker sees one success or failure per call, not per attempt. Used from
+    the event loop only.
+    """
+
+    def __init__(self, name: str, is_retryable: Callable[[BaseException], bool],
+                 timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 hedge: Optional[bool] = None, breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.is_retryable = is_retryable
+        self.timeout = timeout or settings.LLM_TIMEOUT_SECONDS
+        self.max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.hedge = settings.LLM_HEDGE_ENABLED if hedge is None else hedge
+        self.breaker = breaker or CircuitBreaker(
+            name, settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS
+        )
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def hedge_delay(self) -> Optional[float]:
+        """p95 of recent successful calls, once there are enough of them"""
+        if not self.hedge or len(self._latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)]
+
+    async def call(self, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``attempt`` (a fresh coroutine each time) until it succeeds or gives up"""
+        self.breaker.allow()
+        try:
+            for retry in range(self.max_retries + 1):
+                started = time.monotonic()
+                try:
+                    result = await self._hedged(attempt)
+                except Exception as e:
+                    if not self._should_retry(e, retry):
+                        raise self._failed(e)
+                    await self._backoff(retry)
+                    continue
+                self._latencies.append(time.monotonic() - started)
+                self._succeeded()
+                return result
+        finally:
+            self.breaker.release()
+
+    async def stream(self, open_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Yield from a stream, retrying attempts that fail before their first token.
+
+        Once text has been yielded a failure cannot be retried and is raised.
+        Each wait for the next piece of text is limited to LLM_TIMEOUT_SECONDS.
+        """
+        self.breaker.allow()
+        try:
+            for retry in range(self.max_retries + 1):
+                stream = open_stream()
+                yielded = False
+                try:
+                    while True:
+                        try:
+                            text = await self._timed(stream.__anext__())
+                        except StopAsyncIteration:
+                            break
+                        yielded = True
+                        yield text
+                except Exception as e:
+                    if yielded or not self._should_retry(e, retry):
+                        raise self._failed(e)
+                    await self._backoff(retry)
+                    continue
+                finally:
+                    await stream.aclose()
+                self._succeeded()
+                return
+        finally:
+            self.breaker.release()
+
+    async def _hedged(self, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._timed(attempt())
+
+        loop = asyncio.get_running_loop()
+        primary = loop.create_task(self._timed(attempt()))
+        pending = {primary}
+        error: Optional[BaseException] = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            LLM_HEDGES.inc(provider=self.name, outcome="sent")
+            hedge = loop.create_task(self._timed(attempt()))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            LLM_HEDGES.inc(provider=self.name, outcome="won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _timed(self, awaitable: Awaitable[Any]) -> Any:
+        try:
+            result = await asyncio.wait_for(awaitable, self.timeout)
+        except asyncio.TimeoutError:
+            LLM_ATTEMPTS.inc(provider=self.name, outcome="timeout")
+            raise
+        except StopAsyncIteration:
+            raise
+        except Exception as e:
+            LLM_ATTEMPTS.inc(provider=self.name, outcome="retryable_error" if self.is_retryable(e) else "error")
+            raise
+        LLM_ATTEMPTS.inc(provider=self.name, outcome="success")
+        return result
+
+    def _should_retry(self, error: BaseException, retry: int) -> bool:
+        retryable = isinstance(error, asyncio.TimeoutError) or self.is_retryable(error)
+        return retryable and retry < self.max_retries
+
+    async def _backoff(self, retry: int) -> None:
+        LLM_CALLS.inc(provider=self.name, outcome="retried")
+        cap = min(settings.LLM_RETRY_MAX_SECONDS, settings.LLM_RETRY_BASE_SECONDS * 2 ** retry)
+        await asyncio.sleep(random.uniform(0, cap))
+
+    def _succeeded(self) -> None:
+        self.breaker.record_success()
+        LLM_CALLS.inc(provider=self.name, outcome="success")
+
+    def _failed(self, error: BaseException) -> BaseException:
+        """Record a call that gave up; the error to raise in its place.
+
+        Only timeouts and retryable errors count against the circuit; other
+        errors (a rejected or oversized prompt) say nothing about the
+        provider's health and are raised as they are.
+        """
+        if isinstance(error, asyncio.TimeoutError):
+            self.breaker.record_failure()
+            LLM_CALLS.inc(provider=self.name, outcome="timeout")
+            return LLMUnavailable(
+                "The AI service took too long to respond. Please try again.",
+                self.breaker.retry_after() if self.breaker.state == "open" else 1
+            )
+        LLM_CALLS.inc(provider=self.name, outcome="failure")
+        if self.is_retryable(error):
+            self.breaker.record_failure()
+            return LLMUnavailable(
+                f"The AI service is unavailable: {str(error)}",
+                self.breaker.retry_after() if self.breaker.state == "open" else 1
+            )
+        return error
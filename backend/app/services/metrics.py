@@ -0,0 +1,390 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds for latency histograms, in seconds
+DEFAULT_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str],
+                   extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        f'{name}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base for in-process metrics exported in the Prometheus text format"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_SECONDS_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def _render_series(self, key: Tuple[str, ...], series: Dict[str, Any]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, series["counts"]):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+        lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# =========================
+# INGESTION METRICS
+# =========================
+
+INGEST_STAGES = ("receive", "queue", "extract", "split", "embed", "index", "metadata")
+
+INGEST_STAGE_SECONDS = Histogram(
+    "smartdocq_ingest_stage_seconds",
+    "Time spent in each ingestion stage per document",
+    ("stage", "file_type")
+)
+
+INGEST_DOCUMENT_SECONDS = Histogram(
+    "smartdocq_ingest_document_seconds",
+    "End-to-end ingestion time per document",
+    ("file_type",)
+)
+
+INGEST_BYTES = Histogram(
+    "smartdocq_ingest_bytes",
+    "Size of ingested files",
+    ("file_type",),
+    buckets=(16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2)
+)
+
+INGEST_CHUNKS = Histogram(
+    "smartdocq_ingest_chunks",
+    "Chunks produced per ingested document",
+    ("file_type",),
+    buckets=(10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+)
+
+INGEST_DOCUMENTS = Counter(
+    "smartdocq_ingest_documents_total",
+    "Ingested documents by outcome",
+    ("file_type", "outcome")
+)
+
+INGEST_QUEUE_DEPTH = Gauge(
+    "smartdocq_ingest_queue_depth",
+    "Ingestions waiting for admission"
+)
+
+INGEST_QUEUE_WAIT_SECONDS = Histogram(
+    "smartdocq_ingest_queue_wait_seconds",
+    "Time ingestions waited for admission"
+)
+
+INGEST_MEMORY_RESERVED_BYTES = Gauge(
+    "smartdocq_ingest_memory_reserved_bytes",
+    "Estimated memory reserved by running ingestions"
+)
+
+INGEST_ADMISSIONS = Counter(
+    "smartdocq_ingest_admissions_total",
+    "Admission decisions for ingestions",
+    ("outcome",)
+)
+
+
+class IngestStats:
+    """Per-document ingestion timings and counts.
+
+    Stage times are exclusive: time spent in a stage nested inside another
+    (extraction pulled by the splitter, say) is only counted for the inner
+    stage. One instance is used by one thread at a time.
+    """
+
+    def __init__(self, file_type: str):
+        self.file_type = file_type or "unknown"
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._started = time.perf_counter()
+        # [stage, start, time spent in nested stages] for stages in progress
+        self._active: List[List[Any]] = []
+
+    def _enter_stage(self, stage: str) -> None:
+        self._active.append([stage, time.perf_counter(), 0.0])
+
+    def _exit_stage(self) -> None:
+        stage, start, nested = self._active.pop()
+        elapsed = time.perf_counter() - start
+        self.add_time(stage, elapsed - nested)
+        if self._active:
+            self._active[-1][2] += elapsed
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator["IngestStats"]:
+        """Time the enclosed block as ``stage``"""
+        self._enter_stage(stage)
+        try:
+            yield self
+        finally:
+            self._exit_stage()
+
+    def timed(self, stage: str, iterable: Iterable[Any]) -> Iterator[Any]:
+        """Yield from ``iterable``, counting the time spent producing items as ``stage``"""
+        iterator = iter(iterable)
+        while True:
+            self._enter_stage(stage)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit_stage()
+            yield item
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Summary stored on the document record"""
+        return {
+            "file_type": self.file_type,
+            "stages": {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+            "total_seconds": round(time.perf_counter() - self._started + self.stages.get("receive", 0.0), 4),
+            **self.counts,
+        }
+
+    def observe(self, outcome: str = "processed") -> None:
+        """Export this document's timings and counts to the histograms"""
+        for stage, seconds in self.stages.items():
+            INGEST_STAGE_SECONDS.observe(seconds, stage=stage, file_type=self.file_type)
+        INGEST_DOCUMENT_SECONDS.observe(
+            time.perf_counter() - self._started + self.stages.get("receive", 0.0),
+            file_type=self.file_type
+        )
+        if "bytes" in self.counts:
+            INGEST_BYTES.observe(self.counts["bytes"], file_type=self.file_type)
+        if "chunks" in self.counts:
+            INGEST_CHUNKS.observe(self.counts["chunks"], file_type=self.file_type)
+        INGEST_DOCUMENTS.inc(file_type=self.file_type, outcome=outcome)
+
+
+# =========================
+# LLM METRICS
+# =========================
+
+LLM_IN_FLIGHT = Gauge(
+    "smartdocq_llm_in_flight",
+    "LLM calls currently in progress"
+)
+
+LLM_WAIT_SECONDS = Histogram(
+    "smartdocq_llm_wait_seconds",
+    "Time LLM calls waited for an in-flight slot"
+)
+
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    "smartdocq_llm_first_token_seconds",
+    "Time from sending a streamed prompt to its first token"
+)
+
+LLM_COALESCED_CALLS = Counter(
+    "smartdocq_llm_coalesced_calls_total",
+    "LLM calls saved by sharing an identical prompt already in flight"
+)
+
+LLM_PROMPT_TOKENS = Histogram(
+    "smartdocq_llm_prompt_tokens",
+    "Estimated tokens per prompt sent to the LLM",
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+)
+
+LLM_CALLS = Counter(
+    "smartdocq_llm_calls_total",
+    "LLM calls by outcome (success, retried, timeout, failure, rejected by an open circuit)",
+    ("provider", "outcome")
+)
+
+LLM_ATTEMPTS = Counter(
+    "smartdocq_llm_attempts_total",
+    "Requests sent to the LLM provider, including retries and hedges, by outcome",
+    ("provider", "outcome")
+)
+
+LLM_HEDGES = Counter(
+    "smartdocq_llm_hedges_total",
+    "Duplicate LLM requests sent after the p95 delay, and how many of them won",
+    ("provider", "outcome")
+)
+
+LLM_CIRCUIT_STATE = Gauge(
+    "smartdocq_llm_circuit_state",
+    "LLM circuit breaker state (0 closed, 1 half open, 2 open)",
+    ("provider",)
+)
+
+CONTEXT_CHUNKS_DROPPED = Counter(
+    "smartdocq_context_chunks_dropped_total",
+    "Retrieved chunks left out of prompt context, by reason",
+    ("reason",)
+)
+
+
+# =========================
+# ANSWER CACHE METRICS
+# =========================
+
+ANSWER_CACHE_REQUESTS = Counter(
+    "smartdocq_answer_cache_requests_total",
+    "Answer cache lookups by outcome",
+    ("outcome",)
+)
+
+ANSWER_CACHE_ENTRIES = Gauge(
+    "smartdocq_answer_cache_entries",
+    "Answers currently cached"
+)
+
+ANSWER_CACHE_INVALIDATIONS = Counter(
+    "smartdocq_answer_cache_invalidations_total",
+    "Cached answers dropped because a cited document changed"
+)
+
+
+# =========================
+# DOCUMENT ARTIFACT METRICS
+# =========================
+
+DOCUMENT_ARTIFACT_REQUESTS = Counter(
+    "smartdocq_document_artifact_requests_total",
+    "Summary and key-point requests, by kind and whether they were served from storage",
+    ("kind", "outcome")
+)
+
+DOCUMENT_ARTIFACT_GENERATIONS = Counter(
+    "smartdocq_document_artifact_generations_total",
+    "Summaries and key points generated, by kind and outcome",
+    ("kind", "outcome")
+)
+
+SUMMARY_PARTIALS = Counter(
+    "smartdocq_summary_partials_total",
+    "Map-reduce partial summaries by stage, and whether they were stored or generated",
+    ("stage", "outcome")
+)
@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services.database import get_upload_sessions_collection
+from app.services.upload_receiver import (
+    PDF_HEADER_WINDOW,
+    UploadRejected,
+    _size_limit_message,
+    sniff_file_type,
+)
+
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+def parse_content_range(header: Optional[str]) -> Tuple[int, int, int]:
+    """Parse ``Content-Range: bytes start-end/total`` into (start, end, total)"""
+    match = CONTENT_RANGE.match((header or "").strip())
+    if not match:
+        raise UploadRejected("Content-Range header must look like 'bytes start-end/total'")
+    start, end, total = (int(value) for value in match.groups())
+    if end < start:
+        raise UploadRejected("Content-Range end is before its start", status_code=416)
+    return start, end, total
+
+
+class ResumableUploads:
+    """Upload sessions that receive a file as a sequence of byte ranges.
+
+    Ranges are appended to a part file under UPLOAD_FOLDER/resumable, whose
+    size is the authoritative received offset, and hashed as they arrive so
+    completing an upload needs no extra pass over the file. File writes and
+    hashing run in worker threads. A retried range
+    that overlaps bytes already stored is accepted and its overlap skipped.
+    The file type is checked once the first PDF_HEADER_WINDOW bytes (or the
+    whole file, if smaller) are stored, however the ranges were split.
+    Session metadata lives in the upload_sessions collection; part files of
+    abandoned uploads are removed by ``remove_expired_periodically``.
+    """
+
+    def __init__(self, upload_dir: Optional[str] = None):
+        self.upload_dir = upload_dir or os.path.join(settings.UPLOAD_FOLDER, "resumable")
+        os.makedirs(self.upload_dir, exist_ok=True)
+        # upload_id -> (sha256 of the first ``offset`` bytes, offset)
+        self._hashers: Dict[str, Tuple[Any, int]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def part_path(self, upload_id: str) -> str:
+        return os.path.join(self.upload_dir, f"{upload_id}.part")
+
+    def received(self, upload_id: str) -> int:
+        path = self.part_path(upload_id)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def status(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        received = self.received(session["upload_id"])
+        return {
+            "upload_id": session["upload_id"],
+            "filename": session["filename"],
+            "file_size": session["file_size"],
+            "received": received,
+            "complete": received == session["file_size"],
+            "chunk_size": settings.UPLOAD_CHUNK_SIZE,
+            "expires_at": session["expires_at"],
+        }
+
+    async def create(self, user_id: str, filename: str, file_size: int) -> Dict[str, Any]:
+        """Open an upload session for a file of ``file_size`` bytes"""
+        collection = self._collection()
+        file_extension = os.path.splitext(filename or "")[1].lower()
+
+        if file_extension not in settings.allowed_file_types:
+            raise UploadRejected("Only PDF, DOCX, TXT files are allowed")
+        if file_size <= 0:
+            raise UploadRejected("Uploaded file is empty")
+        if file_size > settings.MAX_FILE_SIZE:
+            raise UploadRejected(_size_limit_message(settings.MAX_FILE_SIZE), status_code=413)
+
+        now = datetime.utcnow()
+        session = {
+            "upload_id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "filename": filename,
+            "file_extension": file_extension,
+            "file_size": file_size,
+            "receive_seconds": 0.0,
+            "created_at": now,
+            "expires_at": now + timedelta(hours=settings.RESUMABLE_UPLOAD_TTL_HOURS),
+        }
+        open(self.part_path(session["upload_id"]), "wb").close()
+        self._hashers[session["upload_id"]] = (hashlib.sha256(), 0)
+        await collection.insert_one(session)
+        print(f"📦 Opened resumable upload {session['upload_id']} for {filename} ({file_size} bytes)")
+
+        return self.status(session)
+
+    async def get(self, upload_id: str, user_id: str) -> Dict[str, Any]:
+        session = await self._collection().find_one({"upload_id": upload_id, "user_id": user_id})
+        if session is None or session["expires_at"] < datetime.utcnow():
+            raise UploadRejected("Upload session not found or expired", status_code=404)
+        return session
+
+    async def append(self, session: Dict[str, Any], content_range: Optional[str],
+                     body: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """Append one byte range streamed from ``body`` to the upload"""
+        upload_id = session["upload_id"]
+        start, end, total = parse_content_range(content_range)
+
+        if total != session["file_size"]:
+            raise UploadRejected(
+                f"Content-Range total {total} does not match the declared size {session['file_size']}"
+            )
+        if end >= total:
+            raise UploadRejected("Content-Range extends past the end of the file", status_code=416)
+
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        async with lock:
+            received = self.received(upload_id)
+            if start > received:
+                raise UploadRejected(
+                    f"Range starts at {start} but only {received} bytes were received",
+                    status_code=409
+                )
+
+            hasher = await asyncio.to_thread(self._hasher, upload_id, received)
+            expected = end - start + 1
+            skip = received - start  # overlap with bytes already stored
+            seen = 0
+            written = 0
+            # The magic bytes are checked once this much of the file is stored
+            head_size = min(PDF_HEADER_WINDOW, session["file_size"])
+            rejected = False
+            started = time.perf_counter()
+
+            try:
+                with open(self.part_path(upload_id), "ab") as out:
+                    async for data in body:
+                        if seen + len(data) > expected:
+                            raise UploadRejected("Request body is longer than its Content-Range")
+                        seen += len(data)
+
+                        if skip:
+                            dropped = min(skip, len(data))
+                            data = data[dropped:]
+                            skip -= dropped
+                        if not data:
+                            continue
+
+                        await asyncio.to_thread(self._write, out, hasher, data)
+                        written += len(data)
+
+                        if received < head_size <= received + written:
+                            await asyncio.to_thread(out.flush)
+                            if not await asyncio.to_thread(
+                                self._head_matches, upload_id, head_size, session["file_extension"]
+                            ):
+                                rejected = True
+                                raise UploadRejected(
+                                    f"File content does not match the {session['file_extension']} format"
+                                )
+            finally:
+                if rejected:
+                    # Start over from an empty part file
+                    open(self.part_path(upload_id), "wb").close()
+                    self._hashers[upload_id] = (hashlib.sha256(), 0)
+                else:
+                    # Whatever reached the part file is kept; a dropped
+                    # connection resumes from here
+                    self._hashers[upload_id] = (hasher, received + written)
+                elapsed = time.perf_counter() - started
+                await self._collection().update_one(
+                    {"upload_id": upload_id},
+                    {"$inc": {"receive_seconds": elapsed}}
+                )
+
+        return self.status(session)
+
+    async def complete(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        """Hand a fully received upload over in the shape ``receive_upload`` returns"""
+        upload_id = session["upload_id"]
+        received = self.received(upload_id)
+
+        if received != session["file_size"]:
+            raise UploadRejected(
+                f"Upload incomplete: {received} of {session['file_size']} bytes received",
+                status_code=409
+            )
+
+        hasher = await asyncio.to_thread(self._hasher, upload_id, received)
+        return {
+            "content": None,
+            "file_path": self.part_path(upload_id),
+            "file_size": received,
+            "sha256": hasher.hexdigest(),
+            "file_extension": session["file_extension"],
+            "receive_seconds": session.get("receive_seconds", 0.0),
+        }
+
+    async def discard(self, upload_id: str) -> None:
+        """Remove an upload session and its part file"""
+        self._hashers.pop(upload_id, None)
+        self._locks.pop(upload_id, None)
+        path = self.part_path(upload_id)
+        if os.path.exists(path):
+            os.remove(path)
+        await self._collection().delete_one({"upload_id": upload_id})
+
+    def _hasher(self, upload_id: str, received: int):
+        """sha256 of the first ``received`` bytes, rebuilt from disk if not cached.
+
+        The cache is per process, so after a restart (or on another worker)
+        the stored prefix is hashed once and appending continues from there.
+        Reads the part file, so it is called in a worker thread.
+        """
+        cached = self._hashers.get(upload_id)
+        if cached is not None and cached[1] == received:
+            return cached[0]
+
+        print(f"🔁 Re-hashing {received} received bytes of upload {upload_id}")
+        hasher = hashlib.sha256()
+        with open(self.part_path(upload_id), "rb") as part:
+            remaining = received
+            while remaining:
+                block = part.read(min(settings.UPLOAD_CHUNK_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        self._hashers[upload_id] = (hasher, received)
+        return hasher
+
+    @staticmethod
+    def _write(out, hasher, data: bytes) -> None:
+        out.write(data)
+        hasher.update(data)
+
+    def _head_matches(self, upload_id: str, head_size: int, file_extension: str) -> bool:
+        with open(self.part_path(upload_id), "rb") as part:
+            return sniff_file_type(part.read(head_size), file_extension)
+
+    async def remove_expired_periodically(self, interval_seconds: float) -> None:
+        """Remove part files of abandoned uploads every ``interval_seconds``, until cancelled"""
+        while True:
+            try:
+                await asyncio.to_thread(self._remove_expired_parts)
+            except Exception as e:
+                print(f"⚠️ Resumable upload cleanup failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    def _remove_expired_parts(self) -> None:
+        """Delete part files untouched for longer than the session TTL"""
+        cutoff = time.time() - settings.RESUMABLE_UPLOAD_TTL_HOURS * 3600
+        for name in os.listdir(self.upload_dir):
+            path = os.path.join(self.upload_dir, name)
+            try:
+                if name.endswith(".part") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    self._hashers.pop(name[:-len(".part")], None)
+                    print(f"🧹 Removed abandoned upload part {name}")
+            except OSError:
+                continue
+
+    @staticmethod
+    def _collection():
+        collection = get_upload_sessions_collection()
+        if collection is None:
+            raise UploadRejected("Database not available", status_code=503)
+        return collection
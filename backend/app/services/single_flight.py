@@ -0,0 +1,39 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from app.services.metrics import LLM_COALESCED_CALLS
+
+
+class SingleFlight:
+    """Runs concurrent calls with the same key once and shares the result.
+
+    The first caller starts the call; callers arriving while it is in flight
+    wait for the same result (or exception) instead of starting their own.
+    The call runs as its own task, so a caller that is cancelled does not
+    cancel it for the others. Used from the event loop only.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is not None:
+            LLM_COALESCED_CALLS.inc()
+        else:
+            task = asyncio.get_running_loop().create_task(call())
+            self._calls[key] = task
+
+            def forget(done: asyncio.Task) -> None:
+                if self._calls.get(key) is done:
+                    del self._calls[key]
+                if not done.cancelled():
+                    # Retrieved by the waiters; marks it seen if all of them left
+                    done.exception()
+
+            task.add_done_callback(forget)
+        return await asyncio.shield(task)
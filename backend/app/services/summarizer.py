@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.context_packer import estimate_tokens
+from app.services.database import get_summary_partials_collection
+from app.services.metrics import SUMMARY_PARTIALS
+
+if TYPE_CHECKING:
+    from app.services.ai_service import AIService
+
+
+class MapReduceSummarizer:
+    """Summarizes documents too large for one prompt, level by level.
+
+    Chunks are split into groups of at most SUMMARY_GROUP_TOKENS, each group
+    is summarized (map), and the section summaries are grouped and combined
+    again (reduce) until they fit one final prompt. Group boundaries are
+    content defined - a group ends after an item whose hash is a multiple of
+    SUMMARY_FAN_IN - so an edit only changes the groups around it, and every
+    partial summary is stored by the hash of its input. Re-summarizing an
+    edited document therefore only calls the LLM along the changed branch.
+    At most SUMMARY_MAP_CONCURRENCY groups are summarized at once.
+    """
+
+    def __init__(self, ai_service: "AIService", group_tokens: Optional[int] = None,
+                 fan_in: Optional[int] = None, concurrency: Optional[int] = None):
+        self.ai_service = ai_service
+        self.group_tokens = group_tokens or settings.SUMMARY_GROUP_TOKENS
+        self.fan_in = max(fan_in or settings.SUMMARY_FAN_IN, 2)
+        self.concurrency = max(concurrency or settings.SUMMARY_MAP_CONCURRENCY, 1)
+
+    async def summarize(self, chunks: List[Dict[str, Any]], version: Any = None) -> str:
+        """Summary of ``chunks`` in document order; ``version`` keys the stored partials"""
+        texts = self.ai_service.context_packer.pack(chunks, token_budget=0)["parts"]
+        if sum(estimate_tokens(text) for text in texts) <= self.group_tokens:
+            return await self.ai_service.generate_text(self.ai_service._summary_prompt(chunks))
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        summaries = await self._summarize_level(texts, "map", version, semaphore)
+        levels = 1
+        # A lone summary over the budget can't be reduced any further; the
+        # final pass condenses it once
+        while len(summaries) > 1 and (
+            len(summaries) > self.fan_in or sum(estimate_tokens(s) for s in summaries) > self.group_tokens
+        ):
+            levels += 1
+            summaries = await self._summarize_level(summaries, "reduce", version, semaphore)
+
+        print(f"🧩 Combining {len(summaries)} section summaries after {levels} levels")
+        final = await self._summarize_groups([summaries], "final", version, semaphore)
+        return final[0]
+
+    def _group(self, texts: List[str]) -> List[List[str]]:
+        """Split texts into consecutive groups at content-defined boundaries"""
+        groups: List[List[str]] = []
+        current: List[str] = []
+        tokens = 0
+        for text in texts:
+            text_tokens = estimate_tokens(text)
+            if current and tokens + text_tokens > self.group_tokens:
+                groups.append(current)
+                current, tokens = [], 0
+            current.append(text)
+            tokens += text_tokens
+            if len(current) >= 2 * self.fan_in or (
+                len(current) >= self.fan_in // 2 and self._is_boundary(text)
+            ):
+                groups.append(current)
+                current, tokens = [], 0
+        if current:
+            groups.append(current)
+        return groups
+
+    def _is_boundary(self, text: str) -> bool:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "big") % self.fan_in == 0
+
+    async def _summarize_level(self, texts: List[str], stage: str, version: Any,
+                               semaphore: asyncio.Semaphore) -> List[str]:
+        groups = self._group(texts)
+        if len(groups) == len(texts) and len(texts) > 1:
+            # Every item fills a group on its own; pair them up so the level shrinks
+            groups = [texts[i:i + 2] for i in range(0, len(texts), 2)]
+        return await self._summarize_groups(groups, stage, version, semaphore)
+
+    async def _summarize_groups(self, groups: List[List[str]], stage: str, version: Any,
+                                semaphore: asyncio.Semaphore) -> List[str]:
+        """Summaries of each group, from storage where the same input was summarized before"""
+        hashes = [self._group_hash(group, stage, version) for group in groups]
+        pending = dict(zip(hashes, groups))
+
+        summaries: Dict[str, str] = {}
+        collection = get_summary_partials_collection()
+        if collection is not None:
+            async for partial in collection.find({"group_hash": {"$in": list(pending)}}):
+                summaries[partial["group_hash"]] = partial["summary"]
+                del pending[partial["group_hash"]]
+        SUMMARY_PARTIALS.inc(len(summaries), stage=stage, outcome="stored")
+        print(f"🧩 {stage}: {len(groups)} groups, {len(pending)} to summarize")
+
+        async def summarize(group_hash: str, group: List[str]) -> None:
+            async with semaphore:
+                summary = await self.ai_service.generate_text(
+                    self.ai_service._section_summary_prompt(group, stage)
+                )
+            SUMMARY_PARTIALS.inc(stage=stage, outcome="generated")
+            summaries[group_hash] = summary
+            if collection is not None:
+                await collection.update_one(
+                    {"group_hash": group_hash},
+                    {"$set": {"summary": summary, "created_at": datetime.utcnow()}},
+                    upsert=True
+                )
+
+        await asyncio.gather(*(summarize(h, g) for h, g in pending.items()))
+        return [summaries[group_hash] for group_hash in hashes]
+
+    @staticmethod
+    def _group_hash(group: List[str], stage: str, version: Any) -> str:
+        digest = hashlib.sha256(f"{stage}:{version}".encode("utf-8"))
+        for text in group:
+            digest.update(b"\x00")
+            digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
@@ -0,0 +1,112 @@
+import glob
+import gzip
+import os
+import uuid
+from typing import Iterable, Iterator, Optional
+
+from app.core.config import settings
+
+
+class TextCache:
+    """Compressed on-disk cache of extracted, normalized document text.
+
+    Entries are keyed by the sha256 of the original file and the extractor
+    version, so re-indexing identical bytes skips parsing entirely while a
+    change to an extractor naturally invalidates its old entries.
+
+    The cache holds at most ``max_bytes`` (TEXT_CACHE_MAX_BYTES, 0 for no
+    limit) of compressed text. Reading an entry marks it as used, and the
+    least recently used entries are evicted after each write that goes over
+    the limit. Entries of content no document refers to any more are
+    discarded by IngestionService.
+    """
+
+    # Characters returned per read when streaming a cached entry
+    READ_CHARS = 256 * 1024
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or settings.TEXT_CACHE_DIR
+        self.max_bytes = settings.TEXT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, content_hash: str, extractor_version: str) -> str:
+        # Fan out by hash prefix to keep directories small
+        return os.path.join(
+            self.cache_dir,
+            content_hash[:2],
+            f"{content_hash}-{extractor_version}.txt.gz"
+        )
+
+    def has(self, content_hash: str, extractor_version: str) -> bool:
+        return os.path.exists(self._path(content_hash, extractor_version))
+
+    def iter_text(self, content_hash: str, extractor_version: str) -> Iterator[str]:
+        """Stream a cached entry in blocks of READ_CHARS"""
+        path = self._path(content_hash, extractor_version)
+        # The modification time doubles as the last use, for eviction
+        os.utime(path)
+        with gzip.open(path, "rt", encoding="utf-8") as cached:
+            while True:
+                block = cached.read(self.READ_CHARS)
+                if not block:
+                    break
+                yield block
+
+    def write_through(self, content_hash: str, extractor_version: str,
+                      segments: Iterable[str]) -> Iterator[str]:
+        """Yield ``segments`` unchanged while compressing them into the cache.
+
+        The entry only becomes visible once every segment has been consumed;
+        if extraction fails or the consumer stops early nothing is cached.
+        """
+        final_path = self._path(content_hash, extractor_version)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        temp_path = f"{final_path}.{uuid.uuid4().hex}.tmp"
+
+        try:
+            with gzip.open(temp_path, "wt", encoding="utf-8") as cached:
+                for segment in segments:
+                    cached.write(segment)
+                    yield segment
+            os.replace(temp_path, final_path)
+            print(f"💾 Cached extracted text for {content_hash[:12]} ({extractor_version})")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._evict()
+
+    def discard(self, content_hash: str) -> None:
+        """Remove the entries of every extractor version for these bytes"""
+        for path in glob.glob(os.path.join(self.cache_dir, content_hash[:2], f"{content_hash}-*.txt.gz")):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+        print(f"🗑️ Discarded cached text for {content_hash[:12]}")
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until the cache fits ``max_bytes``"""
+        if not self.max_bytes:
+            return
+
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*", "*.txt.gz")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        if evicted:
+            print(f"🧹 Evicted {evicted} cached texts, {total} bytes left")
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import time
+from typing import Any, Dict, Optional, Sequence
+
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+
+# Leading bytes every file of the given type must start with
+MAGIC_SIGNATURES = {
+    ".pdf": b"%PDF-",
+    ".docx": b"PK\x03\x04",  # DOCX is a ZIP container
+}
+
+# Some PDF writers emit junk before the header; readers accept it within 1KB
+PDF_HEADER_WINDOW = 1024
+
+UTF16_BOMS = (b"\xff\xfe", b"\xfe\xff")
+
+# Multipart framing allowed per file on top of MAX_FILE_SIZE: boundaries,
+# part headers and other form fields
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadRejected(ValueError):
+    """Raised when an upload fails validation while it is being received"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sniff_file_type(head: bytes, file_extension: str) -> bool:
+    """Check the first bytes of an upload against its claimed extension"""
+    if file_extension == ".pdf":
+        return MAGIC_SIGNATURES[".pdf"] in head[:PDF_HEADER_WINDOW]
+
+    if file_extension == ".docx":
+        return head.startswith(MAGIC_SIGNATURES[".docx"])
+
+    if file_extension == ".txt":
+        if head.startswith(UTF16_BOMS):
+            return True
+        # NUL bytes never appear in 8-bit text encodings, only in binaries
+        return b"\x00" not in head
+
+    return False
+
+
+def _size_limit_message(max_size: int) -> str:
+    return f"File exceeds {max_size // (1024 * 1024)}MB limit"
+
+
+async def receive_upload(
+    file,
+    chunk_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Validate a received UploadFile and hand it over without copying it.
+
+    By the time a route runs, the server has already spooled the multipart
+    body (in memory up to 1MB, then to a temporary file); oversized bodies
+    are turned away before that by ``UploadSizeLimit``. Here the spooled
+    file is read once in fixed-size chunks: the sha256 digest is computed,
+    the size limit is enforced per chunk and the magic bytes are checked on
+    the first chunk. The spooled file itself is returned as ``content``
+    (``file_path`` is always None), so it must be ingested before the
+    request ends. ``receive_seconds`` is the time spent reading it.
+    """
+    started = time.perf_counter()
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+    max_size = max_size or settings.MAX_FILE_SIZE
+
+    file_extension = os.path.splitext(file.filename or "")[1].lower()
+
+    if file_extension not in settings.allowed_file_types:
+        raise UploadRejected("Only PDF, DOCX, TXT files are allowed")
+
+    # Reject without reading when the spooled size is already known
+    declared_size = getattr(file, "size", None)
+    if declared_size is not None and declared_size > max_size:
+        raise UploadRejected(_size_limit_message(max_size), status_code=413)
+
+    hasher = hashlib.sha256()
+    file_size = 0
+
+    await file.seek(0)
+    while True:
+        # The spooled file returns full reads, so the first one covers the
+        # whole window the magic bytes are looked for in
+        chunk = await file.read(chunk_size if file_size else max(chunk_size, PDF_HEADER_WINDOW))
+        if not chunk:
+            break
+
+        if file_size == 0 and not sniff_file_type(chunk, file_extension):
+            raise UploadRejected(
+                f"File content does not match the {file_extension} format"
+            )
+
+        file_size += len(chunk)
+        if file_size > max_size:
+            raise UploadRejected(
+                _size_limit_message(max_size),
+                status_code=413
+            )
+
+        hasher.update(chunk)
+
+    if file_size == 0:
+        raise UploadRejected("Uploaded file is empty")
+
+    await file.seek(0)
+
+    return {
+        "content": file.file,
+        "file_path": None,
+        "file_size": file_size,
+        "sha256": hasher.hexdigest(),
+        "file_extension": file_extension,
+        "receive_seconds": time.perf_counter() - started,
+    }
+
+
+class UploadSizeLimit:
+    """ASGI middleware turning away oversized multipart uploads before their body is read.
+
+    Requests declaring a Content-Length above the limit get a 413 at once,
+    instead of after the whole body has been received and spooled. Paths in
+    ``batch_paths`` may carry BATCH_UPLOAD_MAX_FILES files. Bodies without a
+    Content-Length are still checked per file by ``receive_upload``.
+    """
+
+    def __init__(self, app, batch_paths: Sequence[str] = ()):
+        self.app = app
+        self.batch_paths = set(batch_paths)
+
+    def body_limit(self, path: str) -> int:
+        files = settings.BATCH_UPLOAD_MAX_FILES if path in self.batch_paths else 1
+        return files * (settings.MAX_FILE_SIZE + MULTIPART_OVERHEAD)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] in ("POST", "PUT"):
+            headers = dict(scope["headers"])
+            if headers.get(b"content-type", b"").lower().startswith(b"multipart/form-data"):
+                try:
+                    declared = int(headers.get(b"content-length", b""))
+                except ValueError:
+                    declared = None
+
+                if declared is not None and declared > self.body_limit(scope["path"]):
+                    print(f"⛔ Rejected {declared} byte upload to {scope['path']} before reading it")
+                    response = JSONResponse(
+                        {"detail": _size_limit_message(settings.MAX_FILE_SIZE)},
+                        status_code=413,
+                        headers={"Connection": "close"}
+                    )
+                    await response(scope, receive, send)
+                    return
+
+        await self.app(scope, receive, send)
+
+
+def upload_source(received: Dict[str, Any]):
+    """Return what DocumentProcessor should read for a received upload"""
+    if received.get("content") is not None:
+        return received["content"]
+    return received["file_path"]
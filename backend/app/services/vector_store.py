@@ -1,8 +1,10 @@
 import chromadb
 from chromadb.config import Settings as ChromaSettings
+from contextlib import nullcontext
 from typing import List, Dict, Any, Optional
 import os
 from app.core.config import settings
+from app.services.metrics import IngestStats
 
 # Prevent transformers from importing TensorFlow / Keras (avoids tf-keras errors)
 os.environ.setdefault("TRANSFORMERS_NO_TF", "1")
@@ -135,8 +137,28 @@ class VectorStore:
         self._tfidf_vectorizer = None
         print("🔄 Reset TF-IDF vectorizer")
 
-    def add_documents(self, chunks: List[Dict[str, Any]]) -> bool:
-        """Add document chunks to vector store with batch processing"""
+    @staticmethod
+    def _chunk_metadata(chunk: Dict[str, Any]) -> Dict[str, Any]:
+        # Only include basic metadata to avoid ChromaDB issues
+        metadata = {
+            "document_id": chunk["document_id"],
+            "chunk_index": chunk["chunk_index"],
+            "filename": chunk["filename"]
+        }
+        # Add user_id, chunk_hash and location if present
+        if "user_id" in chunk and chunk["user_id"]:
+            metadata["user_id"] = chunk["user_id"]
+        for key in ("chunk_hash", "page", "start_offset", "end_offset", "storage"):
+            if chunk.get(key) is not None:
+                metadata[key] = chunk[key]
+        return metadata
+
+    def add_documents(self, chunks: List[Dict[str, Any]], stats: Optional[IngestStats] = None) -> bool:
+        """Add document chunks to vector store with batch processing.
+
+        Embedding and indexing time is added to ``stats`` when given.
+        """
+        timed = stats.stage if stats is not None else (lambda stage: nullcontext())
         print(f"Adding {len(chunks)} chunks to vector store")
         
         def _add():
@@ -148,16 +170,7 @@ class VectorStore:
             for chunk in chunks:
                 ids.append(chunk["id"])
                 texts.append(chunk["text"])
-                # Only include basic metadata to avoid ChromaDB issues
-                metadata = {
-                    "document_id": chunk["document_id"],
-                    "chunk_index": chunk["chunk_index"],
-                    "filename": chunk["filename"]
-                }
-                # Add user_id if present
-                if "user_id" in chunk and chunk["user_id"]:
-                    metadata["user_id"] = chunk["user_id"]
-                metadatas.append(metadata)
+                metadatas.append(self._chunk_metadata(chunk))
             
             # Process in batches to avoid memory issues and timeouts
             batch_size = 50  # Process 50 chunks at a time
@@ -176,17 +189,19 @@ class VectorStore:
                 print(f"Batch {batch_num}/{total_batches}: Generating embeddings for {len(batch_texts)} texts")
                 
                 # Generate embeddings for this batch
-                batch_embeddings = self._generate_embeddings(batch_texts)
+                with timed("embed"):
+                    batch_embeddings = self._generate_embeddings(batch_texts)
                 print(f"Batch {batch_num}/{total_batches}: Generated {len(batch_embeddings)} embeddings")
                 
                 # Add batch to ChromaDB
                 print(f"Batch {batch_num}/{total_batches}: Adding to ChromaDB collection")
-                self.collection.add(
-                    ids=batch_ids,
-                    embeddings=batch_embeddings,
-                    documents=batch_texts,
-                    metadatas=batch_metadatas
-                )
+                with timed("index"):
+                    self.collection.add(
+                        ids=batch_ids,
+                        embeddings=batch_embeddings,
+                        documents=batch_texts,
+                        metadatas=batch_metadatas
+                    )
                 print(f"Batch {batch_num}/{total_batches}: Successfully added to ChromaDB")
             
             print(f"All {len(texts)} chunks successfully added to vector store")
@@ -209,22 +224,42 @@ class VectorStore:
                     print(f"Retry after reset failed: {str(e2)}")
             return False
     
-    def search_similar(self, query: str, n_results: int = 5, document_id: Optional[str] = None, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _build_where(document_id: Optional[str] = None, user_id: Optional[str] = None,
+                     document_ids: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Build a ChromaDB where clause from the access filters.
+
+        ``document_ids`` (the documents a user owns) takes precedence over
+        ``user_id``: deduplicated chunk sets are shared between owners but only
+        carry the first uploader's user_id in their metadata.
+        """
+        conditions = []
+        if document_id:
+            conditions.append({"document_id": document_id})
+        if document_ids is not None:
+            conditions.append({"document_id": {"$in": list(document_ids)}})
+        elif user_id:
+            conditions.append({"user_id": user_id})
+
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+
+    def embed_query(self, query: str) -> List[float]:
+        """Embedding of a query, as used for similarity search"""
+        return self._generate_embeddings([query])[0]
+
+    def search_similar(self, query: str, n_results: int = 5, document_id: Optional[str] = None, user_id: Optional[str] = None,
+                       document_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """Search for similar chunks based on query with user access control"""
         try:
             # Generate query embedding
             query_embedding = self._generate_embeddings([query])[0]
 
-            # Build where clause for filtering
-            where_clause = {}
-
-            # Filter by document_id if specified
-            if document_id:
-                where_clause["document_id"] = document_id
-
-            # Filter by user_id if specified (for privacy control)
-            if user_id:
-                where_clause["user_id"] = user_id
+            # Build where clause for filtering (document, then owner or owned documents)
+            where_clause = self._build_where(document_id, user_id, document_ids)
 
             # For guest users (user_id is None), only search documents that are marked as public
             if user_id is None:
@@ -247,13 +282,14 @@ class VectorStore:
                 for i, doc in enumerate(results["documents"][0]):
                     metadata = results["metadatas"][0][i]
                     formatted_results.append({
+                        "id": results["ids"][0][i],
                         "text": doc,
                         "metadata": metadata,
                         "distance": results["distances"][0][i]
                     })
 
             # If no results found, try a more general search without user_id filter (for fallback)
-            if not formatted_results and user_id:
+            if not formatted_results and (user_id or document_ids is not None):
                 print("⚠️ No results found with user filter, trying broader search...")
                 try:
                     # Try searching without user_id filter (for public documents or admin access)
@@ -266,6 +302,7 @@ class VectorStore:
                     if general_results["documents"] and general_results["documents"][0]:
                         for i, doc in enumerate(general_results["documents"][0]):
                             formatted_results.append({
+                                "id": general_results["ids"][0][i],
                                 "text": doc,
                                 "metadata": general_results["metadatas"][0][i],
                                 "distance": general_results["distances"][0][i]
@@ -282,6 +319,7 @@ class VectorStore:
                     all_docs = self.collection.get(include=["documents", "metadatas"], limit=1)
                     if all_docs["documents"] and all_docs["documents"][0]:
                         formatted_results.append({
+                            "id": all_docs["ids"][0],
                             "text": all_docs["documents"][0],
                             "metadata": all_docs["metadatas"][0],
                             "distance": 0.5  # Medium similarity as fallback
@@ -291,7 +329,7 @@ class VectorStore:
                     print(f"⚠️ Fallback document retrieval failed: {str(e)}")
 
             print(f"🔍 Final formatted results: {len(formatted_results)}")
-            return formatted_results
+            return self.materialize_windows(formatted_results)
 
         except Exception as e:
             msg = str(e).lower()
@@ -304,12 +342,7 @@ class VectorStore:
                     self._reset_collection()
                     # Retry the search after reset
                     query_embedding = self._generate_embeddings([query])[0]
-                    where_clause = {}
-
-                    if document_id:
-                        where_clause["document_id"] = document_id
-                    if user_id:
-                        where_clause["user_id"] = user_id
+                    where_clause = self._build_where(document_id, user_id, document_ids)
 
                     results = self.collection.query(
                         query_embeddings=[query_embedding],
@@ -338,11 +371,131 @@ class VectorStore:
                         })
 
                     print(f"🔍 Formatted {len(formatted_results)} results from retry search")
-                    return formatted_results
+                    return self.materialize_windows(formatted_results)
                 except Exception as e2:
                     print(f"Retry after reset failed: {str(e2)}")
             return []
 
+    def materialize_windows(self, results: List[Dict[str, Any]], overlap: int = 200) -> List[Dict[str, Any]]:
+        """Rebuild overlapping context for results stored as segments.
+
+        Segments do not overlap, so each one gets up to ``overlap / 2``
+        characters from the end of the previous segment and the start of the
+        next, fetched in a single query. The stored segment stays in
+        ``segment_text``; results stored as windows are returned unchanged.
+        """
+        segments = [
+            r for r in results
+            if (r.get("metadata") or {}).get("storage") == "segment"
+        ]
+        if not segments:
+            return results
+
+        refs = []
+        for r in segments:
+            metadata = r["metadata"]
+            for index in (metadata["chunk_index"] - 1, metadata["chunk_index"] + 1):
+                if index >= 0:
+                    refs.append({"document_id": metadata["document_id"], "chunk_index": index})
+
+        try:
+            neighbours = {
+                (n["metadata"]["document_id"], n["metadata"]["chunk_index"]): n
+                for n in self.get_chunks(refs)
+            }
+        except Exception as e:
+            print(f"⚠️ Could not fetch neighbouring segments: {str(e)}")
+            return results
+
+        half = overlap // 2
+        for r in segments:
+            metadata = r["metadata"]
+            key = (metadata["document_id"], metadata["chunk_index"])
+            previous = neighbours.get((key[0], key[1] - 1))
+            following = neighbours.get((key[0], key[1] + 1))
+
+            text = r["text"]
+            if previous is not None:
+                text = self._join_segments(previous["metadata"], self._tail(previous["text"], half), metadata, text)
+            if following is not None:
+                text = self._join_segments(metadata, text, following["metadata"], self._head(following["text"], half))
+            r["segment_text"] = r["text"]
+            r["text"] = text
+        return results
+
+    @staticmethod
+    def _join_segments(left: Dict[str, Any], left_text: str, right: Dict[str, Any], right_text: str) -> str:
+        """Join text from adjacent segments, restoring the whitespace the split removed"""
+        touching = (
+            left.get("end_offset") is not None
+            and left.get("end_offset") == right.get("start_offset")
+        )
+        return left_text + ("" if touching else "\n") + right_text
+
+    @staticmethod
+    def _tail(text: str, size: int) -> str:
+        """Last ``size`` characters of ``text``, starting at a word boundary when possible"""
+        if len(text) <= size:
+            return text
+        tail = text[-size:]
+        space = tail.find(" ")
+        return tail[space + 1:] if 0 <= space < size // 2 else tail
+
+    @staticmethod
+    def _head(text: str, size: int) -> str:
+        """First ``size`` characters of ``text``, ending at a word boundary when possible"""
+        if len(text) <= size:
+            return text
+        head = text[:size]
+        space = head.rfind(" ")
+        return head[:space] if space > size // 2 else head
+
+    def has_document(self, document_id: str) -> bool:
+        """Check whether any chunk of a document is indexed"""
+        try:
+            results = self.collection.get(
+                where={"document_id": document_id},
+                limit=1,
+                include=[]
+            )
+            return bool(results.get("ids"))
+        except Exception as e:
+            print(f"Error checking document in vector store: {str(e)}")
+            return False
+
+    def get_chunk_hashes(self, document_id: str) -> Dict[str, List[str]]:
+        """Map each chunk hash of a document to the ids of chunks with that content"""
+        from app.services.document_processor import chunk_hash
+
+        results = self.collection.get(
+            where={"document_id": document_id},
+            include=["metadatas", "documents"]
+        )
+
+        hashes: Dict[str, List[str]] = {}
+        for i, chunk_id in enumerate(results.get("ids", [])):
+            metadata = results["metadatas"][i] or {}
+            # Chunks indexed before chunk hashes existed are hashed from their text
+            content_hash = metadata.get("chunk_hash") or chunk_hash(results["documents"][i])
+            hashes.setdefault(content_hash, []).append(chunk_id)
+        return hashes
+
+    def update_chunk_metadata(self, chunks: List[Dict[str, Any]]) -> None:
+        """Rewrite the metadata of already indexed chunks without re-embedding them"""
+        batch_size = 500
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            self.collection.update(
+                ids=[chunk["id"] for chunk in batch],
+                metadatas=[self._chunk_metadata(chunk) for chunk in batch]
+            )
+
+    def delete_chunks(self, ids: List[str]) -> None:
+        """Delete individual chunks by id"""
+        batch_size = 500
+        for start in range(0, len(ids), batch_size):
+            self.collection.delete(ids=ids[start:start + batch_size])
+
     def delete_document(self, document_id: str) -> bool:
         """Delete all chunks for a specific document"""
         try:
@@ -419,6 +572,26 @@ class VectorStore:
             print(f"Error getting collection stats: {str(e)}")
             return {"total_chunks": 0, "collection_name": "unknown"} 
 
+    def get_chunks(self, refs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fetch chunks by (document_id, chunk_index) in a single query"""
+        by_document: Dict[str, List[int]] = {}
+        for ref in refs:
+            by_document.setdefault(ref["document_id"], []).append(int(ref["chunk_index"]))
+        if not by_document:
+            return []
+
+        conditions = [
+            {"$and": [{"document_id": document_id}, {"chunk_index": {"$in": indexes}}]}
+            for document_id, indexes in by_document.items()
+        ]
+        where = conditions[0] if len(conditions) == 1 else {"$or": conditions}
+
+        results = self.collection.get(where=where, include=["documents", "metadatas"])
+        return [
+            {"id": chunk_id, "text": results["documents"][i], "metadata": results["metadatas"][i]}
+            for i, chunk_id in enumerate(results.get("ids", []))
+        ]
+
     def get_document_chunks(self, document_id: str) -> List[Dict[str, Any]]:
         """Get all chunks for a specific document"""
         try:
@@ -432,6 +605,7 @@ class VectorStore:
             if results["documents"]:
                 for i, doc in enumerate(results["documents"]):
                     formatted_chunks.append({
+                        "id": results["ids"][i],
                         "text": doc,
                         "metadata": results["metadatas"][i],
                         "distance": 0.0  # Not a similarity search, so distance is 0
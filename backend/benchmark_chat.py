@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark the chat answer path against the local stub LLM provider.
+
+Runs AIService.generate_answer (or stream_answer with --stream) for many
+questions at a fixed concurrency, with the stub provider standing in for
+Gemini, so context packing, in-flight limits and request coalescing are
+measured without network access. Questions cycle through --distinct
+variants, so repeated questions show how many calls coalescing saves.
+--error-rate injects retryable failures, and --hedge sends duplicate
+requests after the p95 latency, to measure the resilience layer.
+
+Usage:
+    python benchmark_chat.py --requests 500 --concurrency 64 --latency-ms 800 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.llm_providers import STUB_LATENCY_DISTRIBUTIONS, STUB_MODES
+
+CALL_OUTCOMES = ("success", "retried", "timeout", "failure", "rejected")
+
+VOCABULARY = (
+    "analysis document revenue quarterly policy section report growth model data "
+    "customer system process review design market strategy risk compliance value"
+).split()
+
+
+def build_chunks(count, words, seed):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"bench_chunk_{i}",
+            "text": " ".join(rng.choice(VOCABULARY) for _ in range(words)),
+            "metadata": {"document_id": "bench", "chunk_index": i, "filename": "bench.txt"},
+            "distance": i / count,
+        }
+        for i in range(count)
+    ]
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return round(ordered[index], 4)
+
+
+def _summary(values):
+    return {
+        "p50": _percentile(values, 50),
+        "p95": _percentile(values, 95),
+        "p99": _percentile(values, 99),
+        "mean": round(statistics.mean(values), 4) if values else None,
+    }
+
+
+async def run(args):
+    from app.services.ai_service import AIService
+    from app.services.llm_providers import StubProvider
+    from app.services.llm_resilience import LLMUnavailable
+    from app.services.metrics import LLM_CALLS, LLM_COALESCED_CALLS, LLM_HEDGES
+    from app.core.config import settings
+
+    settings.LLM_HEDGE_ENABLED = args.hedge
+
+    provider = StubProvider(
+        mode=args.mode,
+        latency_ms=args.latency_ms,
+        distribution=args.distribution,
+        spread=args.spread,
+        seed=args.seed,
+        error_rate=args.error_rate,
+    )
+    service = AIService(provider=provider)
+    chunks = build_chunks(args.chunks, args.chunk_words, args.seed)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, first_tokens, prompt_tokens = [], [], []
+    coalesced_before = LLM_COALESCED_CALLS.value()
+    calls_before = {outcome: LLM_CALLS.value(provider="stub", outcome=outcome) for outcome in CALL_OUTCOMES}
+    hedges_before = {outcome: LLM_HEDGES.value(provider="stub", outcome=outcome) for outcome in ("sent", "won")}
+    failed = 0
+
+    async def one(i):
+        nonlocal failed
+        question = f"What does the report say about topic {i % args.distinct}?"
+        async with semaphore:
+            started = time.perf_counter()
+            if args.stream:
+                first_token = None
+                async for event in service.stream_answer(question, chunks):
+                    if event["event"] == "token" and first_token is None:
+                        first_token = time.perf_counter() - started
+                        first_tokens.append(first_token)
+                    if event["event"] == "done":
+                        prompt_tokens.append(event["data"]["prompt_tokens"])
+                    if event["event"] == "error":
+                        failed += 1
+                        return
+            else:
+                try:
+                    answer = await service.generate_answer(question, chunks)
+                except LLMUnavailable:
+                    failed += 1
+                    return
+                prompt_tokens.append(answer["prompt_tokens"])
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": args.requests,
+        "seconds": round(elapsed, 3),
+        "requests_per_s": round(args.requests / elapsed, 2),
+        "latency_seconds": _summary(latencies),
+        "first_token_seconds": _summary(first_tokens) if args.stream else None,
+        "prompt_tokens": _summary(prompt_tokens),
+        "coalesced_calls": int(LLM_COALESCED_CALLS.value() - coalesced_before),
+        "failed": failed,
+        "llm_calls": {
+            outcome: int(LLM_CALLS.value(provider="stub", outcome=outcome) - calls_before[outcome])
+            for outcome in CALL_OUTCOMES
+        },
+        "hedges": {
+            outcome: int(LLM_HEDGES.value(provider="stub", outcome=outcome) - hedges_before[outcome])
+            for outcome in ("sent", "won")
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--distinct", type=int, default=10**9, help="distinct questions to cycle through")
+    parser.add_argument("--stream", action="store_true", help="benchmark streamed answers")
+    parser.add_argument("--chunks", type=int, default=10, help="retrieved chunks per question")
+    parser.add_argument("--chunk-words", type=int, default=180)
+    parser.add_argument("--mode", choices=STUB_MODES, default="echo")
+    parser.add_argument("--distribution", choices=STUB_LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--spread", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub calls that fail")
+    parser.add_argument("--hedge", action="store_true", help="send hedged requests after the p95 latency")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    report = {"args": vars(args), "result": result}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    latency = result["latency_seconds"]
+    print(f"💬 {result['requests']} {'streamed ' if args.stream else ''}answers at concurrency "
+          f"{args.concurrency}, stub {args.distribution} ~{args.latency_ms}ms")
+    print(f"  {result['seconds']:.3f}s  {result['requests_per_s']:.2f} req/s  "
+          f"latency p50 {latency['p50']}s p95 {latency['p95']}s p99 {latency['p99']}s")
+    if args.stream:
+        first = result["first_token_seconds"]
+        print(f"  first token p50 {first['p50']}s p95 {first['p95']}s")
+    print(f"  prompt tokens p50 {result['prompt_tokens']['p50']}, "
+          f"{result['coalesced_calls']} calls saved by coalescing")
+    calls = result["llm_calls"]
+    print(f"  {result['failed']} failed; LLM calls: " + ", ".join(f"{calls[o]} {o}" for o in CALL_OUTCOMES)
+          + f"; {result['hedges']['sent']} hedges sent, {result['hedges']['won']} won")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark DOCX text extraction: streaming iterparse vs the python-docx object model.
+
+Each extractor runs in a fresh process so peak RSS is measured in isolation.
+
+Usage:
+    python benchmark_docx.py --paragraphs 20000 --tables 200 --rows 20
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_fixture(path, paragraphs, tables, rows, cols):
+    """Write a deterministic DOCX with interleaved paragraphs and tables"""
+    from docx import Document
+
+    doc = Document()
+    tables_every = max(paragraphs // tables, 1) if tables else 0
+    table_count = 0
+
+    for i in range(paragraphs):
+        doc.add_paragraph(
+            f"Paragraph {i}: the quick brown fox jumps over the lazy dog while "
+            f"section {i % 97} discusses topic {i % 13} in some detail."
+        )
+        if tables_every and i % tables_every == 0 and table_count < tables:
+            table = doc.add_table(rows=rows, cols=cols)
+            for r in range(rows):
+                for c in range(cols):
+                    table.cell(r, c).text = f"T{table_count}R{r}C{c} value {(r * cols + c) * 7}"
+            table_count += 1
+
+    doc.save(path)
+
+
+def _max_rss_bytes():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _run_extractor(extractor, path, queue):
+    from app.services.document_processor import DocumentProcessor
+
+    processor = DocumentProcessor(docx_extractor=extractor)
+    baseline = _max_rss_bytes()
+    start = time.perf_counter()
+
+    chars = 0
+    blocks = 0
+    for block in processor._iter_docx_text(path):
+        chars += len(block)
+        blocks += 1
+
+    elapsed = time.perf_counter() - start
+    queue.put({
+        "extractor": extractor,
+        "seconds": round(elapsed, 4),
+        "peak_rss_delta_mb": round((_max_rss_bytes() - baseline) / (1024 * 1024), 2),
+        "blocks": blocks,
+        "chars": chars,
+    })
+
+
+def run_isolated(extractor, path):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run_extractor, args=(extractor, path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=20000)
+    parser.add_argument("--tables", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=20)
+    parser.add_argument("--cols", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fixture.docx")
+        build_fixture(path, args.paragraphs, args.tables, args.rows, args.cols)
+        file_size = os.path.getsize(path)
+
+        results = [run_isolated(extractor, path) for extractor in ("iterparse", "python-docx")]
+
+    report = {"file_size": file_size, "args": vars(args), "results": results}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"📄 Fixture: {file_size / (1024 * 1024):.2f}MB DOCX "
+          f"({args.paragraphs} paragraphs, {args.tables} tables of {args.rows}x{args.cols})")
+    for r in results:
+        print(f"  {r['extractor']:<12} {r['seconds']:>8.3f}s  "
+              f"peak RSS +{r['peak_rss_delta_mb']:>7.2f}MB  "
+              f"{r['blocks']} blocks, {r['chars']} chars")
+
+
+if __name__ == "__main__":
+    main()
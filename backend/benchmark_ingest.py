@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Benchmark the ingestion pipeline over generated PDF, DOCX and TXT fixtures.
+
+Fixtures are deterministic for a given size and seed. Every combination of
+format, extractor, embedder and chunk storage mode runs the same windowed
+path as uploads (DocumentProcessor.iter_chunk_windows +
+VectorStore.add_documents) in a fresh process, so peak RSS is measured in
+isolation. The "none" embedder stops after splitting, to separate parsing
+cost from embedding and indexing. When both storage modes run, the stored
+characters and embedding time saved by "segments" over "windows" are
+reported per case.
+
+Usage:
+    python benchmark_ingest.py --pages 200 --words 200000 --tables 50 --json
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+FORMATS = ("pdf", "docx", "txt")
+EMBEDDERS = ("tfidf", "none")
+STORAGE_MODES = ("windows", "segments")
+DOCX_EXTRACTORS = ("iterparse", "python-docx")
+
+VOCABULARY = (
+    "analysis document revenue quarterly policy section report growth model data "
+    "customer system process review design market strategy risk compliance value "
+    "network service product research student lecture chapter theory method result "
+    "table figure summary overview appendix budget forecast audit contract clause"
+).split()
+
+WORDS_PER_LINE = 12
+LINES_PER_PAGE = 45
+WORDS_PER_PARAGRAPH = 60
+
+# Fixed timestamp so generated DOCX files are byte-for-byte reproducible
+ZIP_DATE_TIME = (2024, 1, 1, 0, 0, 0)
+
+
+def _words(rng, count):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(count))
+
+
+# =========================
+# FIXTURES
+# =========================
+
+def build_txt(path, words, seed):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as out:
+        written = 0
+        paragraph = 0
+        while written < words:
+            count = min(WORDS_PER_PARAGRAPH, words - written)
+            out.write(f"Paragraph {paragraph}. {_words(rng, count)}.\n\n")
+            written += count
+            paragraph += 1
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_pdf(path, pages, seed):
+    """Write a text-searchable PDF with one Helvetica content stream per page"""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_numbers = []
+
+    for page in range(pages):
+        lines = [f"Page {page + 1}"] + [_words(rng, WORDS_PER_LINE) for _ in range(LINES_PER_PAGE)]
+        stream = ["BT", "/F1 10 Tf", "12 TL", "50 770 Td"]
+        for line in lines:
+            stream.append(f"({_pdf_escape(line)}) Tj T*")
+        stream.append("ET")
+        content = "\n".join(stream).encode("latin-1")
+
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        content_number = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_number
+        )
+        page_numbers.append(len(objects))
+
+    kids = " ".join(f"{number} 0 R" for number in page_numbers).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_numbers))
+
+    with open(path, "wb") as out:
+        out.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(out.tell())
+            out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = out.tell()
+        out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            out.write(b"%010d 00000 n \n" % offset)
+        out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+
+DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+
+def _docx_paragraph(text):
+    return f"<w:p><w:r><w:t xml:space=\"preserve\">{text}</w:t></w:r></w:p>"
+
+
+def build_docx(path, words, tables, rows, cols, seed):
+    """Write a DOCX package by hand, with tables spread between paragraphs"""
+    rng = random.Random(seed)
+    paragraphs = max((words + WORDS_PER_PARAGRAPH - 1) // WORDS_PER_PARAGRAPH, 1)
+    tables_every = max(paragraphs // tables, 1) if tables else 0
+    table_count = 0
+
+    body = []
+    for i in range(paragraphs):
+        body.append(_docx_paragraph(f"Paragraph {i}. {_words(rng, WORDS_PER_PARAGRAPH)}."))
+        if tables_every and i % tables_every == 0 and table_count < tables:
+            table_rows = []
+            for r in range(rows):
+                cells = "".join(
+                    f"<w:tc>{_docx_paragraph(f'T{table_count}R{r}C{c} {_words(rng, 3)}')}</w:tc>"
+                    for c in range(cols)
+                )
+                table_rows.append(f"<w:tr>{cells}</w:tr>")
+            body.append(f"<w:tbl>{''.join(table_rows)}</w:tbl>")
+            table_count += 1
+
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{''.join(body)}</w:body></w:document>"
+    )
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as package:
+        for name, data in (
+            ("[Content_Types].xml", DOCX_CONTENT_TYPES),
+            ("_rels/.rels", DOCX_RELS),
+            ("word/document.xml", document),
+        ):
+            package.writestr(zipfile.ZipInfo(name, ZIP_DATE_TIME), data, zipfile.ZIP_DEFLATED)
+
+
+def build_fixtures(directory, args):
+    fixtures = {}
+    if "pdf" in args.formats:
+        fixtures["pdf"] = os.path.join(directory, "fixture.pdf")
+        build_pdf(fixtures["pdf"], args.pages, args.seed)
+    if "docx" in args.formats:
+        fixtures["docx"] = os.path.join(directory, "fixture.docx")
+        build_docx(fixtures["docx"], args.words, args.tables, args.rows, args.cols, args.seed)
+    if "txt" in args.formats:
+        fixtures["txt"] = os.path.join(directory, "fixture.txt")
+        build_txt(fixtures["txt"], args.words, args.seed)
+    return fixtures
+
+
+# =========================
+# BENCHMARK
+# =========================
+
+def _max_rss_bytes():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _run_case(case, queue):
+    from app.core.config import settings
+    from app.services.document_processor import DocumentProcessor
+    from app.services.metrics import IngestStats
+
+    path = case["path"]
+    file_size = os.path.getsize(path)
+
+    # The services log every window and batch; keep the report readable
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        vector_store = None
+        if case["embedder"] == "tfidf":
+            from app.services.vector_store import VectorStore
+            vector_store = VectorStore()
+
+        processor = DocumentProcessor(
+            docx_extractor=case["extractor"] or "iterparse",
+            storage_mode=case["storage"]
+        )
+        stats = IngestStats(os.path.splitext(path)[1])
+        baseline = _max_rss_bytes()
+        start = time.perf_counter()
+
+        chunks = 0
+        for window in processor.iter_chunk_windows(
+            path,
+            os.path.basename(path),
+            "benchmark",
+            window_size=settings.INGEST_WINDOW_CHUNKS,
+            stats=stats
+        ):
+            chunks += len(window)
+            if vector_store is not None and not vector_store.add_documents(window, stats):
+                raise RuntimeError("Failed to index benchmark chunks")
+
+        elapsed = time.perf_counter() - start
+
+    queue.put({
+        "format": case["format"],
+        "extractor": case["extractor"] or "default",
+        "embedder": case["embedder"],
+        "storage": case["storage"],
+        "file_size": file_size,
+        "seconds": round(elapsed, 4),
+        "mb_per_s": round(file_size / (1024 * 1024) / elapsed, 3) if elapsed else None,
+        "chunks": chunks,
+        "chunks_per_s": round(chunks / elapsed, 1) if elapsed else None,
+        "peak_rss_delta_mb": round((_max_rss_bytes() - baseline) / (1024 * 1024), 2),
+        "stages": stats.as_dict()["stages"],
+        "counts": {key: value for key, value in stats.counts.items()},
+    })
+
+
+def run_isolated(case):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run_case, args=(case, queue))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        return {**{k: v for k, v in case.items() if k != "path"}, "error": f"exit code {process.exitcode}"}
+    return queue.get()
+
+
+def build_cases(fixtures, embedders, storage_modes):
+    cases = []
+    for file_format, path in fixtures.items():
+        extractors = DOCX_EXTRACTORS if file_format == "docx" else (None,)
+        for extractor in extractors:
+            for embedder in embedders:
+                for storage in storage_modes:
+                    cases.append({
+                        "format": file_format,
+                        "extractor": extractor,
+                        "embedder": embedder,
+                        "storage": storage,
+                        "path": path,
+                    })
+    return cases
+
+
+def _percent_saved(before, after):
+    return round(100.0 * (before - after) / before, 1) if before else None
+
+
+def storage_savings(results):
+    """Compare each "segments" result with the matching "windows" one"""
+    windows = {
+        (r["format"], r["extractor"], r["embedder"]): r
+        for r in results
+        if r.get("storage") == "windows" and "error" not in r
+    }
+    savings = []
+    for r in results:
+        if r.get("storage") != "segments" or "error" in r:
+            continue
+        base = windows.get((r["format"], r["extractor"], r["embedder"]))
+        if base is None:
+            continue
+        stored_before = base["counts"].get("stored_chars", 0)
+        stored_after = r["counts"].get("stored_chars", 0)
+        embed_before = base["stages"].get("embed", 0.0)
+        embed_after = r["stages"].get("embed", 0.0)
+        savings.append({
+            "format": r["format"],
+            "extractor": r["extractor"],
+            "embedder": r["embedder"],
+            "stored_chars": {"windows": stored_before, "segments": stored_after},
+            "stored_chars_saved_pct": _percent_saved(stored_before, stored_after),
+            "chunks": {"windows": base["chunks"], "segments": r["chunks"]},
+            "embed_seconds": {"windows": embed_before, "segments": embed_after},
+            "embed_seconds_saved_pct": _percent_saved(embed_before, embed_after),
+        })
+    return savings
+
+
+def _csv(choices):
+    def parse(value):
+        items = [item.strip() for item in value.split(",") if item.strip()]
+        unknown = set(items) - set(choices)
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown value(s): {', '.join(sorted(unknown))}")
+        return items
+    return parse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", type=_csv(FORMATS), default=list(FORMATS))
+    parser.add_argument("--embedders", type=_csv(EMBEDDERS), default=list(EMBEDDERS))
+    parser.add_argument("--storage", type=_csv(STORAGE_MODES), default=list(STORAGE_MODES),
+                        help="chunk storage modes")
+    parser.add_argument("--pages", type=int, default=200, help="PDF pages")
+    parser.add_argument("--words", type=int, default=200000, help="words in the DOCX and TXT fixtures")
+    parser.add_argument("--tables", type=int, default=50, help="DOCX tables")
+    parser.add_argument("--rows", type=int, default=10)
+    parser.add_argument("--cols", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures = build_fixtures(tmp, args)
+        results = [run_isolated(case) for case in build_cases(fixtures, args.embedders, args.storage)]
+
+    savings = storage_savings(results)
+    report = {"args": vars(args), "results": results, "storage_savings": savings}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"📄 Fixtures: {args.pages} PDF pages, {args.words} words, "
+          f"{args.tables} DOCX tables of {args.rows}x{args.cols}")
+    for r in results:
+        label = f"{r['format']}/{r['extractor']}/{r['embedder']}/{r['storage']}"
+        if "error" in r:
+            print(f"  {label:<33} failed: {r['error']}")
+            continue
+        stages = ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in r["stages"].items())
+        print(f"  {label:<33} {r['seconds']:>8.3f}s  {r['mb_per_s']:>7.2f}MB/s  "
+              f"{r['chunks_per_s']:>8.1f} chunks/s  peak RSS +{r['peak_rss_delta_mb']:.2f}MB  [{stages}]")
+
+    if savings:
+        print("💾 Segments vs windows:")
+    for saving in savings:
+        label = f"{saving['format']}/{saving['extractor']}/{saving['embedder']}"
+        line = (f"  {label:<24} stored chars -{saving['stored_chars_saved_pct']}% "
+                f"({saving['stored_chars']['windows']} -> {saving['stored_chars']['segments']})")
+        if saving["embedder"] != "none":
+            line += (f", embed time -{saving['embed_seconds_saved_pct']}% "
+                     f"({saving['embed_seconds']['windows']:.3f}s -> {saving['embed_seconds']['segments']:.3f}s)")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,12 @@
 from datetime import datetime
 from contextlib import asynccontextmanager
+import asyncio
 import time
 
 import fastapi
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from app.api.routes import (
     upload,
@@ -22,6 +23,11 @@ from app.services.database import (
     close_mongo_connection
 )
 
+from app.services.metrics import REGISTRY
+
+from app.services.upload_receiver import UploadSizeLimit
+from app.core.config import settings
+
 
 # Custom JSON encoder
 original_jsonable_encoder = fastapi.encoders.jsonable_encoder
@@ -58,9 +64,14 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️ Startup warning: {e}")
 
+    upload_cleanup = asyncio.create_task(upload.resumable_uploads.remove_expired_periodically(
+        settings.RESUMABLE_UPLOAD_CLEANUP_MINUTES * 60
+    ))
+
     yield
 
     # Shutdown
+    upload_cleanup.cancel()
     await close_mongo_connection()
 
 
@@ -91,6 +102,15 @@ async def log_requests(request: Request, call_next):
     return response
 
 
+# Oversized uploads get a 413 before their
+# body is received (added before CORS, so
+# the rejection still carries CORS headers)
+app.add_middleware(
+    UploadSizeLimit,
+    batch_paths=["/api/upload/batch"]
+)
+
+
 # CORS
 allowed_origins = [
     "http://localhost:3000",
@@ -167,4 +187,13 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "SmartDocQ API"
-    }
\ No newline at end of file
+    }
+
+
+# Prometheus metrics (ingestion stage timings, counts)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(
+        REGISTRY.render(),
+        media_type="text/plain; version=0.0.4"
+    )
\ No newline at end of file
@@ -2,9 +2,35 @@ import React, { useState } from 'react';
 import { ThumbsUp, ThumbsDown, Copy, ChevronDown, ChevronUp, FileText } from 'lucide-react';
 import { Card, Button, Collapse, Badge, Alert } from 'react-bootstrap';
 import { formatTimeOnly } from '../utils/timestamp';
+import { chatService } from '../services/api';
 
 const ChatMessage = ({ message, onFeedback, onCopy }) => {
   const [showSources, setShowSources] = useState(false);
+  const [sourceChunks, setSourceChunks] = useState({});
+
+  const sourceKey = (source) => `${source.document_id}:${source.chunk_index}`;
+
+  // Sources are stored as references; fetch their text the first time they are shown
+  const toggleSources = async () => {
+    const opening = !showSources;
+    setShowSources(opening);
+    if (!opening) return;
+
+    const missing = message.sources.filter(
+      (source) => source.text === undefined && !(sourceKey(source) in sourceChunks)
+    );
+    if (missing.length === 0) return;
+
+    try {
+      const chunks = await chatService.fetchChunks(missing);
+      const fetched = {};
+      missing.forEach((source) => { fetched[sourceKey(source)] = null; });
+      chunks.forEach((chunk) => { fetched[sourceKey(chunk)] = chunk; });
+      setSourceChunks((prev) => ({ ...prev, ...fetched }));
+    } catch (error) {
+      console.error('Failed to load sources:', error);
+    }
+  };
 
   const formatTime = (timestamp) => {
     console.log('📱 ChatMessage formatTime received:', timestamp, 'Type:', typeof timestamp);
@@ -33,7 +59,7 @@ const ChatMessage = ({ message, onFeedback, onCopy }) => {
       <div className="mt-4">
         <Button
           variant="link"
-          onClick={() => setShowSources(!showSources)}
+          onClick={toggleSources}
           className="p-0 text-decoration-none d-flex align-items-center"
           style={{color: '#6b7280'}}
         >
@@ -47,32 +73,46 @@ const ChatMessage = ({ message, onFeedback, onCopy }) => {
         
         <Collapse in={showSources}>
           <div className="mt-3">
-            {message.sources.map((source, index) => (
-              <Card key={index} className="mb-2 border-0" style={{
-                background: 'rgba(248, 250, 252, 0.8)',
-                borderRadius: '12px'
-              }}>
-                <Card.Body className="p-3">
-                  <div className="d-flex align-items-center mb-2">
-                    <FileText size={16} className="text-muted me-2" />
-                    <span className="fw-medium text-dark me-2">
-                      {source.filename}
-                    </span>
-                    <Badge bg="secondary" className="rounded-pill">
-                      Section {source.chunk_index}
-                    </Badge>
-                  </div>
-                  <p className="text-muted lh-base mb-2">
-                    {source.text}
-                  </p>
-                  {source.similarity_score && (
-                    <div className="text-muted small">
-                      Relevance: {(source.similarity_score * 100).toFixed(1)}%
+            {message.sources.map((ref, index) => {
+              const chunk = sourceChunks[sourceKey(ref)];
+              const source = { ...ref, ...(chunk || {}) };
+              const score = source.score ?? source.similarity_score;
+              return (
+                <Card key={index} className="mb-2 border-0" style={{
+                  background: 'rgba(248, 250, 252, 0.8)',
+                  borderRadius: '12px'
+                }}>
+                  <Card.Body className="p-3">
+                    <div className="d-flex align-items-center mb-2">
+                      <FileText size={16} className="text-muted me-2" />
+                      <span className="fw-medium text-dark me-2">
+                        {source.filename || (chunk === null ? 'Unavailable' : 'Loading...')}
+                      </span>
+                      <Badge bg="secondary" className="rounded-pill me-2">
+                        Section {source.chunk_index}
+                      </Badge>
+                      {source.page && (
+                        <Badge bg="light" text="dark" className="rounded-pill">
+                          Page {source.page}
+                        </Badge>
+                      )}
                     </div>
-                  )}
-                </Card.Body>
-              </Card>
-            ))}
+                    <p className="text-muted lh-base mb-2">
+                      {chunk === null
+                        ? 'This source is no longer available.'
+                        : source.text && source.text.length > 200
+                          ? `${source.text.slice(0, 200)}...`
+                          : source.text}
+                    </p>
+                    {score && (
+                      <div className="text-muted small">
+                        Relevance: {(score * 100).toFixed(1)}%
+                      </div>
+                    )}
+                  </Card.Body>
+                </Card>
+              );
+            })}
           </div>
         </Collapse>
       </div>
@@ -25,6 +25,15 @@ function chatReducer(state, action) {
         ...state,
         messages: [...state.messages, action.payload],
       };
+    case 'UPDATE_MESSAGE':
+      return {
+        ...state,
+        messages: state.messages.map((message) =>
+          message.id === action.payload.id
+            ? { ...message, ...action.payload.changes }
+            : message
+        ),
+      };
     case 'SET_MESSAGES':
       return {
         ...state,
@@ -89,6 +98,7 @@ export function ChatProvider({ children }) {
     ...state,
     dispatch,
     addMessage: (message) => dispatch({ type: 'ADD_MESSAGE', payload: message }),
+    updateMessage: (id, changes) => dispatch({ type: 'UPDATE_MESSAGE', payload: { id, changes } }),
     setMessages: (messages) => dispatch({ type: 'SET_MESSAGES', payload: messages }),
     setCurrentDocument: (document) => dispatch({ type: 'SET_CURRENT_DOCUMENT', payload: document }),
     setLoading: (loading) => dispatch({ type: 'SET_LOADING', payload: loading }),
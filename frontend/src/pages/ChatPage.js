@@ -12,6 +12,7 @@ const ChatPage = () => {
   const [searchParams] = useSearchParams();
   const [inputValue, setInputValue] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [answerStarted, setAnswerStarted] = useState(false);
   const [showFeedback, setShowFeedback] = useState(false);
   const [currentResponse, setCurrentResponse] = useState(null);
   const [error, setError] = useState('');
@@ -22,6 +23,7 @@ const ChatPage = () => {
   const { 
     messages, 
     addMessage, 
+    updateMessage,
     sessionId, 
     currentDocument, 
     setLoading,
@@ -127,34 +129,77 @@ const ChatPage = () => {
     addMessage(userMessage);
 
     try {
-      // Send to API
-      const response = await chatService.sendMessage(
-        question, 
-        sessionId, 
-        currentDocument?.id
+      // Stream the answer: the message appears
+      // with the first token and grows from there
+      let aiMessage = null;
+      let sources = [];
+      let questionId = null;
+      let responseSessionId = sessionId;
+      let answer = '';
+      let finalResponse = null;
+
+      await chatService.streamMessage(
+        {
+          question,
+          session_id: sessionId,
+          document_id: currentDocument?.id,
+        },
+        (event, data) => {
+          if (event === 'sources') {
+            sources = data.sources || [];
+            questionId = data.question_id;
+            responseSessionId = data.session_id || sessionId;
+          } else if (event === 'token') {
+            answer += data.text;
+            if (!aiMessage) {
+              aiMessage = {
+                id: String(questionId || (Date.now() + 1)),
+                type: 'ai',
+                content: answer,
+                sources,
+                timestamp: new Date().toISOString(),
+                sessionId: responseSessionId,
+              };
+              addMessage(aiMessage);
+              setAnswerStarted(true);
+            } else {
+              updateMessage(aiMessage.id, { content: answer });
+            }
+          } else if (event === 'done') {
+            finalResponse = data;
+          } else if (event === 'error') {
+            throw new Error(data.error || 'Failed to get response');
+          }
+        }
       );
 
-      // Add AI response
-      const aiMessage = {
-        id: String(response.question_id || (Date.now() + 1)),
+      if (!finalResponse) {
+        throw new Error('The answer was interrupted');
+      }
+
+      const completedMessage = {
+        id: String(finalResponse.question_id || questionId || (Date.now() + 1)),
         type: 'ai',
-        content: response.answer,
-        sources: response.sources,
-        timestamp: response.timestamp || new Date().toISOString(),  // Ensure timestamp is always a string
-        sessionId: response.session_id,
+        content: finalResponse.answer,
+        sources: finalResponse.sources,
+        timestamp: finalResponse.timestamp || new Date().toISOString(),  // Ensure timestamp is always a string
+        sessionId: finalResponse.session_id,
       };
-      console.log('🤖 AI Response timestamp:', response.timestamp, 'Type:', typeof response.timestamp);
-      addMessage(aiMessage);
-      setCurrentResponse(aiMessage);
+      if (aiMessage) {
+        updateMessage(aiMessage.id, completedMessage);
+      } else {
+        addMessage(completedMessage);
+      }
+      setCurrentResponse(completedMessage);
 
       // Persist to history
       try {
         await historyService.saveHistory({
           session_id: sessionId,
           question: question,
-          answer: response.answer,
+          answer: finalResponse.answer,
           timestamp: new Date().toISOString(),
-          sources: response.sources || [],
+          sources: finalResponse.sources || [],
         });
       } catch (e) {
         console.error('Failed to save chat history:', e);
@@ -176,6 +221,7 @@ const ChatPage = () => {
       addMessage(errorMessage);
     } finally {
       setIsLoading(false);
+      setAnswerStarted(false);
       setLoading(false);
     }
   };
@@ -386,7 +432,7 @@ const ChatPage = () => {
                           />
                         </div>
                       ))}
-                      {isLoading && (
+                      {isLoading && !answerStarted && (
                         <div className="d-flex align-items-center p-4 bg-light rounded-xl mb-3 animate-fade-in-up chat-message">
                           <div className="bg-primary rounded-xl d-flex align-items-center justify-content-center me-3"
                                style={{width: '40px', height: '40px'}}>
@@ -152,6 +152,97 @@ export const chatService = {
 
     return response.data;
   },
+
+  // Stream an answer as server-sent events.
+  // onEvent(event, data) is called for each
+  // "sources", "token", "done" and "error"
+  // event; axios can't read a body as it
+  // arrives, so this uses fetch
+  streamMessage: async (data, onEvent) => {
+    const token =
+      localStorage.getItem("token");
+
+    const response = await fetch(
+      `${API_BASE_URL}/api/chat/stream`,
+      {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          ...(token
+            ? { Authorization: `Bearer ${token}` }
+            : {}),
+        },
+        body: JSON.stringify(data),
+      }
+    );
+
+    if (!response.ok) {
+      throw new Error(
+        `Chat failed (${response.status})`
+      );
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    for (;;) {
+      const { value, done } =
+        await reader.read();
+
+      if (done) {
+        break;
+      }
+
+      buffer += decoder.decode(value, {
+        stream: true,
+      });
+
+      // Events end with a blank line
+      let boundary = buffer.indexOf("\n\n");
+
+      while (boundary >= 0) {
+        const raw = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = "message";
+        const lines = [];
+
+        raw.split("\n").forEach((line) => {
+          if (line.startsWith("event:")) {
+            event = line.slice(6).trim();
+          } else if (line.startsWith("data:")) {
+            lines.push(line.slice(5).trim());
+          }
+        });
+
+        if (lines.length) {
+          onEvent(
+            event,
+            JSON.parse(lines.join("\n"))
+          );
+        }
+
+        boundary = buffer.indexOf("\n\n");
+      }
+    }
+  },
+
+  // Hydrate compact source references
+  // ({document_id, chunk_index}) with text
+  fetchChunks: async (refs) => {
+    const response = await api.post(
+      "/api/chunks",
+      {
+        refs: refs.map((ref) => ({
+          document_id: ref.document_id,
+          chunk_index: ref.chunk_index,
+        })),
+      }
+    );
+
+    return response.data.chunks;
+  },
 };
 
 // ================= FEEDBACK SERVICE =================